@@ -0,0 +1,394 @@
+"""Import and API benchmarks against the offline Spotify stand-in.
+
+    python -m benchmarks.run                    # 10 and 1k track catalogs
+    python -m benchmarks.run --sizes 10,1k,100k
+    python -m benchmarks.run --update-baseline
+
+Every scenario reports Spotify requests issued, SQL queries, wall time, peak
+RSS and p50/p99 iteration latency as JSON, and is compared against
+benchmarks/baselines.json. Any metric past its tolerance, or a scenario
+without a baseline, fails the run.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+
+# Synthetic catalog shapes, every odd album also gets a deluxe edition
+CATALOG_SIZES = {
+    "10": dict(albums_per_artist=1, tracks_per_album=10),
+    "1k": dict(albums_per_artist=40, tracks_per_album=16),
+    "100k": dict(albums_per_artist=400, tracks_per_album=166),
+}
+DEFAULT_SIZES = "10,1k"
+
+# (relative, absolute) slack per metric. Request and query counts are
+# deterministic, timings and memory are not
+TOLERANCES = {
+    "spotify_requests": (0.0, 0),
+    "db_queries": (0.0, 0),
+    "wall_time_s": (1.0, 0.01),
+    "p50_ms": (1.0, 5),
+    "p99_ms": (1.0, 10),
+    "peak_rss_mb": (0.5, 0),
+}
+# A p99 of fewer iterations is little more than the slowest one, too noisy to
+# fail a run on
+MIN_ITERATIONS = {"p99_ms": 100}
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    size: str
+    iterations: int
+    spotify_requests: int
+    db_queries: int
+    wall_time_s: float
+    peak_rss_mb: float
+    p50_ms: float
+    p99_ms: float
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "recommendations.settings")
+    import django
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def percentile(durations: list[float], percent: int) -> float:
+    if len(durations) == 1:
+        return durations[0]
+    return statistics.quantiles(durations, n=100, method="inclusive")[percent - 1]
+
+
+@contextlib.contextmanager
+def wrap_every_connection(wrapper):
+    """connection.execute_wrapper() for the connections of every thread. The
+    FastAPI app runs its queries on TestClient's threads, not this one."""
+    from django.db.backends.utils import CursorWrapper
+
+    execute_with_wrappers = CursorWrapper._execute_with_wrappers
+
+    def execute_with_wrapper(cursor, sql, params, many, executor):
+        return wrapper(
+            lambda sql, params, many, context: execute_with_wrappers(
+                cursor, sql, params, many, executor
+            ),
+            sql,
+            params,
+            many,
+            {"connection": cursor.db, "cursor": cursor},
+        )
+
+    CursorWrapper._execute_with_wrappers = execute_with_wrapper
+    try:
+        yield
+    finally:
+        CursorWrapper._execute_with_wrappers = execute_with_wrappers
+
+
+def measure(
+    scenario: str,
+    size: str,
+    server,
+    run: Callable[[], object],
+    iterations: int = 1,
+    setup: Callable[[], object] = lambda: None,
+) -> BenchmarkResult:
+    from songs.profiling import QueryProfile
+
+    durations = []
+    query_profile = QueryProfile(stage=scenario)
+    server.reset_counts()
+    for _ in range(iterations):
+        setup()
+        with wrap_every_connection(query_profile):
+            start = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start)
+
+    return BenchmarkResult(
+        scenario=scenario,
+        size=size,
+        iterations=iterations,
+        spotify_requests=server.total_requests,
+        db_queries=query_profile.count,
+        wall_time_s=round(sum(durations), 4),
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        p50_ms=round(percentile(durations, 50) * 1000, 3),
+        p99_ms=round(percentile(durations, 99) * 1000, 3),
+    )
+
+
+def reset_database():
+    from django.core.management import call_command
+
+    from songs.cache import clear_caches
+    from songs.repository import reset_search_index
+
+    call_command("flush", interactive=False, verbosity=0)
+    clear_caches()
+    reset_search_index()
+
+
+def run_size(size: str, server) -> list[BenchmarkResult]:
+    import numpy as np
+    from fastapi.testclient import TestClient
+
+    import fast_api_test
+    from songs.cache import clear_caches
+    from songs.models import Album, Song, SongFeatures
+    from songs.playlists import sequence
+    from songs.profiles import FEATURES
+    from songs.repository import get_artist_songs, get_similar_artists, import_artist
+    from songs.spotify.spotify import filter_duplicate_albums, import_artist_albums_songs
+    from songs.spotify.spotify_client import get_client
+
+    catalog = server.catalog
+    artist_id = next(iter(catalog.artist_albums))
+    client = get_client()
+    results = []
+
+    reset_database()
+    results.append(
+        measure(
+            "import_artist_albums_songs",
+            size,
+            server,
+            lambda: import_artist_albums_songs(artist_id),
+        )
+    )
+
+    albums = client.get_all_artist_albums(artist_id=artist_id)
+    results.append(
+        measure(
+            "filter_duplicate_albums",
+            size,
+            server,
+            lambda: filter_duplicate_albums(albums),
+            iterations=5,
+        )
+    )
+
+    spotify_albums = [
+        client.get_complete_album_from_partial(partial)
+        for partial in client.get_album_partials(albums)
+    ]
+    track_ids = [track.id for album in spotify_albums for track in album.tracks]
+    spotify_features = [
+        features
+        for features in client.get_multiple_track_features(track_ids)
+        if features is not None
+    ]
+
+    def import_with_managers():
+        for spotify_album in spotify_albums:
+            db_album = Album.objects.import_spotify_album(spotify_album)  # type: ignore
+            Song.objects.import_spotify_tracks(  # type: ignore
+                tracks=spotify_album.tracks, album=db_album
+            )
+        SongFeatures.objects.import_many_song_features(spotify_features)  # type: ignore
+
+    results.append(
+        measure(
+            "model_import_managers",
+            size,
+            server,
+            import_with_managers,
+            iterations=3,
+            setup=reset_database,
+        )
+    )
+
+    # The FastAPI search path, once the artist has been imported
+    reset_database()
+    import_artist_albums_songs(artist_id)
+    results.append(
+        measure(
+            "repository_artist_songs",
+            size,
+            server,
+            lambda: (import_artist(artist_id), get_artist_songs(artist_id)),
+            iterations=5,
+            setup=clear_caches,
+        )
+    )
+
+    results.append(
+        measure(
+            "similar_artists",
+            size,
+            server,
+            lambda: get_similar_artists(artist_id),
+            iterations=200,
+        )
+    )
+
+    # Searched for by name, as typed into the frontend
+    artist_name = catalog.artists[artist_id]["name"]
+    with TestClient(fast_api_test.app) as api_client:
+        results.append(
+            measure(
+                "api_start_search",
+                size,
+                server,
+                lambda: api_client.post(
+                    "/api/start-search", json={"spotifyId": artist_name}
+                ).raise_for_status(),
+                iterations=200,
+            )
+        )
+        # Every vote goes to a fresh session, as the first vote after a search
+        first_song_id = get_artist_songs(artist_id)[0]["spotify_id"]
+
+        def new_session():
+            # On the app's event loop, which owns the Redis connections
+            api_client.portal.call(
+                lambda: fast_api_test.session_manager.create_session(
+                    search_id="benchmark",
+                    spotify_id=artist_id,
+                    artist_name=artist_name,
+                    first_song_id=first_song_id,
+                )
+            )
+
+        results.append(
+            measure(
+                "api_vote",
+                size,
+                server,
+                lambda: api_client.post(
+                    "/api/vote",
+                    json={
+                        "search_id": "benchmark",
+                        "artist_id": artist_id,
+                        "artist_name": artist_name,
+                        "liked": True,
+                    },
+                ).raise_for_status(),
+                iterations=200,
+                setup=new_session,
+            )
+        )
+        results.append(
+            measure(
+                "api_playlist",
+                size,
+                server,
+                lambda: api_client.post(
+                    "/api/playlist",
+                    json={
+                        "search_id": "benchmark",
+                        "length": fast_api_test.MAX_PLAYLIST_LENGTH,
+                    },
+                ).raise_for_status(),
+                iterations=20,
+                setup=new_session,
+            )
+        )
+
+    # The longest playlist the API sequences, whatever the catalog holds
+    playlist_songs = np.random.default_rng(0).uniform(
+        size=(fast_api_test.MAX_PLAYLIST_LENGTH, len(FEATURES))
+    )
+    results.append(
+        measure(
+            "sequence_max_playlist",
+            size,
+            server,
+            lambda: sequence(playlist_songs),
+            iterations=20,
+        )
+    )
+    return results
+
+
+def compare(results: list[BenchmarkResult], baselines: dict) -> list[str]:
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.size, {}).get(result.scenario)
+        if baseline is None:
+            regressions.append(
+                f"{result.size}/{result.scenario}: no baseline, record one with "
+                "--update-baseline"
+            )
+            continue
+        for metric, (relative, absolute) in TOLERANCES.items():
+            if result.iterations < MIN_ITERATIONS.get(metric, 0):
+                continue
+            value = getattr(result, metric)
+            limit = baseline[metric] * (1 + relative) + absolute
+            if value > limit:
+                regressions.append(
+                    f"{result.size}/{result.scenario}: {metric} {value} > "
+                    f"{limit:.3f} (baseline {baseline[metric]})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    # Keep anything the code under test writes out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="benchmarks-"))
+    setup_django()
+
+    from songs.spotify.fake_spotify_server import FakeCatalog, FakeSpotifyServer
+    from songs.spotify.spotify_client import SpotifyClient, get_client
+
+    results: list[BenchmarkResult] = []
+    for size in args.sizes.split(","):
+        catalog = FakeCatalog.synthetic(num_artists=1, **CATALOG_SIZES[size])
+        with FakeSpotifyServer(catalog, latency=args.latency_ms / 1000) as server:
+            SpotifyClient.base_url = server.base_url
+            SpotifyClient.token_endpoint = server.token_endpoint
+            # Every size logs in to its own server
+            get_client().token = ""
+            # Keep stdout for the results, the code under test still prints
+            with contextlib.redirect_stdout(sys.stderr):
+                results += run_size(size, server)
+
+    output = json.dumps([asdict(result) for result in results], indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+    baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    if args.update_baseline:
+        for result in results:
+            baselines.setdefault(result.size, {})[result.scenario] = asdict(result)
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        return
+
+    if regressions := compare(results, baselines):
+        print("\nREGRESSIONS:", *regressions, sep="\n  ", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cold start profile of the Django, FastAPI and import worker entry points.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 20
+
+Each entry point is started in a fresh interpreter with -X importtime, with
+the Spotify endpoints pointed at a closed port: starting up must not need
+Spotify. Reports wall time per entry point and the slowest imports as JSON.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Nothing listens on the discard port, any request made at startup fails
+UNREACHABLE_URL = "http://127.0.0.1:9"
+
+SETUP_DJANGO = (
+    "import os, django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recommendations.settings'); "
+    "django.setup(); "
+)
+PROJECT_PACKAGES = ("songs", "polls", "recommendations", "fast_api_test")
+ENTRY_POINTS = {
+    "django": SETUP_DJANGO + "import recommendations.urls",
+    "fastapi": "import fast_api_test",
+    "import_worker": SETUP_DJANGO + "import songs.spotify.spotify",
+}
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Cumulative microseconds per module from -X importtime output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line.split("|")
+        cumulative[module.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def profile(code: str, runs: int) -> dict:
+    env = {
+        **os.environ,
+        "SPOTIFY_BASE_URL": UNREACHABLE_URL,
+        "SPOTIFY_TOKEN_ENDPOINT": UNREACHABLE_URL,
+    }
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        durations.append(time.perf_counter() - start)
+        if completed.returncode:
+            raise RuntimeError(f"Startup failed:\n{completed.stderr[-2000:]}")
+    return {
+        "wall_time_ms": round(statistics.median(durations) * 1000, 1),
+        "imports": parse_importtime(completed.stderr),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    report = {}
+    for entry_point, code in ENTRY_POINTS.items():
+        result = profile(code, runs=args.runs)
+        slowest = sorted(result["imports"].items(), key=lambda item: -item[1])
+        report[entry_point] = {
+            "wall_time_ms": result["wall_time_ms"],
+            "slowest_imports_ms": {
+                module: round(us / 1000, 1) for module, us in slowest[: args.top]
+            },
+            "project_imports_ms": {
+                module: round(us / 1000, 1)
+                for module, us in slowest
+                if module.split(".")[0] in PROJECT_PACKAGES
+            },
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
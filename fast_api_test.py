@@ -1,18 +1,45 @@
-from redis import Redis
+import os
+
+import django
+
+# The app reads and writes through the Django models, see songs.repository
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "recommendations.settings")
+django.setup()
+
+from redis.asyncio import Redis
 import uuid
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from typing import AsyncGenerator
 import asyncio
 import json
+import logging
+import socket
 import traceback
 
+import numpy as np
+
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, Dict
-import aiosqlite
-from datetime import datetime, timedelta
 import re
 
+from songs import repository
+from songs.cache import cache_stats
+from songs.metrics import render_metrics
+from songs.playlists import sequence
+from songs.preferences import PreferenceModel
+from songs.refresher import RequestBudget, refresh_periodically
+from songs.tracing import span, start_tracing, stop_tracing
+
+logger = logging.getLogger(__name__)
+
+# The background refresher only runs when REFRESH_INTERVAL_SECONDS is set
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REFRESH_INTERVAL_SECONDS", "0"))
+REFRESH_REQUEST_BUDGET = int(os.getenv("REFRESH_REQUEST_BUDGET", "50"))
+# Sequencing is quadratic in the number of songs, see songs.playlists. The
+# distances and greedy ordering of this many take about half its time budget
+MAX_PLAYLIST_LENGTH = 2000
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -26,10 +53,29 @@ app.add_middleware(
 # Add to FastAPI app
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
+    start_tracing()
+    if REFRESH_INTERVAL_SECONDS:
+        app.state.refresher = asyncio.create_task(
+            refresh_periodically(refresh_stale_artists, REFRESH_INTERVAL_SECONDS)
+        )
+
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if refresher := getattr(app.state, "refresher", None):
+        refresher.cancel()
+    for task in import_tasks:
+        task.cancel()
+    stop_tracing()
+    # Connections belong to this event loop, the next one opens its own
+    await redis_client.aclose()
 
+
+# Shared by every worker, so any of them can serve any search or session
 redis_client = Redis(host="localhost", port=6379, db=0)
+# Who holds a claimed import, for whoever is debugging a stuck one
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+STREAM_ID = re.compile(r"\d+-\d+")
 
 from dataclasses import dataclass
 
@@ -50,381 +96,417 @@ class Song:
             "popularity": self.popularity
         }
 
-@dataclass
-class TreeNode:
-    song: Song
-    left: Optional["TreeNode"] = None
-    right: Optional["TreeNode"] = None
-
 
 class SessionManager:
+    """A search session's preference model and the songs it has shown, as
+    one Redis hash of a few hundred bytes. The songs shown are a bitmap over
+    the rows of the artist's song matrix, a bit per song however many votes."""
+
     def __init__(self, redis_client):
         self.redis = redis_client
         self.expire_time = 3600  # 1 hour
 
     async def create_session(
-        self, search_id: str, spotify_id: str, artist_name: str, tree: TreeNode
+        self, search_id: str, spotify_id: str, artist_name: str, first_song_id: str
     ):
-        session_data = {
-            "spotify_id": spotify_id,
-            "artist_name": artist_name,
-            "tree": self._serialize_tree(tree),
-        }
-        self.redis.setex(
-            f"session:{search_id}", self.expire_time, json.dumps(session_data)
+        key = f"session:{search_id}"
+        pipeline = self.redis.pipeline()
+        pipeline.hset(
+            key,
+            mapping={
+                "spotify_id": spotify_id,
+                "artist_name": artist_name,
+                "weights": PreferenceModel().to_bytes(),
+                "shown": b"",
+                "current": first_song_id,
+            },
         )
+        pipeline.expire(key, self.expire_time)
+        await pipeline.execute()
 
     async def get_session(self, search_id: str) -> Optional[dict]:
         """Retrieve session data from Redis"""
-        data = self.redis.get(f"session:{search_id}")
+        data = await self.redis.hgetall(f"session:{search_id}")
         if not data:
             return None
-        return json.loads(data)
-
-    async def update_session(self, search_id: str, session_data: dict):
-        """Update session data in Redis"""
-        self.redis.setex(
-            f"session:{search_id}", self.expire_time, json.dumps(session_data)
-        )
-
-    def _serialize_tree(self, node: TreeNode) -> Optional[dict]:
-        if node is None:
-            return None
         return {
-            "song": node.song.to_dict(),
-            "left": self._serialize_tree(node.left) if node.left else None,
-            "right": self._serialize_tree(node.right) if node.right else None,
+            "spotify_id": data[b"spotify_id"].decode(),
+            "artist_name": data[b"artist_name"].decode(),
+            "model": PreferenceModel.from_bytes(data[b"weights"]),
+            "shown": data[b"shown"],
+            "current": data[b"current"].decode(),
         }
 
-    async def get_current_song(
-        self, search_id: str, vote_history: list
-    ) -> Optional[dict]:
-        session_data = json.loads(self.redis.get(f"session:{search_id}"))
-        node = session_data["tree"]
-
-        # Navigate to current position in tree
-        for vote in vote_history:
-            node = node["right"] if vote else node["left"]
-            if node is None:
-                return None
-
-        return node["song"]
-
-
-session_manager = SessionManager(redis_client)
-
-
-async def create_decision_tree(spotify_id: str, artist_name: str) -> TreeNode:
-    """Create decision tree based on artist's songs"""
-    table_name = await sanitize_table_name(artist_name)
-
-    async with aiosqlite.connect("songs.db") as db:
-        # Get all songs for artist
-        cursor = await db.execute(f"SELECT * FROM {table_name}")
-        songs = await cursor.fetchall()
-
-        # For now, create mock tree structure
-        # Later, implement actual recommendation logic here
-        return create_mock_decision_tree(artist_name=artist_name)
+    async def update_session(
+        self, search_id: str, model: PreferenceModel, shown: np.ndarray, current: str
+    ):
+        """Store the model after a vote, with the rows shown so far and the
+        song it picked next"""
+        key = f"session:{search_id}"
+        pipeline = self.redis.pipeline()
+        pipeline.hset(
+            key,
+            mapping={
+                "weights": model.to_bytes(),
+                "shown": np.packbits(shown).tobytes(),
+                "current": current,
+            },
+        )
+        pipeline.expire(key, self.expire_time)
+        await pipeline.execute()
 
 
-async def sanitize_table_name(spotify_id: str) -> str:
-    """Convert Spotify ID to valid table name"""
-    return f"songs_{spotify_id.replace('.', '_')}"
+class SearchRegistry:
+    """Searches started, one Redis hash each, so that any worker can stream
+    them. A search expires unless its stream starts in time."""
 
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.expire_time = 600  # 10 minutes
 
-async def init_db():
-    """Initialize the database with artists table"""
-    async with aiosqlite.connect("songs.db") as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS artists (
-                spotify_id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                table_name TEXT UNIQUE,
-                last_updated TIMESTAMP
-            )
-        """
+    async def register(self, search_id: str, spotify_id: str, artist_name: str):
+        key = f"search:{search_id}"
+        pipeline = self.redis.pipeline()
+        pipeline.hset(
+            key, mapping={"spotify_id": spotify_id, "artist_name": artist_name}
         )
-        await db.commit()
-
-
-async def ensure_artist_table(db, table_name: str):
-    """Create artist-specific table if it doesn't exist"""
-    await db.execute(
-        f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            spotify_id TEXT PRIMARY KEY,
-            title TEXT NOT NULL,
-            album_id TEXT,
-            album_name TEXT,
-            popularity INTEGER
-        )
-    """
-    )
-    await db.commit()
-
-
-def create_mock_decision_tree(artist_name: str) -> TreeNode:
-    """Create a mock decision tree 5 levels deep"""
-    return TreeNode(
-        song=Song(song_id="0", title="Root song", artists = [], album_name = "Album 0"),
-        left=TreeNode(
-            song=Song(song_id="1", title="No Song 1", artists = [], album_name = "Album 1"),
-            left=TreeNode(
-                song= Song(song_id="2", title="No-No Song", artists = [], album_name = "Album 2"),
-            ),
-            right=TreeNode(
-                song= Song(song_id="3", title="No-Yes Song", artists = [], album_name = "Album 3"),
-            ),
-        ),
-        right=TreeNode(
-            song=Song(song_id="4", title="Yes Song 1", artists = [], album_name = "Album 4"),
-            left=TreeNode(
-                song= Song(song_id="5", title="Yes-No Song", artists = [], album_name = "Album 5"),
-            ),
-            right=TreeNode(
-                song= Song(song_id="6", title="yes-Yes Song", artists = [], album_name = "Album 6"),
-            ),
-        ),
-    )
-
+        pipeline.expire(key, self.expire_time)
+        await pipeline.execute()
 
-def get_next_song(tree: TreeNode, vote_history: list) -> Optional[Song]:
-    """Navigate tree based on vote history"""
-    current = tree
-    for vote in vote_history:
-        if vote:
-            current = current.right
-        else:
-            current = current.left
-        if current is None:
+    async def get(self, search_id: str) -> Optional[dict]:
+        data = await self.redis.hgetall(f"search:{search_id}")
+        if not data:
             return None
-    return current.song
-
-
-# Store active searches (in a real app, use Redis or another suitable database)
-active_searches = {}
-
-
-async def check_artist_status(
-    spotify_id: str, artist_name: str, debug: bool = False
-) -> tuple[bool, str]:
+        return {key.decode(): value.decode() for key, value in data.items()}
+
+
+class ImportBroadcast:
+    """Progress of an artist's import as a Redis stream. One worker claims the
+    import and publishes, every search for the artist streams the same events
+    from wherever it left off.
+
+    Readers pull at their own pace and the publisher never waits for them.
+    The stream keeps the last max_events, so a reader that falls further
+    behind skips to newer progress, and progress it reads in one batch is
+    coalesced into the newest."""
+
+    TERMINAL_STATUSES = ("completed", "error")
+    # Claims the import and drops the previous import's events in one step,
+    # so that nobody joining the new import reads how the last one ended
+    CLAIM_SCRIPT = """
+    if redis.call("SET", KEYS[1], ARGV[1], "NX", "EX", ARGV[2]) then
+        redis.call("DEL", KEYS[2])
+        return 1
+    end
+    return 0
+    """
+    # Extends the claim and the events, only for the owner of the import
+    RENEW_SCRIPT = """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        redis.call("EXPIRE", KEYS[1], ARGV[2])
+        redis.call("EXPIRE", KEYS[2], ARGV[2])
+        return 1
+    end
+    return 0
     """
-    Check if we need to update songs for this artist
-    Returns: (needs_update, table_name)
+    # Releases the claim only if it is still the owner's, an owner whose claim
+    # expired must not release the claim of the import that replaced it
+    RELEASE_SCRIPT = """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        return redis.call("DEL", KEYS[1])
+    end
+    return 0
     """
-    table_name = await sanitize_table_name(spotify_id)
 
-    async with aiosqlite.connect("songs.db") as db:
-        cursor = await db.execute(
-            "SELECT last_updated FROM artists WHERE spotify_id = ?", (spotify_id,)
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.expire_time = 600  # 10 minutes
+        # The owner renews its claim this often while it imports
+        self.renew_seconds = self.expire_time / 3
+        self.max_events = 100
+        self.read_count = 10
+        # Comments that keep proxies from dropping idle streams
+        self.heartbeat_seconds = 15.0
+        self.claim_script = redis_client.register_script(self.CLAIM_SCRIPT)
+        self.renew_script = redis_client.register_script(self.RENEW_SCRIPT)
+        self.release_script = redis_client.register_script(self.RELEASE_SCRIPT)
+
+    async def claim(self, spotify_id: str, owner: str) -> bool:
+        """True if owner is now the one to import the artist and publish."""
+        claimed = await self.claim_script(
+            keys=[f"import:{spotify_id}:owner", f"import:{spotify_id}:events"],
+            args=[owner, self.expire_time],
         )
-        result = await cursor.fetchone()
-
-        if result is None:
-            # New artist - create entry and table
-            if debug:
-                print(f"Creating new artist entry for {spotify_id=}")
-            await db.execute(
-                "INSERT INTO artists (spotify_id, name, table_name, last_updated) VALUES (?, ?, ?, ?)",
-                (spotify_id, artist_name, table_name, datetime.now().isoformat()),
-            )
-            await ensure_artist_table(db=db, table_name=table_name)
-            return True, table_name
+        return bool(claimed)
 
-        last_updated = datetime.fromisoformat(result[0])
-        two_weeks_ago = datetime.now() - timedelta(weeks=2)
+    async def renew(self, spotify_id: str, owner: str) -> bool:
+        """True if owner still holds the import, now for another expire_time."""
+        renewed = await self.renew_script(
+            keys=[f"import:{spotify_id}:owner", f"import:{spotify_id}:events"],
+            args=[owner, self.expire_time],
+        )
+        return bool(renewed)
+
+    async def hold(self, spotify_id: str, owner: str):
+        """Renew owner's claim every renew_seconds until cancelled, so that an
+        import running longer than expire_time isn't claimed again."""
+        while True:
+            await asyncio.sleep(self.renew_seconds)
+            if not await self.renew(spotify_id, owner):
+                logger.warning(f"Lost the claim on the import of {spotify_id}")
+                return
+
+    async def release(self, spotify_id: str, owner: str):
+        await self.release_script(keys=[f"import:{spotify_id}:owner"], args=[owner])
+
+    async def publish(self, spotify_id: str, event: dict):
+        key = f"import:{spotify_id}:events"
+        pipeline = self.redis.pipeline()
+        pipeline.xadd(
+            key,
+            {"data": json.dumps(event)},
+            maxlen=self.max_events,
+            approximate=True,
+        )
+        pipeline.expire(key, self.expire_time)
+        await pipeline.execute()
+
+    async def subscribe(
+        self, spotify_id: str, last_event_id: str = "0-0"
+    ) -> AsyncGenerator[tuple[Optional[str], dict], None]:
+        """(event id, event) after last_event_id until the import completes or
+        fails, with (None, {}) for a heartbeat whenever nothing happens for
+        heartbeat_seconds."""
+        key = f"import:{spotify_id}:events"
+        while True:
+            response = await self.redis.xread(
+                {key: last_event_id},
+                count=self.read_count,
+                block=int(self.heartbeat_seconds * 1000),
+            )
+            if not response:
+                if await self.redis.exists(f"import:{spotify_id}:owner"):
+                    yield None, {}
+                    continue
+                # Nobody is publishing, either the reader already saw the end
+                # of the import or its worker died before getting there
+                last = await self.redis.xrevrange(key, count=1)
+                if last and self.is_terminal(json.loads(last[0][1][b"data"])):
+                    return
+                yield None, {"status": "error", "message": "Import stopped"}
+                return
+
+            entries = response[0][1]
+            for index, (event_id, fields) in enumerate(entries):
+                event = json.loads(fields[b"data"])
+                last_event_id = event_id.decode()
+                if self.is_terminal(event) or index == len(entries) - 1:
+                    yield last_event_id, event
+                if self.is_terminal(event):
+                    return
+
+    def is_terminal(self, event: dict) -> bool:
+        return event["status"] in self.TERMINAL_STATUSES
 
-        return last_updated < two_weeks_ago, table_name
 
+session_manager = SessionManager(redis_client)
+search_registry = SearchRegistry(redis_client)
+import_broadcast = ImportBroadcast(redis_client)
+# Imports this worker publishes, kept referenced until they finish
+import_tasks: set[asyncio.Task] = set()
+
+
+def to_song(song: dict, artist_name: str) -> Song:
+    return Song(
+        song_id=song["spotify_id"],
+        title=song["title"],
+        artists=[artist_name],
+        album_name=song["album"],
+        popularity=song["popularity"],
+    )
 
-async def update_artist_songs(spotify_id: str, artist_name: str, songs: list):
-    """Store or update songs for an artist"""
-    table_name = await sanitize_table_name(artist_name)
 
-    async with aiosqlite.connect("songs.db") as db:
-        # Update last_updated timestamp
-        await db.execute(
-            "UPDATE artists SET last_updated = ? WHERE name = ?",
-            (datetime.now().isoformat(), artist_name),
-        )
+async def refresh_stale_artists() -> list[str]:
+    budget = RequestBudget(max_requests=REFRESH_REQUEST_BUDGET)
+    return await repository.arefresh_stale_artists(budget=budget)
 
-        # Ensure table exists
-        print(f"Ensuring table {table_name=}")
-        await ensure_artist_table(db=db, table_name=table_name)
-
-        # Clear existing songs (optional, depends on your update strategy)
-        await db.execute(f"DELETE FROM {table_name}")
-
-        # Insert new songs
-        for song in songs:
-            await db.execute(
-                f"""
-                INSERT OR REPLACE INTO {table_name}
-                (title, spotify_id, album_name, popularity)
-                VALUES (?, ?, ?, ?)
-            """,
-                (
-                    song["title"],
-                    song.get("spotify_id"),
-                    song.get("album_name"),
-                    song.get("popularity", 0),
-                ),
-            )
 
-        await db.commit()
+async def search_songs_for_artist(spotify_id: str, artist_name: str) -> list:
+    """Search for songs, importing the artist from Spotify if necessary"""
+    with span("artist_import") as import_span:
+        features = await repository.aimport_artist(spotify_id)
+        if import_span:
+            import_span.set(num_features=len(features))
 
+    with span("song_read"):
+        songs = await repository.aget_artist_songs(spotify_id)
+    return [{**song, "artist": artist_name} for song in songs]
 
-async def search_songs_for_artist(
-    spotify_id: str, artist_name: str, debug=False
-) -> list:
-    """Search for songs, updating database if necessary"""
-    if debug:
-        print(f"Checking artist status for {artist_name=}")
-    needs_update, table_name = await check_artist_status(spotify_id=spotify_id, artist_name=artist_name, debug=True)
-    if debug:
-        print(f"Finished checking artist status for {artist_name=}")
 
-    if needs_update:
-        # In real implementation, call Spotify API here
-        songs = [
-            {
-                "title": "Song 1",
-                "spotify_id": "abc123",
-                "album": "Album 1",
-                "popularity": 75,
-            },
-            {
-                "title": "Song 2",
-                "spotify_id": "def456",
-                "album": "Album 1",
-                "popularity": 80,
-            },
-        ]
-        await update_artist_songs(spotify_id=spotify_id,artist_name=artist_name, songs=songs)
-
-    # Retrieve songs from database
-    async with aiosqlite.connect("songs.db") as db:
-        cursor = await db.execute(
-            f"""
-            SELECT title, spotify_id, album_name, popularity
-            FROM {table_name}
-        """
+async def run_import(spotify_id: str, artist_name: str):
+    """Import the artist for every search streaming it, publishing progress
+    to import_broadcast. Only the worker that claimed the import runs this."""
+    holder = asyncio.create_task(import_broadcast.hold(spotify_id, WORKER_ID))
+    try:
+        await import_broadcast.publish(
+            spotify_id, {"status": "searching", "progress": 0}
         )
 
-        rows = await cursor.fetchall()
-        return [
-            {
-                "title": row[0],
-                "spotify_id": row[1],
-                "album": row[2],
-                "popularity": row[3],
-                "artist": artist_name,
-            }
-            for row in rows
-        ]
-
-
-async def event_generator(search_id: str) -> AsyncGenerator[str, None]:
-    """Generate SSE events"""
-    debug = True  # Set to True to enable detailed debugging
-    try:
-        # Send initial searching status
-        yield f"data: {json.dumps({'status': 'searching', 'progress': 0})}\n\n"
-        if debug:
-            print("Yielded initial response")
-
-        # Get artist info from active_searches
-        try:
-            spotify_id = active_searches[search_id]["spotify_id"]
-            artist_name = active_searches[search_id]["artist_name"]
-            if debug:
-                print(f"Retrieved artist info: {spotify_id=}, {artist_name=}")
-        except KeyError as e:
-            print(f"Error accessing active_searches: {e}")
-            raise
-
-        # Process artist and create decision tree
-        try:
+        with span("search", spotify_id=spotify_id) as search_span:
+            # Import the artist and their songs
             songs = await search_songs_for_artist(
-                spotify_id=spotify_id, artist_name=artist_name, debug=True
-            )
-            if debug:
-                print(f"Retrieved songs: {songs}")
-        except Exception as e:
-            print(f"Error in search_songs_for_artist: {e}")
-            print(f"Error type: {type(e)}")
-            print(f"Traceback: {traceback.format_exc()}")
-            raise
-
-        try:
-            tree = await create_decision_tree(
                 spotify_id=spotify_id, artist_name=artist_name
             )
-            if debug:
-                print(f"Created decision tree for {spotify_id=}")
-        except Exception as e:
-            print(f"Error in create_decision_tree: {e}")
-            raise
-
-        # Store tree in Redis
-        try:
-            await session_manager.create_session(
-                search_id=search_id,
-                spotify_id=spotify_id,
-                artist_name=artist_name,
-                tree=tree,
-            )
-            if debug:
-                print(f"Created Redis session for {search_id=}")
-        except Exception as e:
-            print(f"Error creating Redis session: {e}")
-            raise
-
-        # Send completion status with first song
-        yield f"data: {json.dumps({
-            'status': 'completed',
-            'song': tree.song.to_dict(),
-            'artistId': spotify_id,
-            'artistName': artist_name
-        })}\n\n"
+            if search_span:
+                search_span.set(num_songs=len(songs))
+        await import_broadcast.publish(
+            spotify_id, {"status": "searching", "progress": 50}
+        )
+
+        with span("song_matrix"):
+            # With no votes yet, the most popular song goes first
+            voted_songs, matrix = await repository.aget_artist_song_matrix(spotify_id)
+        if not voted_songs:
+            raise ValueError(f"No songs with audio features for {artist_name}")
+
+        await import_broadcast.publish(
+            spotify_id,
+            {
+                "status": "completed",
+                "song": to_song(voted_songs[0], artist_name).to_dict(),
+                "artistId": spotify_id,
+                "artistName": artist_name,
+            },
+        )
 
     except Exception as e:
         error_message = {
-            'status': 'error',
-            'message': str(e),
-            'type': str(type(e)),
-            'traceback': traceback.format_exc()
+            "status": "error",
+            "message": str(e),
+            "type": str(type(e)),
+            "traceback": traceback.format_exc(),
         }
-        print(f"Error in event_generator: {error_message}")
-        yield f"data: {json.dumps(error_message)}\n\n"
+        logger.exception(f"Import of {spotify_id} failed")
+        await import_broadcast.publish(spotify_id, error_message)
 
     finally:
-        # Cleanup
-        if search_id in active_searches:
-            del active_searches[search_id]
-            if debug:
-                print(f"Cleaned up search_id {search_id}")
+        holder.cancel()
+        await import_broadcast.release(spotify_id, WORKER_ID)
 
 
-active_sessions = {}
+async def event_generator(
+    search_id: str, spotify_id: str, artist_name: str, last_event_id: str
+) -> AsyncGenerator[str, None]:
+    """Generate SSE events for a search from its artist's import"""
+    async for event_id, event in import_broadcast.subscribe(
+        spotify_id, last_event_id=last_event_id
+    ):
+        if not event:
+            yield ": heartbeat\n\n"
+            continue
+        if event["status"] == "completed":
+            # Store the session in Redis
+            with span("session_create", search_id=search_id):
+                await session_manager.create_session(
+                    search_id=search_id,
+                    spotify_id=spotify_id,
+                    artist_name=artist_name,
+                    first_song_id=event["song"]["song_id"],
+                )
+        if event_id:
+            yield f"id: {event_id}\n"
+        yield f"data: {json.dumps(event)}\n\n"
 
 
 @app.post("/api/vote")
 async def record_vote(request: Request):
+    """Count a like or dislike of the current song and pick the next one.
+    The vote is liked, or else the last of vote_history, which older clients
+    send instead."""
     data = await request.json()
-    artist_name = data["artist_name"]
-    vote_history = data["vote_history"]
-
-    # Create/get tree and navigate to next song
-    tree = create_mock_decision_tree(artist_name)
-    next_song = get_next_song(tree, vote_history)
+    search_id = data.get("search_id")
+    liked = data.get("liked", (data.get("vote_history") or [None])[-1])
+    if not isinstance(search_id, str) or not isinstance(liked, bool):
+        return JSONResponse(
+            status_code=422,
+            content={"error": "Expected a search_id and liked true or false"},
+        )
 
-    if next_song is None:
+    session = await session_manager.get_session(search_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "Session not found"})
+
+    # One gradient step and one pass over the artist's songs per vote
+    with span("vote", search_id=search_id):
+        songs, matrix = await repository.aget_artist_song_matrix(session["spotify_id"])
+        rows = {song["spotify_id"]: row for row, song in enumerate(songs)}
+        model = session["model"]
+        # Songs imported since the session began are rows past the bitmap
+        shown = np.zeros(len(songs), dtype=bool)
+        bits = np.unpackbits(np.frombuffer(session["shown"], dtype=np.uint8))
+        shown[: len(bits)] = bits[: len(songs)]
+        if (current_row := rows.get(session["current"])) is not None:
+            model.vote(matrix[current_row], liked=liked)
+            shown[current_row] = True
+        next_row = model.next_song(matrix, shown=shown)
+
+    if next_row is None:
         return {"status": "complete"}
 
-    return {"status": "continue", "song": next_song.to_dict()}
+    next_song = songs[next_row]
+    await session_manager.update_session(
+        search_id, model=model, shown=shown, current=next_song["spotify_id"]
+    )
+    return {
+        "status": "continue",
+        "song": to_song(next_song, session["artist_name"]).to_dict(),
+    }
+
+
+@app.post("/api/playlist")
+async def create_playlist(request: Request):
+    """The songs the session's votes score best, starting from the current
+    one and ordered for smooth transitions in tempo, key and energy."""
+    data = await request.json()
+    search_id = data.get("search_id")
+    length = data.get("length", 20)
+    if (
+        not isinstance(search_id, str)
+        or not isinstance(length, int)
+        or isinstance(length, bool)
+    ):
+        return JSONResponse(
+            status_code=422,
+            content={"error": "Expected a search_id and an integer length"},
+        )
+    length = max(1, min(length, MAX_PLAYLIST_LENGTH))
+
+    session = await session_manager.get_session(search_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "Session not found"})
+
+    with span("playlist", search_id=search_id, length=length):
+        songs, matrix = await repository.aget_artist_song_matrix(session["spotify_id"])
+        rows = [
+            row
+            for row, song in enumerate(songs)
+            if song["spotify_id"] == session["current"]
+        ]
+        rows += [
+            int(row)
+            for row in session["model"].best_songs(matrix, limit=length)
+            if row not in rows
+        ]
+        rows = rows[:length]
+        # CPU bound for tens of milliseconds, off the event loop
+        order = await asyncio.to_thread(sequence, matrix[rows])
+
+    return {
+        "songs": [
+            to_song(songs[rows[index]], session["artist_name"]).to_dict()
+            for index in order
+        ]
+    }
 
 
 @app.post("/api/start-search")
@@ -433,22 +515,66 @@ async def start_search(request: Request):
     search_query = data["spotifyId"]
     search_id = str(uuid.uuid4())
 
-    # Here you'll need to add Spotify API call to search for artist
-    # and get their Spotify ID and name
-    spotify_id = search_query
-    artist_name = f"Artist_{search_query}"
+    # The query may be an artist's Spotify ID or (part of) their name
+    with span("artist_lookup", query=search_query):
+        candidates = await repository.asearch_artists(search_query)
+    if not candidates:
+        return JSONResponse(
+            status_code=404, content={"error": f"No artist found for {search_query!r}"}
+        )
+    spotify_id = candidates[0].id
+    artist_name = candidates[0].name
 
-    # Store in active_searches for SSE updates
-    active_searches[search_id] = {"spotify_id": spotify_id, "artist_name": artist_name}
+    # Any worker can stream the search from here
+    await search_registry.register(
+        search_id=search_id, spotify_id=spotify_id, artist_name=artist_name
+    )
 
-    return {"searchId": search_id, "artistId": spotify_id, "artistName": artist_name}
+    return {
+        "searchId": search_id,
+        "artistId": spotify_id,
+        "artistName": artist_name,
+        "candidates": [
+            {"artistId": candidate.id, "artistName": candidate.name}
+            for candidate in candidates
+        ],
+    }
+
+@app.get("/api/artists/{artist_id}/similar")
+async def get_similar_artists(artist_id: str, limit: int = 5):
+    with span("similar_artists", artist_id=artist_id):
+        return await repository.aget_similar_artists(artist_id, limit=limit)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return render_metrics()
+
+@app.get("/api/cache-stats")
+async def get_cache_stats():
+    return cache_stats()
 
 @app.get("/api/search-updates/{search_id}")
-async def search_updates(search_id: str):
-    if search_id not in active_searches:
+async def search_updates(search_id: str, last_event_id: Optional[str] = Header(None)):
+    search = await search_registry.get(search_id)
+    if search is None:
         return {"error": "Search not found"}
 
-    return StreamingResponse(event_generator(search_id), media_type="text/event-stream")
+    # Sent by the browser when it reconnects, to pick up where it left off
+    resuming = bool(last_event_id and STREAM_ID.fullmatch(last_event_id))
+    if not resuming:
+        last_event_id = "0-0"
+
+    # The first stream for an artist starts their import, on this worker
+    spotify_id = search["spotify_id"]
+    if not resuming and await import_broadcast.claim(spotify_id, owner=WORKER_ID):
+        task = asyncio.create_task(run_import(spotify_id, search["artist_name"]))
+        import_tasks.add(task)
+        task.add_done_callback(import_tasks.discard)
+
+    return StreamingResponse(
+        event_generator(search_id, spotify_id, search["artist_name"], last_event_id),
+        media_type="text/event-stream",
+    )
 
 
 if __name__ == "__main__":
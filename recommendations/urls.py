@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from songs import views as songs_views
+
 urlpatterns = [
+    path("metrics", songs_views.metrics, name="metrics"),
     path("polls/", include("polls.urls")),
     path("songs/", include("songs.urls")),
     path("admin/", admin.site.urls),
@@ -0,0 +1,6 @@
+"""Artists, albums and songs imported from Spotify, and what is built on them.
+
+Modules without models of their own, such as cache, metrics, search and
+profiles, don't import Django, so they can be used and unit tested without
+settings configured.
+"""
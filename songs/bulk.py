@@ -0,0 +1,81 @@
+from typing import Optional, TypeVar
+
+from django.db import connections, models, router, transaction
+
+# Below this many rows a multi-row INSERT is as quick as COPY
+COPY_MIN_ROWS = 500
+
+ModelT = TypeVar("ModelT", bound=models.Model)
+
+
+def bulk_upsert(
+    model: type[ModelT],
+    objs: list[ModelT],
+    unique_fields: Optional[list[str]] = None,
+    update_fields: Optional[list[str]] = None,
+) -> list[ModelT]:
+    """Insert objs, updating update_fields of the rows that already exist, or
+    leaving existing rows alone when there are no update_fields.
+
+    On Postgres, large batches are streamed into a temporary table with COPY
+    and merged with a single INSERT ... SELECT ... ON CONFLICT, instead of
+    sending every value as a query parameter. Elsewhere this is bulk_create.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != "postgresql" or len(objs) < COPY_MIN_ROWS:
+        if update_fields:
+            return model._default_manager.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=update_fields,
+            )
+        return model._default_manager.bulk_create(objs, ignore_conflicts=True)
+
+    quote_name = connection.ops.quote_name
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if not isinstance(field, models.AutoField)
+    ]
+    columns = ", ".join(quote_name(field.column) for field in fields)
+    table = quote_name(model._meta.db_table)
+    staging_table = quote_name(f"{model._meta.db_table}_staging")
+    if update_fields:
+        conflict_columns = ", ".join(
+            quote_name(model._meta.get_field(name).column)
+            for name in unique_fields or [model._meta.pk.name]
+        )
+        updates = ", ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in (
+                quote_name(model._meta.get_field(name).column)
+                for name in update_fields
+            )
+        )
+        on_conflict = f"ON CONFLICT ({conflict_columns}) DO UPDATE SET {updates}"
+    else:
+        on_conflict = "ON CONFLICT DO NOTHING"
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Only the columns, none of the constraints. Dropped as soon as it is
+        # merged rather than on commit, as an outer transaction may upsert
+        # into the same table again
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {staging_table} AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        with cursor.copy(f"COPY {staging_table} ({columns}) FROM STDIN") as copy:
+            for obj in objs:
+                copy.write_row(
+                    [
+                        field.get_db_prep_save(field.pre_save(obj, True), connection)
+                        for field in fields
+                    ]
+                )
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM {staging_table} {on_conflict}"
+        )
+        cursor.execute(f"DROP TABLE {staging_table}")
+    return objs
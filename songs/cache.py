@@ -0,0 +1,130 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+# Kept free of Django imports so the FastAPI app can share these caches
+ARTIST_CACHE_SIZE = 1024
+ARTIST_DATA_CACHE_SIZE = 256
+CACHE_TTL_SECONDS = 5 * 60
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, name: str, max_size: int, ttl_seconds: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+artist_cache = LRUCache(
+    name="artists", max_size=ARTIST_CACHE_SIZE, ttl_seconds=CACHE_TTL_SECONDS
+)
+artist_songs_cache = LRUCache(
+    name="artist_songs", max_size=ARTIST_DATA_CACHE_SIZE, ttl_seconds=CACHE_TTL_SECONDS
+)
+artist_features_cache = LRUCache(
+    name="artist_features",
+    max_size=ARTIST_DATA_CACHE_SIZE,
+    ttl_seconds=CACHE_TTL_SECONDS,
+)
+# Centered feature matrices of songs people are voting on, see songs.preferences
+artist_matrix_cache = LRUCache(
+    name="artist_matrices",
+    max_size=ARTIST_DATA_CACHE_SIZE,
+    ttl_seconds=CACHE_TTL_SECONDS,
+)
+# Spotify search results by normalized query, empty results included, so a
+# name we have no artist for costs one Spotify search per TTL
+artist_search_cache = LRUCache(
+    name="artist_search",
+    max_size=ARTIST_CACHE_SIZE,
+    ttl_seconds=CACHE_TTL_SECONDS,
+)
+# Every artist profile vector under one key, see ArtistProfile.objects.vectors
+artist_profiles_cache = LRUCache(
+    name="artist_profiles", max_size=1, ttl_seconds=CACHE_TTL_SECONDS
+)
+ALL_CACHES = [
+    artist_cache,
+    artist_songs_cache,
+    artist_features_cache,
+    artist_matrix_cache,
+    artist_search_cache,
+    artist_profiles_cache,
+]
+
+
+def invalidate_artist(artist_id: str):
+    """Drop everything cached for an artist, called whenever an import writes
+    new rows for them."""
+    for cache in ALL_CACHES:
+        cache.invalidate(artist_id)
+
+
+def clear_caches():
+    for cache in ALL_CACHES:
+        cache.clear()
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {cache.name: cache.stats() for cache in ALL_CACHES}
@@ -0,0 +1,96 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from songs.spotify.spotify_serializer import SpotifyTrack
+
+# Remasters and re-releases of a recording are rarely more than a second or
+# two apart
+DURATION_TOLERANCE_MS = 2000
+DEDUPE_KEY_LENGTH = 255
+# Annotations that name a release of the recording rather than a different one.
+# Live versions, remixes and acoustic takes keep their own songs
+RELEASE_ANNOTATION = re.compile(
+    r"\s*(?:[\(\[][^\)\]]*\b(?:remaster(?:ed)?|album version|single version|"
+    r"feat\.?|ft\.?|with)\b[^\)\]]*[\)\]]|"
+    r"-\s+(?:\d{4}\s+)?(?:remaster(?:ed)?|album version|single version)\b.*$)",
+    re.IGNORECASE,
+)
+
+
+def normalize_title(title: str) -> str:
+    """'Sóng (feat. Guest) - 2011 Remaster' -> 'song'. Unlike artist search,
+    letters outside ASCII are kept, or every title in another script would
+    normalize to the same empty string."""
+    title = unicodedata.normalize("NFKD", RELEASE_ANNOTATION.sub("", title).casefold())
+    title = "".join(char for char in title if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", title))
+
+
+def duration_bucket(duration_ms: int) -> int:
+    return duration_ms // DURATION_TOLERANCE_MS
+
+
+def dedupe_key(title: str, primary_artist_id: str, duration_ms: int) -> str:
+    key = f"{primary_artist_id}:{duration_bucket(duration_ms)}:{normalize_title(title)}"
+    return key[:DEDUPE_KEY_LENGTH]
+
+
+def nearby_dedupe_keys(key: str) -> list[str]:
+    """The key itself and the keys of the neighbouring duration buckets, which
+    hold recordings within DURATION_TOLERANCE_MS that fell across a bucket
+    boundary."""
+    artist_id, bucket, title = key.split(":", 2)
+    return [
+        f"{artist_id}:{int(bucket) + offset}:{title}"[:DEDUPE_KEY_LENGTH]
+        for offset in (-1, 0, 1)
+    ]
+
+
+@dataclass(frozen=True)
+class TrackKey:
+    id: str
+    dedupe_key: str
+    duration_ms: int
+    isrc: Optional[str] = None
+
+
+def spotify_track_key(track: SpotifyTrack) -> TrackKey:
+    return TrackKey(
+        id=track.id,
+        dedupe_key=dedupe_key(
+            title=track.name,
+            primary_artist_id=track.artists[0].id,
+            duration_ms=track.duration_ms,
+        ),
+        duration_ms=track.duration_ms,
+        isrc=track.isrc,
+    )
+
+
+class TrackDedupeIndex:
+    """Recordings seen so far, by ISRC and by dedupe key. find() returns the
+    id of the first recording added that a track duplicates: the same ISRC,
+    or the same primary artist and normalized title within
+    DURATION_TOLERANCE_MS."""
+
+    def __init__(self, tracks: Iterable[TrackKey] = ()):
+        self._by_isrc: dict[str, str] = {}
+        self._by_key: dict[str, list[TrackKey]] = {}
+        for track in tracks:
+            self.add(track)
+
+    def add(self, track: TrackKey):
+        if track.isrc:
+            self._by_isrc.setdefault(track.isrc, track.id)
+        self._by_key.setdefault(track.dedupe_key, []).append(track)
+
+    def find(self, track: TrackKey) -> Optional[str]:
+        if track.isrc and (canonical_id := self._by_isrc.get(track.isrc)):
+            return canonical_id
+        for key in nearby_dedupe_keys(track.dedupe_key):
+            for seen in self._by_key.get(key, ()):
+                if abs(seen.duration_ms - track.duration_ms) <= DURATION_TOLERANCE_MS:
+                    return seen.id
+        return None
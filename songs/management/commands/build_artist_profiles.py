@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from songs.models import ArtistProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every artist's feature profile from the songs in the "
+        "database. Imports keep them up to date from then on."
+    )
+
+    def handle(self, *args, **options):
+        ArtistProfile.objects.rebuild()  # type: ignore
+        self.stdout.write(f"Built {ArtistProfile.objects.count()} artist profiles")
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from songs.spotify.shared import SharedRateLimiter, SharedToken
+
+DEFAULT_REQUESTS_PER_SECOND = 10
+PROGRESS_EVERY = 25
+
+
+def read_artist_ids(path: Path) -> list[str]:
+    """One Spotify artist id per line, blank lines and # comments skipped."""
+    artist_ids = []
+    for line in path.read_text().splitlines():
+        artist_id = line.split("#", 1)[0].strip()
+        if artist_id:
+            artist_ids.append(artist_id)
+    return list(dict.fromkeys(artist_ids))
+
+
+def read_checkpoint(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    return set(path.read_text().split())
+
+
+# Worker processes are spawned, so everything Django related is imported
+# inside them once django.setup() has run
+def init_worker(rate_limiter: SharedRateLimiter, shared_token: SharedToken):
+    import django
+
+    django.setup()
+    from songs.spotify.spotify_client import SpotifyClient
+
+    SpotifyClient.rate_limiter = rate_limiter
+    SpotifyClient.shared_token = shared_token
+
+
+def import_artist(artist_id: str) -> tuple[str, int, Optional[str]]:
+    from songs.spotify.spotify import get_artist_track_features
+
+    try:
+        return artist_id, len(get_artist_track_features(artist_id)), None
+    except Exception as error:
+        return artist_id, 0, repr(error)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import every artist listed in a file across a pool of worker processes. "
+        "Finished artists are checkpointed, so an interrupted run can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("artist_file", type=Path)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--requests-per-second",
+            type=float,
+            default=DEFAULT_REQUESTS_PER_SECOND,
+            help="Spotify request budget shared by all workers",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="File of finished artist ids, defaults to <artist_file>.done",
+        )
+
+    def handle(self, *args, **options):
+        artist_file: Path = options["artist_file"]
+        checkpoint_path: Path = options["checkpoint"] or artist_file.with_name(
+            f"{artist_file.name}.done"
+        )
+        workers: int = options["workers"]
+
+        artist_ids = read_artist_ids(artist_file)
+        finished = read_checkpoint(checkpoint_path)
+        pending = [artist_id for artist_id in artist_ids if artist_id not in finished]
+        self.stdout.write(
+            f"{len(pending)} artists to import, {len(artist_ids) - len(pending)} "
+            f"already done, {workers} workers"
+        )
+        if not pending:
+            return
+
+        context = multiprocessing.get_context("spawn")
+        rate_limiter = SharedRateLimiter(
+            requests_per_second=options["requests_per_second"],
+            burst=workers,
+            context=context,
+        )
+        shared_token = SharedToken(context=context)
+        # Workers open their own connections
+        connections.close_all()
+
+        imported = failed = num_tracks = 0
+        start = time.monotonic()
+        with (
+            context.Pool(
+                processes=workers,
+                initializer=init_worker,
+                initargs=(rate_limiter, shared_token),
+            ) as pool,
+            checkpoint_path.open("a") as checkpoint,
+        ):
+            for artist_id, artist_tracks, error in pool.imap_unordered(
+                import_artist, pending
+            ):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Failed to import {artist_id}: {error}")
+                    continue
+                checkpoint.write(f"{artist_id}\n")
+                checkpoint.flush()
+                imported += 1
+                num_tracks += artist_tracks
+                if imported % PROGRESS_EVERY == 0:
+                    self.stdout.write(self.progress(imported, num_tracks, start))
+
+        self.stdout.write(self.progress(imported, num_tracks, start))
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} artists, {failed} failed")
+        )
+
+    def progress(self, imported: int, num_tracks: int, start: float) -> str:
+        elapsed = max(time.monotonic() - start, 1e-9)
+        return (
+            f"{imported} artists, {num_tracks} tracks in {elapsed:.1f}s "
+            f"({imported / elapsed:.2f} artists/s, {num_tracks / elapsed:.1f} tracks/s)"
+        )
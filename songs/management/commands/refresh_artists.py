@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from songs.refresher import REFRESH_AHEAD, RequestBudget
+from songs.spotify.shared import SharedRateLimiter
+from songs.spotify.spotify import refresh_stale_artists
+
+DEFAULT_MAX_REQUESTS = 500
+DEFAULT_REQUESTS_PER_SECOND = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-import the most searched artists before they go stale, within a "
+        "budget of Spotify requests per pass."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=DEFAULT_MAX_REQUESTS,
+            help="Spotify requests allowed per pass",
+        )
+        parser.add_argument(
+            "--requests-per-second", type=float, default=DEFAULT_REQUESTS_PER_SECOND
+        )
+        parser.add_argument(
+            "--refresh-ahead-hours",
+            type=float,
+            default=REFRESH_AHEAD.total_seconds() / 3600,
+            help="Refresh artists that will go stale within this many hours",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Seconds between passes, run a single pass when 0",
+        )
+
+    def handle(self, *args, **options):
+        refresh_ahead = timedelta(hours=options["refresh_ahead_hours"])
+        rate_limiter = SharedRateLimiter(
+            requests_per_second=options["requests_per_second"]
+        )
+        while True:
+            budget = RequestBudget(
+                max_requests=options["max_requests"], rate_limiter=rate_limiter
+            )
+            refreshed = refresh_stale_artists(
+                budget=budget, refresh_ahead=refresh_ahead
+            )
+            self.stdout.write(
+                f"Refreshed {len(refreshed)} artists with {budget.used} requests"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+from bisect import bisect_left
+from threading import Lock
+from urllib.parse import urlparse
+
+from songs.cache import cache_stats
+
+# Switched off by default, in which case recording costs one attribute check
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+SPOTIFY_ID_SEGMENT = re.compile(r"/[0-9A-Za-z]{22}(?=/|$)")
+API_VERSION_PREFIX = "/v1"
+
+LabelValues = tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: LabelValues = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values: dict[LabelValues, float] = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self.values.items()):
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: LabelValues = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # per label set: counts per bucket (last one is +Inf), sum
+        self.values: dict[LabelValues, tuple[list[int], float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values: str):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.values.get(
+                label_values, ([0] * (len(self.buckets) + 1), 0.0)
+            )
+            counts[bucket] += 1
+            self.values[label_values] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip([*self.buckets, "+Inf"], counts):
+                    cumulative += count
+                    labels = format_labels(
+                        (*self.label_names, "le"), (*label_values, str(bound))
+                    )
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def format_labels(label_names: LabelValues, label_values: LabelValues) -> str:
+    if not label_names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{value}"' for name, value in zip(label_names, label_values)
+    )
+    return "{" + pairs + "}"
+
+
+spotify_request_duration = Histogram(
+    "spotify_request_duration_seconds",
+    "Latency of Spotify API requests",
+    ("endpoint",),
+)
+spotify_requests = Counter(
+    "spotify_requests_total", "Spotify API responses", ("endpoint", "status")
+)
+spotify_response_bytes = Counter(
+    "spotify_response_bytes_total", "Bytes received from Spotify", ("endpoint",)
+)
+spotify_retries = Counter(
+    "spotify_retries_total", "Spotify requests retried", ("endpoint", "reason")
+)
+spotify_rate_limited = Counter(
+    "spotify_rate_limited_total", "Spotify responses with status 429", ("endpoint",)
+)
+spotify_token_refreshes = Counter(
+    "spotify_token_refreshes_total", "Spotify access tokens requested"
+)
+ALL_METRICS: list[Counter | Histogram] = [
+    spotify_request_duration,
+    spotify_requests,
+    spotify_response_bytes,
+    spotify_retries,
+    spotify_rate_limited,
+    spotify_token_refreshes,
+]
+
+
+def endpoint_label(url: str) -> str:
+    """/v1/artists/<id>/albums -> /artists/{id}/albums, so that labels don't
+    grow with the number of artists."""
+    path = urlparse(url).path.rstrip("/").removeprefix(API_VERSION_PREFIX)
+    return SPOTIFY_ID_SEGMENT.sub("/{id}", path)
+
+
+def observe_spotify_request(url: str, status: int, num_bytes: int, start: float):
+    if not METRICS_ENABLED:
+        return
+    endpoint = endpoint_label(url)
+    spotify_request_duration.observe(time.perf_counter() - start, endpoint)
+    spotify_requests.inc(endpoint, str(status))
+    spotify_response_bytes.inc(endpoint, amount=num_bytes)
+    if status == 429:
+        spotify_rate_limited.inc(endpoint)
+
+
+def observe_spotify_retry(url: str, reason: str):
+    if METRICS_ENABLED:
+        spotify_retries.inc(endpoint_label(url), reason)
+
+
+def observe_token_refresh():
+    if METRICS_ENABLED:
+        spotify_token_refreshes.inc()
+
+
+def render_metrics() -> str:
+    lines = [line for metric in ALL_METRICS for line in metric.render()]
+    for stat in ("hits", "misses", "evictions", "expirations"):
+        name = f"cache_{stat}_total"
+        lines += [f"# HELP {name} Artist cache {stat}", f"# TYPE {name} counter"]
+        lines += [
+            f'{name}{{cache="{cache}"}} {stats[stat]}'
+            for cache, stats in cache_stats().items()
+        ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,129 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_song_features(apps, schema_editor):
+    Song = apps.get_model("songs", "Song")
+    SongFeatures = apps.get_model("songs", "SongFeatures")
+    SongFeatures.objects.filter(
+        id__in=Song.objects.values("id"), song__isnull=True
+    ).update(song_id=models.F("id"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0003_alter_song_release_date_alter_songfeatures_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="songfeatures",
+            name="song",
+            field=models.OneToOneField(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="features",
+                to="songs.song",
+            ),
+        ),
+        migrations.RunPython(link_song_features, migrations.RunPython.noop),
+        # The through tables already exist as Django's auto-created M2M tables,
+        # so only the migration state changes here
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="AlbumArtist",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "album",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="songs.album",
+                            ),
+                        ),
+                        (
+                            "artist",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="songs.artist",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "songs_album_artists",
+                        "unique_together": {("album", "artist")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="album",
+                    name="artists",
+                    field=models.ManyToManyField(
+                        through="songs.AlbumArtist", to="songs.artist"
+                    ),
+                ),
+                migrations.CreateModel(
+                    name="SongArtist",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "song",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="songs.song",
+                            ),
+                        ),
+                        (
+                            "artist",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="songs.artist",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "songs_song_artists",
+                        "unique_together": {("song", "artist")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="song",
+                    name="artists",
+                    field=models.ManyToManyField(
+                        through="songs.SongArtist", to="songs.artist"
+                    ),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddIndex(
+            model_name="albumartist",
+            index=models.Index(
+                fields=["artist", "album"], name="songs_album_artist__311210_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="songartist",
+            index=models.Index(
+                fields=["artist", "song"], name="songs_song__artist__9758cb_idx"
+            ),
+        ),
+    ]
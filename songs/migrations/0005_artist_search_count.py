@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0004_songfeatures_song_albumartist_songartist"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artist",
+            name="search_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
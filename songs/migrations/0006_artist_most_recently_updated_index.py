@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0005_artist_search_count"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="artist",
+            name="most_recently_updated",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0006_artist_most_recently_updated_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artist",
+            name="popularity",
+            field=models.IntegerField(null=True),
+        ),
+    ]
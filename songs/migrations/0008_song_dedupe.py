@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0007_artist_popularity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="canonical",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="songs.song",
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="dedupe_key",
+            field=models.CharField(db_index=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="isrc",
+            field=models.CharField(db_index=True, max_length=12, null=True),
+        ),
+    ]
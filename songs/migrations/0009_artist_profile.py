@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-19 13:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0008_song_dedupe"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArtistProfile",
+            fields=[
+                (
+                    "artist",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="profile",
+                        serialize=False,
+                        to="songs.artist",
+                    ),
+                ),
+                ("num_songs", models.PositiveIntegerField(default=0)),
+                ("moments", models.BinaryField()),
+                ("histogram", models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-19 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("songs", "0009_artist_profile"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="album",
+            name="name",
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name="artist",
+            name="name",
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name="song",
+            name="track_name",
+            field=models.TextField(),
+        ),
+    ]
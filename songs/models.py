@@ -1,7 +1,28 @@
 from datetime import datetime, timedelta
+from itertools import batched
+from typing import Optional
 
-from django.db import models
+import numpy as np
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
+from songs.bulk import bulk_upsert
+from songs.cache import (
+    artist_cache,
+    artist_features_cache,
+    artist_matrix_cache,
+    artist_profiles_cache,
+    artist_songs_cache,
+)
+from songs.dedupe import (
+    DEDUPE_KEY_LENGTH,
+    TrackDedupeIndex,
+    TrackKey,
+    nearby_dedupe_keys,
+    spotify_track_key,
+)
+from songs.profiles import FEATURES, FeatureAggregate, feature_matrix, nearest
 from songs.spotify.spotify_serializer import (
     SpotifyAlbum,
     SpotifyArtist,
@@ -10,115 +31,396 @@ from songs.spotify.spotify_serializer import (
 )
 
 SPOTIFY_UUID_LENGTH = 22
-ARBITRARY_LENGTH = 50
+ARTIST_FRESHNESS = timedelta(hours=48)
+# Songs deduped per query, four parameters each, well within sqlite's limit
+DEDUPE_BATCH_SIZE = 2000
+# Fewer songs than this make for a profile that is mostly noise
+MIN_PROFILE_SONGS = 3
+SONG_FEATURE_FIELDS = [
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "key",
+    "liveness",
+    "loudness",
+    "mode",
+    "speechiness",
+    "tempo",
+    "time_signature",
+    "valence",
+]
 
 
+# Imports run in parallel workers that can meet the same rows (collaborating
+# artists share albums and tracks), so every write below is an
+# INSERT ... ON CONFLICT rather than a get-then-create
 class ArtistManager(models.Manager):
     def import_spotify_artist(
         self, spotify_artist: SpotifyArtist, is_updating: bool = True
     ):
-        return self.create(
-            id=spotify_artist.id,
-            name=spotify_artist.name,
-            is_updating=is_updating,
+        [db_artist] = self.bulk_create(
+            [
+                Artist(
+                    id=spotify_artist.id,
+                    name=spotify_artist.name,
+                    popularity=spotify_artist.popularity,
+                    is_updating=is_updating,
+                )
+            ],
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["name", "popularity"],
         )
+        return db_artist
+
+    def get_or_import_many(self, spotify_artists: list[SpotifyArtist]):
+        unique_artists = {artist.id: artist for artist in spotify_artists}
+        db_artists = {}
+        for artist_id in unique_artists:
+            if (db_artist := artist_cache.get(artist_id)) is not None:
+                db_artists[artist_id] = db_artist
+
+        missing_artists = [
+            Artist(id=artist.id, name=artist.name, is_updating=True)
+            for artist in unique_artists.values()
+            if artist.id not in db_artists
+        ]
+        if missing_artists:
+            self.bulk_create(missing_artists, ignore_conflicts=True)
+            for db_artist in self.filter(id__in=[a.id for a in missing_artists]):
+                artist_cache.set(db_artist.id, db_artist)
+                db_artists[db_artist.id] = db_artist
+        return [db_artists[artist_id] for artist_id in unique_artists]
 
     def get_or_import(self, spotify_artist: SpotifyArtist):
-        try:
-            return self.get(id=spotify_artist.id)
-        except Artist.DoesNotExist:
-            return self.import_spotify_artist(spotify_artist=spotify_artist)
+        [db_artist] = self.get_or_import_many([spotify_artist])
+        return db_artist
+
+    def stubs(self):
+        """Artists only known from the album and track listings they appear
+        on, which leave out everything but the name."""
+        return self.filter(popularity__isnull=True)
+
+    def hydrate(self, spotify_artists: list[SpotifyArtist]):
+        """Fill in stubs from full artist objects."""
+        self.bulk_update(
+            [
+                Artist(id=artist.id, name=artist.name, popularity=artist.popularity)
+                for artist in spotify_artists
+            ],
+            fields=["name", "popularity"],
+        )
+        for artist in spotify_artists:
+            artist_cache.invalidate(artist.id)
+
+    def record_searches(self, counts: dict[str, int]):
+        """Add counts to the artists' search_count, one UPDATE per distinct
+        count rather than per artist."""
+        artist_ids_by_count: dict[int, list[str]] = {}
+        for artist_id, count in counts.items():
+            artist_ids_by_count.setdefault(count, []).append(artist_id)
+        for count, artist_ids in artist_ids_by_count.items():
+            self.filter(id__in=artist_ids).update(
+                search_count=F("search_count") + count
+            )
+
+    def mark_updated(self, artist_id: str):
+        self.filter(id=artist_id).update(
+            most_recently_updated=timezone.now(), is_updating=False
+        )
+
+    def due_for_refresh(self, updated_before: datetime):
+        """Artists someone has searched for whose catalog was last imported
+        before updated_before, most searched first."""
+        return self.filter(
+            search_count__gt=0, most_recently_updated__lt=updated_before
+        ).order_by("-search_count", "most_recently_updated")
+
+    def stale_between(self, updated_after: datetime, updated_before: datetime):
+        """Artists last imported within [updated_after, updated_before), oldest
+        first, read as a range of the most_recently_updated index."""
+        return self.filter(
+            most_recently_updated__gte=updated_after,
+            most_recently_updated__lt=updated_before,
+        ).order_by("most_recently_updated")
 
 
 class Artist(models.Model):
     id = models.CharField(primary_key=True, max_length=SPOTIFY_UUID_LENGTH)
-    name = models.CharField(max_length=ARBITRARY_LENGTH)
+    # Spotify sets no limit on names, and Postgres would enforce one
+    name = models.TextField()
     is_updating = models.BooleanField(default=False)
     date_added = models.DateTimeField(auto_now_add=True)
-    most_recently_updated = models.DateTimeField(auto_now_add=True)
+    most_recently_updated = models.DateTimeField(auto_now_add=True, db_index=True)
+    search_count = models.PositiveIntegerField(default=0)
+    popularity = models.IntegerField(null=True)
     objects = ArtistManager()
 
     @property
     def recently_updated(self):
-        return self.most_recently_updated > datetime.now() - timedelta(hours=48)
+        # Stubs and artists whose import never finished have no catalog yet
+        return (
+            not self.is_updating
+            and self.most_recently_updated > timezone.now() - ARTIST_FRESHNESS
+        )
 
 
 class AlbumManager(models.Manager):
+    def import_spotify_albums(self, albums: list[SpotifyAlbum]):
+        albums = list({album.base.id: album for album in albums}.values())
+        db_artists: dict[str, Artist] = {
+            db_artist.id: db_artist
+            for db_artist in Artist.objects.get_or_import_many(  # type: ignore
+                [artist for album in albums for artist in album.base.artists]
+            )
+        }
+        with transaction.atomic():
+            db_albums = bulk_upsert(
+                Album,
+                [Album(id=album.base.id, name=album.base.name) for album in albums],
+                unique_fields=["id"],
+                update_fields=["name"],
+            )
+            bulk_upsert(
+                AlbumArtist,
+                [
+                    AlbumArtist(album=db_album, artist=db_artists[artist.id])
+                    for db_album, album in zip(db_albums, albums)
+                    for artist in album.base.artists
+                ],
+            )
+        return db_albums
+
     def import_spotify_album(self, album: SpotifyAlbum):
-        spotify_artists = album.base.artists
-        db_artists: list[Artist] = [
-            Artist.objects.get_or_import(spotify_artist=spotify_artist)  # type: ignore
-            for spotify_artist in spotify_artists
-        ]
-        db_album = self.create(id=album.base.id, name=album.base.name)
-        db_album.artists.set(db_artists)
+        [db_album] = self.import_spotify_albums([album])
         return db_album
 
 
 class Album(models.Model):
     id = models.CharField(primary_key=True, max_length=SPOTIFY_UUID_LENGTH)
-    name = models.CharField(max_length=ARBITRARY_LENGTH)
-    artists = models.ManyToManyField(Artist)
+    name = models.TextField()
+    artists = models.ManyToManyField(Artist, through="AlbumArtist")
     objects = AlbumManager()
 
 
+# Explicit versions of the tables Django generates for the M2M fields, so that
+# lookups starting from the artist side are covered by an index as well
+class AlbumArtist(models.Model):
+    album = models.ForeignKey(Album, on_delete=models.CASCADE)
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "songs_album_artists"
+        unique_together = [("album", "artist")]
+        indexes = [models.Index(fields=["artist", "album"])]
+
+
 class SongManager(models.Manager):
-    def import_spotify_track(self, track: SpotifyTrack, album: Album):
-        db_track = self.create(
-            id=track.id,
-            track_name=track.name,
-            duration_ms=track.duration_ms,
-            popularity=track.popularity,
-            is_explicit=track.is_explicit,
-            album=album,
+    def import_spotify_album_tracks(
+        self, album_tracks: list[tuple[Album, list[SpotifyTrack]]]
+    ):
+        # A row can only be upserted once per statement
+        track_albums = {
+            track.id: (track, album) for album, tracks in album_tracks for track in tracks
+        }
+        db_artists: dict[str, Artist] = {
+            db_artist.id: db_artist
+            for db_artist in Artist.objects.get_or_import_many(  # type: ignore
+                [
+                    artist
+                    for track, _ in track_albums.values()
+                    for artist in track.artists
+                ]
+            )
+        }
+        with transaction.atomic():
+            db_tracks = bulk_upsert(
+                Song,
+                [
+                    Song(
+                        id=track.id,
+                        track_name=track.name,
+                        duration_ms=track.duration_ms,
+                        popularity=track.popularity,
+                        is_explicit=track.is_explicit,
+                        album=album,
+                        isrc=track.isrc,
+                        dedupe_key=spotify_track_key(track).dedupe_key,
+                    )
+                    for track, album in track_albums.values()
+                ],
+                unique_fields=["id"],
+                update_fields=[
+                    "track_name",
+                    "duration_ms",
+                    "popularity",
+                    "is_explicit",
+                    "album",
+                    "isrc",
+                    "dedupe_key",
+                ],
+            )
+            bulk_upsert(
+                SongArtist,
+                [
+                    SongArtist(song=db_track, artist=db_artists[artist.id])
+                    for db_track, (track, _) in zip(db_tracks, track_albums.values())
+                    for artist in track.artists
+                ],
+            )
+        for artist_id in db_artists:
+            artist_songs_cache.invalidate(artist_id)
+            artist_features_cache.invalidate(artist_id)
+            artist_matrix_cache.invalidate(artist_id)
+        return db_tracks
+
+    def canonical(self):
+        """One song per recording, leaving out the copies on other releases."""
+        return self.filter(canonical__isnull=True)
+
+    def assign_canonical(self, db_songs: list["Song"]):
+        """Point every song that duplicates a recording we already have at
+        that recording's song, see songs.dedupe. Songs we already had win,
+        then the earliest of db_songs, so list album tracks first."""
+        song_keys = {
+            song.id: TrackKey(
+                id=song.id,
+                dedupe_key=song.dedupe_key,
+                duration_ms=song.duration_ms,
+                isrc=song.isrc,
+            )
+            for song in db_songs
+            if song.dedupe_key
+        }
+        index = TrackDedupeIndex(
+            TrackKey(id=id, dedupe_key=key, duration_ms=duration_ms, isrc=isrc)
+            # A song can turn up for more than one batch
+            for id, key, duration_ms, isrc in dict.fromkeys(
+                row
+                for song_key_batch in batched(song_keys.values(), DEDUPE_BATCH_SIZE)
+                for row in self._dedupe_candidates(song_key_batch)
+                if row[0] not in song_keys
+            )
         )
-        db_artists: list[Artist] = [
-            Artist.objects.get_or_import(spotify_artist=spotify_artist)  # type: ignore
-            for spotify_artist in track.artists
-        ]
-        db_track.artists.set(db_artists)
+
+        duplicates = []
+        for db_song in db_songs:
+            if (song_key := song_keys.get(db_song.id)) is None:
+                continue
+            db_song.canonical_id = index.find(song_key)
+            if db_song.canonical_id is None:
+                index.add(song_key)
+            else:
+                duplicates.append(db_song)
+        # Usually a handful of songs, against every song for the one below
+        self.bulk_update(duplicates, fields=["canonical"])
+        for id_batch in batched(
+            (song.id for song in db_songs if song.canonical_id is None),
+            DEDUPE_BATCH_SIZE,
+        ):
+            self.filter(id__in=id_batch, canonical__isnull=False).update(canonical=None)
+        return db_songs
+
+    def _dedupe_candidates(self, song_keys: tuple[TrackKey, ...]):
+        """Canonical songs that might be the same recording as one of
+        song_keys, as (id, dedupe_key, duration_ms, isrc)."""
+        nearby_keys = {
+            key
+            for song_key in song_keys
+            for key in nearby_dedupe_keys(song_key.dedupe_key)
+        }
+        isrcs = {song_key.isrc for song_key in song_keys if song_key.isrc}
+        return (
+            self.canonical()
+            .filter(Q(dedupe_key__in=nearby_keys) | Q(isrc__in=isrcs))
+            .values_list("id", "dedupe_key", "duration_ms", "isrc")
+        )
+
+    def import_spotify_tracks(self, tracks: list[SpotifyTrack], album: Album):
+        return self.import_spotify_album_tracks([(album, tracks)])
+
+    def import_spotify_track(self, track: SpotifyTrack, album: Album):
+        [db_track] = self.import_spotify_tracks(tracks=[track], album=album)
         return db_track
 
 
 class Song(models.Model):
     id = models.CharField(primary_key=True, max_length=SPOTIFY_UUID_LENGTH)
-    track_name = models.CharField(max_length=ARBITRARY_LENGTH)
+    track_name = models.TextField()
     duration_ms = models.IntegerField()
     release_date = models.DateField(auto_now_add=True)  # very temporary workaround
     popularity = models.IntegerField()
     is_explicit = models.BooleanField(default=True)
-    artists = models.ManyToManyField(Artist)
+    artists = models.ManyToManyField(Artist, through="SongArtist")
     album = models.ForeignKey(Album, on_delete=models.CASCADE)
+    # Only set when Spotify lists it, see SpotifyTrack
+    isrc = models.CharField(max_length=12, null=True, db_index=True)
+    # See songs.dedupe, empty for songs imported before it existed
+    dedupe_key = models.CharField(
+        max_length=DEDUPE_KEY_LENGTH, default="", db_index=True
+    )
+    # The song for the same recording on another release, null for the
+    # song every copy points at
+    canonical = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, related_name="duplicates"
+    )
 
     objects = SongManager()
 
 
+class SongArtist(models.Model):
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "songs_song_artists"
+        unique_together = [("song", "artist")]
+        indexes = [models.Index(fields=["artist", "song"])]
+
+
 class SongFeaturesManager(models.Manager):
-    def get_song_features_by_artist(self, artist: SpotifyArtist):
-        db_songs = Song.objects.filter(artists=artist)
-        db_song_features = self.filter(song_id=db_songs)
-        return db_song_features
+    def get_song_features_by_artist(self, artist_id: str):
+        return self.filter(
+            song__artists=artist_id, song__canonical__isnull=True
+        ).select_related("song")
 
-    def import_song_features(self, features: SpotifyTrackFeatures):
-        return self.create(
-            id=features.id,
-            acousticness=features.acousticness,
-            danceability=features.danceability,
-            energy=features.energy,
-            instrumentalness=features.instrumentalness,
-            key=features.key,
-            liveness=features.liveness,
-            loudness=features.loudness,
-            mode=1 if features.is_major else 0,
-            speechiness=features.speechiness,
-            tempo=features.tempo,
-            time_signature=features.time_signature,
-            valence=features.valence,
+    def import_many_song_features(self, features_list: list[SpotifyTrackFeatures]):
+        return bulk_upsert(
+            SongFeatures,
+            [
+                SongFeatures(
+                    id=features.id,
+                    song_id=features.id,
+                    acousticness=features.acousticness,
+                    danceability=features.danceability,
+                    energy=features.energy,
+                    instrumentalness=features.instrumentalness,
+                    key=features.key,
+                    liveness=features.liveness,
+                    loudness=features.loudness,
+                    mode=1 if features.is_major else 0,
+                    speechiness=features.speechiness,
+                    tempo=features.tempo,
+                    time_signature=features.time_signature,
+                    valence=features.valence,
+                )
+                for features in features_list
+            ],
+            unique_fields=["id"],
+            update_fields=SONG_FEATURE_FIELDS,
         )
 
+    def import_song_features(self, features: SpotifyTrackFeatures):
+        [db_features] = self.import_many_song_features([features])
+        return db_features
+
 
 class SongFeatures(models.Model):
     id = models.CharField(primary_key=True, max_length=SPOTIFY_UUID_LENGTH)
+    song = models.OneToOneField(
+        Song, on_delete=models.CASCADE, null=True, related_name="features"
+    )
     acousticness = models.FloatField()
     danceability = models.FloatField()
     energy = models.FloatField()
@@ -133,3 +435,133 @@ class SongFeatures(models.Model):
     valence = models.FloatField()
 
     objects = SongFeaturesManager()
+
+
+class ArtistProfileManager(models.Manager):
+    def recount_for_song_features(self, db_features: list[SongFeatures]):
+        """Recount from scratch the profile of every artist on the songs of
+        newly imported features. Each import recounts with the profiles
+        locked, so that imports of the same songs running at once neither
+        count a song twice nor miss one."""
+        artist_ids = list(
+            SongArtist.objects.filter(
+                song_id__in=[features.song_id for features in db_features]
+            )
+            .values_list("artist_id", flat=True)
+            .distinct()
+        )
+        if not artist_ids:
+            return
+
+        with transaction.atomic():
+            # Profiles that don't exist yet can't be locked, so create them
+            self.bulk_create(
+                [self._profile(artist_id) for artist_id in artist_ids],
+                ignore_conflicts=True,
+            )
+            list(self.select_for_update().filter(artist_id__in=artist_ids))
+            counted = self._count(artist_ids)
+            self.bulk_create(
+                [
+                    counted.get(artist_id) or self._profile(artist_id)
+                    for artist_id in artist_ids
+                ],
+                update_conflicts=True,
+                unique_fields=["artist"],
+                update_fields=["num_songs", "moments", "histogram"],
+            )
+        artist_profiles_cache.clear()
+
+    def rebuild(self):
+        """Recount every profile, for songs imported before profiles existed."""
+        profiles = list(self._count().values())
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(profiles)
+        artist_profiles_cache.clear()
+
+    def _count(
+        self, artist_ids: Optional[list[str]] = None
+    ) -> dict[str, "ArtistProfile"]:
+        """Profiles counted from the features of canonical songs, by artist id,
+        of every artist with any or only of artist_ids."""
+        song_artists = SongArtist.objects.filter(
+            song__canonical__isnull=True, song__features__isnull=False
+        )
+        if artist_ids is not None:
+            song_artists = song_artists.filter(artist_id__in=artist_ids)
+        rows_by_artist: dict[str, list[tuple]] = {}
+        for artist_id, *values in song_artists.values_list(
+            "artist_id", *(f"song__features__{feature}" for feature in FEATURES)
+        ):
+            rows_by_artist.setdefault(artist_id, []).append(values)
+
+        profiles = {}
+        for artist_id, rows in rows_by_artist.items():
+            aggregate = FeatureAggregate()
+            aggregate.add(feature_matrix(rows))
+            profiles[artist_id] = self._profile(artist_id, aggregate)
+        return profiles
+
+    def _profile(
+        self, artist_id: str, aggregate: Optional[FeatureAggregate] = None
+    ) -> "ArtistProfile":
+        profile = ArtistProfile(artist_id=artist_id)
+        profile.aggregate = aggregate or FeatureAggregate()
+        return profile
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """Artist ids and the matching rows of profile vectors, for every
+        artist with enough songs to compare."""
+
+        def load():
+            artist_ids, vectors = [], []
+            for artist_id, num_songs, moments, histogram in self.filter(
+                num_songs__gte=MIN_PROFILE_SONGS
+            ).values_list("artist_id", "num_songs", "moments", "histogram"):
+                aggregate = FeatureAggregate.from_bytes(num_songs, moments, histogram)
+                artist_ids.append(artist_id)
+                vectors.append(aggregate.vector())
+            return artist_ids, np.array(vectors).reshape(len(artist_ids), -1)
+
+        return artist_profiles_cache.get_or_set("vectors", load)
+
+    def similar_to(self, artist_id: str, limit: int = 5) -> list[tuple[str, float]]:
+        """(artist id, distance) of the artists whose songs' features are
+        distributed most like artist_id's, closest first."""
+        artist_ids, vectors = self.vectors()
+        try:
+            row = artist_ids.index(artist_id)
+        except ValueError:
+            return []
+        return [
+            (artist_ids[other_row], distance)
+            for other_row, distance in nearest(vectors[row], vectors, limit + 1)
+            if other_row != row
+        ][:limit]
+
+
+class ArtistProfile(models.Model):
+    artist = models.OneToOneField(
+        Artist, on_delete=models.CASCADE, primary_key=True, related_name="profile"
+    )
+    num_songs = models.PositiveIntegerField(default=0)
+    # Aggregates of the artist's song features packed as numpy arrays, see
+    # songs.profiles.FeatureAggregate
+    moments = models.BinaryField()
+    histogram = models.BinaryField()
+
+    objects = ArtistProfileManager()
+
+    @property
+    def aggregate(self) -> FeatureAggregate:
+        if not self.num_songs:
+            return FeatureAggregate()
+        return FeatureAggregate.from_bytes(
+            self.num_songs, bytes(self.moments), bytes(self.histogram)
+        )
+
+    @aggregate.setter
+    def aggregate(self, aggregate: FeatureAggregate):
+        self.num_songs = aggregate.num_songs
+        self.moments, self.histogram = aggregate.to_bytes()
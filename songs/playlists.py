@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+
+from songs.profiles import FEATURES
+
+# Transitions are judged on tempo, energy and key, and key is a pitch class
+# that wraps around
+LINEAR_FEATURES = ("tempo", "energy")
+CIRCULAR_FEATURES = ("key",)
+# Distances, greedy ordering and then 2-opt, each cut short when this runs out
+TIME_BUDGET_SECONDS = 0.05
+# Rows of the distance matrix computed at a time, small enough to stay in cache
+BLOCK_ROWS = 128
+
+
+def transition_points(songs: np.ndarray) -> np.ndarray:
+    """Rows of a scaled (or centered) feature matrix as points whose Euclidean
+    distances are transition distances. A circular feature goes around a
+    circle of circumference 1, so close keys are about as far apart as their
+    scaled values and the last key is next to the first."""
+    columns = [songs[:, FEATURES.index(feature)] for feature in LINEAR_FEATURES]
+    for feature in CIRCULAR_FEATURES:
+        angle = 2 * np.pi * songs[:, FEATURES.index(feature)]
+        columns += [np.cos(angle) / (2 * np.pi), np.sin(angle) / (2 * np.pi)]
+    return np.stack(columns, axis=1).astype(np.float32)
+
+
+def transition_distances(songs: np.ndarray) -> np.ndarray:
+    """Distance between every pair of rows of a scaled feature matrix, from
+    |a - b|² = |a|² + |b|² - 2a·b a block of rows at a time."""
+    points = transition_points(songs)
+    norms = (points**2).sum(axis=1)
+    distances = np.empty((len(points), len(points)), dtype=np.float32)
+    for start in range(0, len(points), BLOCK_ROWS):
+        block = distances[start : start + BLOCK_ROWS]
+        np.matmul(points[start : start + BLOCK_ROWS], points.T, out=block)
+        block *= -2
+        block += norms[start : start + BLOCK_ROWS, None]
+        block += norms
+        np.maximum(block, 0, out=block)
+        np.sqrt(block, out=block)
+    return distances
+
+
+def path_length(path: np.ndarray, distances: np.ndarray) -> float:
+    return float(distances[path[:-1], path[1:]].sum())
+
+
+def greedy_path(
+    distances: np.ndarray, start: int = 0, deadline: float = np.inf
+) -> np.ndarray:
+    """Every row once, from start, always on to the closest song left. Once
+    time.perf_counter() passes deadline the songs left follow in order of
+    their distance from the last one."""
+    # Songs already in the path are infinitely far from the rest
+    visited = np.zeros(len(distances), dtype=np.float32)
+    row = np.empty(len(distances), dtype=np.float32)
+    path = np.empty(len(distances), dtype=np.intp)
+    path[0] = current = start
+    visited[start] = np.inf
+    for position in range(1, len(distances)):
+        if time.perf_counter() > deadline:
+            rest = np.flatnonzero(visited == 0)
+            path[position:] = rest[np.argsort(distances[current, rest], kind="stable")]
+            break
+        np.add(distances[current], visited, out=row)
+        path[position] = current = int(row.argmin())
+        visited[current] = np.inf
+    return path
+
+
+def two_opt(path: np.ndarray, distances: np.ndarray, deadline: float) -> np.ndarray:
+    """Reverse stretches of the path while that shortens it, until no reversal
+    does or time.perf_counter() passes deadline. The first song stays first.
+
+    Each pass tries stretches starting after the longest transitions first,
+    where greedy ordering leaves the most to gain, and every end of a stretch
+    at once."""
+    path = path.copy()
+    # edges[k] is the transition from path[k] to path[k + 1]
+    edges = distances[path[:-1], path[1:]]
+    improved = True
+    while improved:
+        improved = False
+        for start in np.argsort(-edges[:-1], kind="stable") + 1:
+            if time.perf_counter() > deadline:
+                return path
+            before, first = path[start - 1], path[start]
+            lasts = path[start + 1 :]
+            # Reversing path[start:end + 1] swaps transitions (before, first)
+            # and (last, after) for (before, last) and (first, after)
+            delta = distances[before].take(lasts) - edges[start - 1]
+            delta[:-1] += distances[first].take(lasts[1:]) - edges[start + 1 :]
+            best = int(delta.argmin())
+            if delta[best] < -1e-6:
+                end = start + 1 + best
+                path[start : end + 1] = path[start : end + 1][::-1]
+                edges[start:end] = edges[start:end][::-1]
+                edges[start - 1] = distances[before, path[start]]
+                if end < len(edges):
+                    edges[end] = distances[path[end], path[end + 1]]
+                improved = True
+    return path
+
+
+def sequence(
+    songs: np.ndarray, start: int = 0, time_budget: float = TIME_BUDGET_SECONDS
+) -> list[int]:
+    """Rows of a scaled feature matrix in playlist order, starting at start,
+    with each song as close as it can be to the one before in tempo, key and
+    energy."""
+    if not len(songs):
+        return []
+    deadline = time.perf_counter() + time_budget
+    distances = transition_distances(songs)
+    path = two_opt(greedy_path(distances, start, deadline), distances, deadline)
+    return [int(row) for row in path]
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import numpy as np
+
+from songs.profiles import FEATURES, scale
+
+# How far a single vote moves the preference, larger adapts quicker but
+# forgets earlier votes sooner
+LEARNING_RATE = 2.0
+
+
+def centered(features: np.ndarray) -> np.ndarray:
+    """An artist's feature_matrix scaled and centered on their average song,
+    the space preferences are learned in. A song scores by how it differs
+    from what the artist usually sounds like."""
+    scaled = scale(features).astype(np.float32)
+    if not len(scaled):
+        return scaled
+    return scaled - scaled.mean(axis=0)
+
+
+class PreferenceModel:
+    """A listener's taste as one weight per feature, learned online by
+    logistic regression: every yes or no vote is a single gradient step.
+    The weights are the only state, 48 bytes."""
+
+    def __init__(self, weights: Optional[np.ndarray] = None):
+        self.weights = (
+            weights if weights is not None else np.zeros(len(FEATURES), np.float32)
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PreferenceModel":
+        return cls(np.frombuffer(data, dtype=np.float32).copy())
+
+    def to_bytes(self) -> bytes:
+        return self.weights.tobytes()
+
+    def like_probability(self, song: np.ndarray) -> float:
+        return float(1 / (1 + np.exp(-song @ self.weights)))
+
+    def vote(self, song: np.ndarray, liked: bool):
+        """Learn from a vote on a row of a centered matrix."""
+        error = float(liked) - self.like_probability(song)
+        self.weights += np.float32(LEARNING_RATE * error) * song
+
+    def next_song(self, songs: np.ndarray, shown: np.ndarray) -> Optional[int]:
+        """Row of the best scoring song in a centered matrix, leaving out the
+        rows shown marks. Ties go to the earliest row, so with no votes yet
+        that is the first one."""
+        scores = songs @ self.weights
+        scores[shown] = -np.inf
+        if not len(scores) or shown.all():
+            return None
+        return int(np.argmax(scores))
+
+    def best_songs(self, songs: np.ndarray, limit: int) -> np.ndarray:
+        """Rows of the limit best scoring songs in a centered matrix, best
+        first, ties going to the earliest row."""
+        return np.argsort(-(songs @ self.weights), kind="stable")[:limit]
@@ -0,0 +1,141 @@
+from typing import Iterable, Optional
+
+import numpy as np
+
+# The range of every SongFeatures column, values outside it are clipped into
+# the first or last bin
+FEATURE_RANGES = {
+    "acousticness": (0.0, 1.0),
+    "danceability": (0.0, 1.0),
+    "energy": (0.0, 1.0),
+    "instrumentalness": (0.0, 1.0),
+    "key": (0.0, 12.0),
+    "liveness": (0.0, 1.0),
+    "loudness": (-60.0, 0.0),
+    "mode": (0.0, 1.0),
+    "speechiness": (0.0, 1.0),
+    "tempo": (0.0, 250.0),
+    "time_signature": (0.0, 8.0),
+    "valence": (0.0, 1.0),
+}
+FEATURES = list(FEATURE_RANGES)
+HISTOGRAM_BINS = 32
+PERCENTILES = (10, 50, 90)
+
+_LOW, _HIGH = np.array(list(FEATURE_RANGES.values())).T
+_WIDTH = _HIGH - _LOW
+
+
+def feature_matrix(rows: Iterable[Iterable[float]]) -> np.ndarray:
+    """Songs by FEATURES, from rows of SongFeatures values in that order."""
+    return np.array(list(rows), dtype=np.float64).reshape(-1, len(FEATURES))
+
+
+def scale(values: np.ndarray) -> np.ndarray:
+    """Feature values mapped onto [0, 1] by FEATURE_RANGES, so that no one
+    feature outweighs the others just by its unit."""
+    return np.clip((values - _LOW) / _WIDTH, 0, 1)
+
+
+class FeatureAggregate:
+    """Sums, sums of squares and histograms of an artist's song features,
+    added up a batch of songs at a time. The whole aggregate packs into a
+    couple of kilobytes."""
+
+    def __init__(
+        self,
+        num_songs: int = 0,
+        moments: Optional[np.ndarray] = None,
+        histogram: Optional[np.ndarray] = None,
+    ):
+        self.num_songs = num_songs
+        # Row 0 sums, row 1 sums of squares
+        self.moments = moments if moments is not None else np.zeros((2, len(FEATURES)))
+        self.histogram = (
+            histogram
+            if histogram is not None
+            else np.zeros((len(FEATURES), HISTOGRAM_BINS), dtype=np.uint32)
+        )
+
+    @classmethod
+    def from_bytes(
+        cls, num_songs: int, moments: bytes, histogram: bytes
+    ) -> "FeatureAggregate":
+        return cls(
+            num_songs=num_songs,
+            moments=np.frombuffer(moments, dtype=np.float64)
+            .reshape(2, len(FEATURES))
+            .copy(),
+            histogram=np.frombuffer(histogram, dtype=np.uint32)
+            .reshape(len(FEATURES), HISTOGRAM_BINS)
+            .copy(),
+        )
+
+    def to_bytes(self) -> tuple[bytes, bytes]:
+        return self.moments.tobytes(), self.histogram.tobytes()
+
+    def add(self, features: np.ndarray):
+        """Count the songs in a feature_matrix."""
+        if not len(features):
+            return
+        self.num_songs += len(features)
+        self.moments[0] += features.sum(axis=0)
+        self.moments[1] += (features**2).sum(axis=0)
+        bins = np.minimum(
+            (scale(features) * HISTOGRAM_BINS).astype(np.intp), HISTOGRAM_BINS - 1
+        )
+        for column in range(len(FEATURES)):
+            self.histogram[column] += np.bincount(
+                bins[:, column], minlength=HISTOGRAM_BINS
+            ).astype(np.uint32)
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.moments[0] / max(self.num_songs, 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        variance = self.moments[1] / max(self.num_songs, 1) - self.mean**2
+        return np.sqrt(np.maximum(variance, 0))
+
+    def percentiles(self, percentiles: Iterable[float] = PERCENTILES) -> np.ndarray:
+        """Percentiles by FEATURES, interpolated within the histogram bins."""
+        cumulative = self.histogram.cumsum(axis=1)
+        bands = []
+        for percentile in percentiles:
+            target = percentile / 100 * self.num_songs
+            bin_index = np.minimum(
+                (cumulative < target).sum(axis=1), HISTOGRAM_BINS - 1
+            )
+            rows = np.arange(len(FEATURES))
+            before = np.where(
+                bin_index > 0, cumulative[rows, np.maximum(bin_index - 1, 0)], 0
+            )
+            in_bin = np.maximum(self.histogram[rows, bin_index], 1)
+            fraction = np.clip((target - before) / in_bin, 0, 1)
+            bands.append(_LOW + (bin_index + fraction) / HISTOGRAM_BINS * _WIDTH)
+        return np.array(bands)
+
+    def vector(self) -> np.ndarray:
+        """Mean, std and percentile bands, scaled, as one vector to compare
+        artists by."""
+        return np.concatenate(
+            [
+                scale(self.mean),
+                self.std / _WIDTH,
+                *(scale(band) for band in self.percentiles()),
+            ]
+        )
+
+
+def nearest(
+    target: np.ndarray, vectors: np.ndarray, limit: int
+) -> list[tuple[int, float]]:
+    """(row, distance) of the limit rows of vectors closest to target."""
+    distances = np.sqrt(((vectors - target) ** 2).sum(axis=1))
+    limit = min(limit, len(distances))
+    if not limit:
+        return []
+    closest = np.argpartition(distances, limit - 1)[:limit]
+    closest = closest[np.argsort(distances[closest], kind="stable")]
+    return [(int(row), float(distances[row])) for row in closest]
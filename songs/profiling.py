@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+from dataclasses import dataclass, field
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# A statement run this many times within one stage is most likely an N+1
+REPEATED_QUERY_THRESHOLD = 3
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+@dataclass
+class QueryProfile:
+    stage: str
+    # (sql, params, seconds) for every statement executed
+    queries: list[tuple[str, tuple, float]] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def duplicates(self) -> dict[tuple[str, tuple], int]:
+        """Identical statements with identical parameters."""
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return {query: count for query, count in counts.items() if count > 1}
+
+    @property
+    def repeated(self) -> dict[str, int]:
+        """Statements run at least REPEATED_QUERY_THRESHOLD times with any
+        parameters, the usual sign of a query issued once per row."""
+        counts = Counter(
+            sql
+            for sql, _, _ in self.queries
+            if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS)
+        )
+        return {
+            sql: count
+            for sql, count in counts.items()
+            if count >= REPEATED_QUERY_THRESHOLD
+        }
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            params = tuple(params) if params and not many else ()
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+    def log(self):
+        logger.info(
+            f"{self.stage}: {self.count} queries in {self.total_time * 1000:.1f}ms"
+        )
+        for sql, count in self.repeated.items():
+            logger.warning(f"{self.stage}: possible N+1, ran {count} times: {sql}")
+
+
+class profile_queries(ContextDecorator):
+    """Record every SQL statement run inside the block or decorated function.
+
+        with profile_queries("import_album_songs") as profile:
+            import_album_songs(db_albums)
+        assert profile.count <= 5
+
+    The summary is logged to songs.profiling when the block exits.
+    """
+
+    def __init__(self, stage: str, using: str = "default"):
+        self.stage = stage
+        self.using = using
+        self._exit_stack = ExitStack()
+
+    def _recreate_cm(self):
+        # A fresh profile for every call of a decorated function
+        return profile_queries(stage=self.stage, using=self.using)
+
+    def __enter__(self) -> QueryProfile:
+        self.profile = QueryProfile(stage=self.stage)
+        self._exit_stack.enter_context(
+            connections[self.using].execute_wrapper(self.profile)
+        )
+        return self.profile
+
+    def __exit__(self, *exc_info):
+        self._exit_stack.close()
+        self.profile.log()
+        return False
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import timedelta
+from threading import Lock
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Artists are refreshed this long before they would go stale, so the search
+# that finds them stale is rare rather than the norm
+REFRESH_AHEAD = timedelta(hours=12)
+
+
+class RequestBudget:
+    """Caps the Spotify requests a refresh pass may make. Plugged in as the
+    rate_limiter of the pass's own SpotifyClient it sees every request of the
+    pass, and only those, which it passes on to rate_limiter when there is
+    one.
+
+    The budget is checked between artists, so a pass can go over it by at
+    most one artist's import."""
+
+    def __init__(self, max_requests: int, rate_limiter=None):
+        self.max_requests = max_requests
+        self.rate_limiter = rate_limiter
+        self.used = 0
+        # Batches of ids are requested from a thread pool
+        self._lock = Lock()
+
+    @property
+    def remaining(self) -> int:
+        return max(self.max_requests - self.used, 0)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.max_requests
+
+    def acquire(self):
+        with self._lock:
+            self.used += 1
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+
+class SearchCounts:
+    """Searches per artist since the last refresh pass, counted in memory so
+    that a search doesn't write to the database. The refresh pass takes them
+    and adds them to the artists' search_count."""
+
+    def __init__(self):
+        self._counts: Counter[str] = Counter()
+        # Searches import on threads of their own
+        self._lock = Lock()
+
+    def record(self, artist_id: str):
+        with self._lock:
+            self._counts[artist_id] += 1
+
+    def take(self) -> Counter[str]:
+        """The counts so far, starting over from none."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+
+search_counts = SearchCounts()
+
+
+async def refresh_periodically(
+    refresh_pass: Callable[[], Awaitable[list[str]]], interval_seconds: float
+):
+    """Run refresh_pass every interval_seconds until cancelled. A failing
+    pass is logged and retried on the next tick."""
+    while True:
+        try:
+            refreshed = await refresh_pass()
+            if refreshed:
+                logger.info(f"Refreshed {len(refreshed)} artists")
+        except Exception:
+            logger.exception("Artist refresh pass failed")
+        await asyncio.sleep(interval_seconds)
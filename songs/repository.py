@@ -0,0 +1,205 @@
+"""The one way the Django views, the management commands and the FastAPI app
+read and write artists and their songs, all backed by the Django models.
+
+Every function is synchronous, with an async twin prefixed by `a` for the
+FastAPI app. Reads run on the thread Django's async ORM support uses. Imports
+talk to Spotify for seconds at a time, so they get a thread of their own
+rather than holding up every other query behind them.
+"""
+
+import re
+import time
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from songs.cache import artist_matrix_cache, artist_search_cache, artist_songs_cache
+from songs.models import Artist, ArtistProfile, Song, SongFeatures
+from songs.refresher import REFRESH_AHEAD, RequestBudget, search_counts
+from songs.preferences import centered
+from songs.profiles import FEATURES, feature_matrix
+from songs.search import ArtistMatch, ArtistSearchIndex, normalize_name
+from songs.spotify import spotify as pipeline
+from songs.spotify.spotify_client import get_client
+from songs.spotify.spotify_client_constants import SpotifyAPIError
+
+# Picks up artists other processes imported since the index was built
+SEARCH_INDEX_TTL_SECONDS = 5 * 60
+SPOTIFY_ID = re.compile(r"[0-9A-Za-z]{22}")
+
+_search_index: Optional[ArtistSearchIndex] = None
+_search_index_built_at = 0.0
+_search_index_lock = Lock()
+
+
+def get_artist(artist_id: str) -> Optional[Artist]:
+    return Artist.objects.filter(id=artist_id).first()
+
+
+def get_artist_songs(artist_id: str) -> list[dict]:
+    """The artist's songs in the shape the FastAPI app serves them."""
+
+    def load() -> list[dict]:
+        return [
+            {
+                "title": song.track_name,
+                "spotify_id": song.id,
+                "album": song.album.name,
+                "popularity": song.popularity,
+            }
+            for song in Song.objects.canonical()  # type: ignore
+            .filter(artists=artist_id)
+            .select_related("album")
+            .order_by("-popularity", "id")
+        ]
+
+    return artist_songs_cache.get_or_set(artist_id, load)
+
+
+def get_artist_song_matrix(artist_id: str) -> tuple[list[dict], np.ndarray]:
+    """The artist's songs that have features, most popular first, and their
+    features as a centered matrix with one row per song, see
+    songs.preferences."""
+
+    def load() -> tuple[list[dict], np.ndarray]:
+        songs, rows = [], []
+        for features in (
+            SongFeatures.objects.get_song_features_by_artist(artist_id)  # type: ignore
+            .select_related("song__album")
+            .order_by("-song__popularity", "song_id")
+        ):
+            songs.append(
+                {
+                    "title": features.song.track_name,
+                    "spotify_id": features.song.id,
+                    "album": features.song.album.name,
+                    "popularity": features.song.popularity,
+                }
+            )
+            rows.append([getattr(features, field) for field in FEATURES])
+        return songs, centered(feature_matrix(rows))
+
+    return artist_matrix_cache.get_or_set(artist_id, load)
+
+
+def get_similar_artists(artist_id: str, limit: int = 5) -> list[dict]:
+    """Artists whose songs sound most like artist_id's, closest first."""
+    similar = ArtistProfile.objects.similar_to(artist_id, limit=limit)  # type: ignore
+    names = dict(
+        Artist.objects.filter(id__in=[id for id, _ in similar]).values_list(
+            "id", "name"
+        )
+    )
+    return [
+        {"artist_id": id, "name": names[id], "distance": round(distance, 4)}
+        for id, distance in similar
+        if id in names
+    ]
+
+
+def get_search_index() -> ArtistSearchIndex:
+    global _search_index, _search_index_built_at
+    with _search_index_lock:
+        if (
+            _search_index is None
+            or time.monotonic() - _search_index_built_at > SEARCH_INDEX_TTL_SECONDS
+        ):
+            _search_index = ArtistSearchIndex(
+                ArtistMatch(id=id, name=name, popularity=popularity)
+                for id, name, popularity in Artist.objects.values_list(
+                    "id", "name", "popularity"
+                )
+            )
+            _search_index_built_at = time.monotonic()
+        return _search_index
+
+
+def reset_search_index():
+    global _search_index
+    with _search_index_lock:
+        _search_index = None
+
+
+def _search_spotify(query: str, limit: int) -> list[ArtistMatch]:
+    client = get_client()
+    if SPOTIFY_ID.fullmatch(query):
+        try:
+            artists = [client.get_artist(artist_id=query)]
+        except SpotifyAPIError:
+            artists = []
+    else:
+        artists = client.search_artists(query=query, limit=limit)
+    return [
+        ArtistMatch(id=artist.id, name=artist.name, popularity=artist.popularity)
+        for artist in artists
+    ]
+
+
+def search_artists(query: str, limit: int = 5) -> list[ArtistMatch]:
+    """Artists whose id is query or whose name matches it, best match first.
+    Spotify is only asked when nothing we know of matches, and its answer is
+    cached, misses included."""
+    query = query.strip()
+    index = get_search_index()
+    if (artist := index.get(query)) is not None:
+        return [artist]
+    if matches := index.search(query, limit=limit):
+        return matches
+    if not query:
+        return []
+
+    # A query of nothing but punctuation is still Spotify's to answer
+    matches = artist_search_cache.get_or_set(
+        (normalize_name(query) or query, limit), lambda: _search_spotify(query, limit)
+    )
+    # Searchable by the next query, but only imported once someone picks them
+    for match in matches:
+        index.add(match)
+    return matches
+
+
+def import_artist(artist_id: str) -> list[SongFeatures]:
+    """Song features for the artist, imported from Spotify first unless we
+    already have a recent copy. Counts as a search for the artist, which
+    the next refresh pass ranks artists by."""
+    search_counts.record(artist_id)
+    features = pipeline.get_artist_track_features(artist_id)
+    # An index built from here on reads the artist from the database
+    index = _search_index
+    if index is not None and index.get(artist_id) is None:
+        if artist := get_artist(artist_id):
+            index.add(
+                ArtistMatch(
+                    id=artist.id, name=artist.name, popularity=artist.popularity
+                )
+            )
+    return features
+
+
+def refresh_stale_artists(
+    budget: RequestBudget, refresh_ahead=REFRESH_AHEAD
+) -> list[str]:
+    return pipeline.refresh_stale_artists(budget=budget, refresh_ahead=refresh_ahead)
+
+
+def _in_own_thread(function):
+    def run(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # This thread's connection won't be reused by a request cycle
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+aget_artist = sync_to_async(get_artist)
+aget_artist_songs = sync_to_async(get_artist_songs)
+aget_artist_song_matrix = sync_to_async(get_artist_song_matrix)
+aget_similar_artists = sync_to_async(get_similar_artists)
+asearch_artists = sync_to_async(search_artists)
+aimport_artist = _in_own_thread(import_artist)
+arefresh_stale_artists = _in_own_thread(refresh_stale_artists)
@@ -0,0 +1,129 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from typing import Iterable, Optional
+
+TRIGRAM_MIN_SIMILARITY = 0.3
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+@dataclass(frozen=True)
+class ArtistMatch:
+    id: str
+    name: str
+    popularity: Optional[int] = None
+
+
+def normalize_name(name: str) -> str:
+    """'  Beyoncé & The Band!' -> 'beyonce the band'. Like
+    songs.dedupe.normalize_title, only accents are dropped and letters of
+    other scripts kept, 'Кино' -> 'кино'."""
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return NON_ALPHANUMERIC.sub(" ", name).strip()
+
+
+def trigrams(normalized_name: str) -> set[str]:
+    padded = f"  {normalized_name} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class ArtistSearchIndex:
+    """In-memory artist name index. Names and every word in them are kept
+    sorted for prefix lookups by bisection, and trigram posting lists catch
+    misspellings. Matches are ranked exact, then prefix, then by trigram
+    similarity, and by popularity within each of those."""
+
+    def __init__(self, artists: Iterable[ArtistMatch] = ()):
+        self._artists: dict[str, ArtistMatch] = {}
+        self._normalized: dict[str, str] = {}
+        # sorted (word, artist id) pairs, the whole name counts as a word too
+        self._words: list[tuple[str, str]] = []
+        self._trigrams: dict[str, set[str]] = {}
+        self._lock = Lock()
+        for artist in artists:
+            self._insert(artist, keep_sorted=False)
+        self._words.sort()
+
+    def __len__(self) -> int:
+        return len(self._artists)
+
+    def get(self, artist_id: str) -> Optional[ArtistMatch]:
+        return self._artists.get(artist_id)
+
+    def add(self, artist: ArtistMatch):
+        with self._lock:
+            self._insert(artist, keep_sorted=True)
+
+    def _insert(self, artist: ArtistMatch, keep_sorted: bool):
+        normalized = normalize_name(artist.name)
+        if artist.id in self._artists:
+            if self._normalized[artist.id] == normalized:
+                self._artists[artist.id] = artist
+                return
+            self._remove(artist.id)
+        self._artists[artist.id] = artist
+        self._normalized[artist.id] = normalized
+        for word in {normalized, *normalized.split()}:
+            if keep_sorted:
+                index = bisect_left(self._words, (word, artist.id))
+                self._words.insert(index, (word, artist.id))
+            else:
+                self._words.append((word, artist.id))
+        for trigram in trigrams(normalized):
+            self._trigrams.setdefault(trigram, set()).add(artist.id)
+
+    def _remove(self, artist_id: str):
+        normalized = self._normalized.pop(artist_id)
+        del self._artists[artist_id]
+        self._words = [entry for entry in self._words if entry[1] != artist_id]
+        for trigram in trigrams(normalized):
+            self._trigrams[trigram].discard(artist_id)
+
+    def search(self, query: str, limit: int = 10) -> list[ArtistMatch]:
+        normalized_query = normalize_name(query)
+        if not normalized_query:
+            return []
+        # Artists are added from import threads while searches run
+        with self._lock:
+            return self._search(normalized_query, limit)
+
+    def _search(self, normalized_query: str, limit: int) -> list[ArtistMatch]:
+        # artist id -> rank, lower ranks first
+        ranks: dict[str, float] = {}
+        start = bisect_left(self._words, (normalized_query, ""))
+        for word, artist_id in self._words[start:]:
+            if not word.startswith(normalized_query):
+                break
+            exact = self._normalized[artist_id] == normalized_query
+            ranks[artist_id] = min(ranks.get(artist_id, 1), 0 if exact else 1)
+
+        if len(ranks) < limit:
+            query_trigrams = trigrams(normalized_query)
+            shared = Counter(
+                artist_id
+                for trigram in query_trigrams
+                for artist_id in self._trigrams.get(trigram, ())
+            )
+            for artist_id, num_shared in shared.items():
+                if artist_id in ranks:
+                    continue
+                name_trigrams = len(trigrams(self._normalized[artist_id]))
+                similarity = num_shared / (
+                    len(query_trigrams) + name_trigrams - num_shared
+                )
+                if similarity >= TRIGRAM_MIN_SIMILARITY:
+                    ranks[artist_id] = 2 - similarity
+
+        ranked = sorted(
+            ranks,
+            key=lambda artist_id: (
+                ranks[artist_id],
+                -(self._artists[artist_id].popularity or 0),
+                self._artists[artist_id].name,
+            ),
+        )
+        return [self._artists[artist_id] for artist_id in ranked[:limit]]
@@ -0,0 +1,527 @@
+"""Local stand-in for the parts of the Spotify Web API that SpotifyClient uses.
+
+Serves a recorded or synthetic catalog so imports can be tested and
+benchmarked offline. Point a client at it with
+SpotifyClient(base_url=server.base_url, token_endpoint=server.token_endpoint),
+or, for a whole process, through the SPOTIFY_BASE_URL and
+SPOTIFY_TOKEN_ENDPOINT environment variables:
+
+    python -m songs.spotify.fake_spotify_server --port 8001 --latency-ms 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from songs.spotify.spotify_client_constants import MAX_LIMIT
+
+ID_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+SPOTIFY_ID_LENGTH = 22
+
+
+def simplified_artist(artist: dict) -> dict:
+    return {"id": artist["id"], "name": artist["name"], "type": "artist"}
+
+
+class FakeCatalog:
+    """Artists, albums (with their full track lists) and audio features, stored
+    as the JSON objects Spotify returns for them."""
+
+    def __init__(
+        self,
+        artists: list[dict],
+        albums: list[dict],
+        audio_features: list[dict],
+    ):
+        self.artists = {artist["id"]: artist for artist in artists}
+        self.albums = {album["id"]: album for album in albums}
+        self.audio_features = {features["id"]: features for features in audio_features}
+        self.artist_albums: dict[str, list[dict]] = {}
+        for album in albums:
+            for artist in album["artists"]:
+                self.artist_albums.setdefault(artist["id"], []).append(album)
+
+    @property
+    def num_tracks(self) -> int:
+        return sum(len(album["tracks"]) for album in self.albums.values())
+
+    @classmethod
+    def from_fixture(cls, path: str) -> "FakeCatalog":
+        with open(path) as fixture:
+            catalog = json.load(fixture)
+        return cls(
+            artists=catalog["artists"],
+            albums=catalog["albums"],
+            audio_features=catalog["audio_features"],
+        )
+
+    def to_fixture(self, path: str):
+        with open(path, "w") as fixture:
+            json.dump(
+                {
+                    "artists": list(self.artists.values()),
+                    "albums": list(self.albums.values()),
+                    "audio_features": list(self.audio_features.values()),
+                },
+                fixture,
+            )
+
+    @classmethod
+    def synthetic(
+        cls,
+        num_artists: int = 1,
+        albums_per_artist: int = 10,
+        tracks_per_album: int = 12,
+        seed: int = 0,
+    ) -> "FakeCatalog":
+        """A deterministic catalog. Every other album also gets a deluxe edition,
+        every third a lead single that is one of its tracks under another id,
+        every fifth is followed by an EP of new songs, and some tracks feature
+        a guest artist. Album and track dedupe and artist stub creation all
+        have something to do."""
+        rng = random.Random(seed)
+
+        def new_id() -> str:
+            return "".join(rng.choices(ID_ALPHABET, k=SPOTIFY_ID_LENGTH))
+
+        artists = [
+            {
+                "id": new_id(),
+                "name": f"Artist {artist_number}",
+                "type": "artist",
+                "popularity": rng.randint(0, 100),
+                "genres": [],
+                "followers": {"total": rng.randint(0, 10_000_000)},
+            }
+            for artist_number in range(num_artists)
+        ]
+        guest = {
+            "id": new_id(),
+            "name": "Guest Artist",
+            "type": "artist",
+            "popularity": 50,
+            "genres": [],
+            "followers": {"total": 0},
+        }
+        artists.append(guest)
+
+        def release(id, name, album_type, artist, release_date, tracks) -> dict:
+            return {
+                "id": id,
+                "name": name,
+                "type": "album",
+                "album_type": album_type,
+                "release_date": release_date.isoformat(),
+                "artists": [simplified_artist(artist)],
+                "total_tracks": len(tracks),
+                "tracks": tracks,
+            }
+
+        albums: list[dict] = []
+        audio_features: dict[str, dict] = {}
+
+        def add_track(track: dict):
+            audio_features[track["id"]] = cls._synthetic_features(track, rng)
+
+        def copy_track(track: dict) -> dict:
+            """The same recording on another release, under its own id."""
+            copy = {**track, "id": new_id()}
+            audio_features[copy["id"]] = {
+                **audio_features[track["id"]],
+                "id": copy["id"],
+            }
+            return copy
+
+        for artist in artists[:num_artists]:
+            for album_number in range(albums_per_artist):
+                release_date = date(2000, 1, 1) + timedelta(days=97 * album_number)
+                editions = [f"Album {album_number}"]
+                if album_number % 2:
+                    editions.append(f"Album {album_number} (Deluxe)")
+                for edition_number, album_name in enumerate(editions):
+                    tracks = []
+                    for track_number in range(tracks_per_album + 2 * edition_number):
+                        if edition_number and track_number < tracks_per_album:
+                            # Deluxe editions repeat the standard edition's songs
+                            track = copy_track(albums[-1]["tracks"][track_number])
+                            tracks.append(track)
+                            continue
+                        track_artists = [simplified_artist(artist)]
+                        if track_number % 5 == 4:
+                            track_artists.append(simplified_artist(guest))
+                        track = {
+                            "id": new_id(),
+                            "name": f"Song {album_number}-{track_number}",
+                            "artists": track_artists,
+                            "duration_ms": rng.randint(90_000, 360_000),
+                            "explicit": rng.random() < 0.3,
+                            "track_number": track_number + 1,
+                            "type": "track",
+                        }
+                        tracks.append(track)
+                        add_track(track)
+                    albums.append(
+                        release(
+                            new_id(), album_name, "album", artist, release_date, tracks
+                        )
+                    )
+
+                singles = []
+                if album_number % 3 == 0:
+                    lead_track = copy_track(albums[-len(editions)]["tracks"][0])
+                    singles.append((lead_track["name"], [lead_track]))
+                if album_number % 5 == 0:
+                    ep_tracks = [
+                        {
+                            "id": new_id(),
+                            "name": f"EP Song {album_number}-{track_number}",
+                            "artists": [simplified_artist(artist)],
+                            "duration_ms": rng.randint(90_000, 360_000),
+                            "explicit": False,
+                            "track_number": track_number + 1,
+                            "type": "track",
+                        }
+                        for track_number in range(4)
+                    ]
+                    singles.append((f"EP {album_number}", ep_tracks))
+                    for track in ep_tracks:
+                        add_track(track)
+                for name, tracks in singles:
+                    albums.append(
+                        release(new_id(), name, "single", artist, release_date, tracks)
+                    )
+        return cls(
+            artists=artists,
+            albums=albums,
+            audio_features=list(audio_features.values()),
+        )
+
+    @staticmethod
+    def _synthetic_features(track: dict, rng: random.Random) -> dict:
+        return {
+            "id": track["id"],
+            "type": "audio_features",
+            "acousticness": rng.random(),
+            "danceability": rng.random(),
+            "energy": rng.random(),
+            "instrumentalness": rng.random(),
+            "key": rng.randint(0, 11),
+            "liveness": rng.random(),
+            "loudness": rng.uniform(-30, 0),
+            "mode": rng.randint(0, 1),
+            "speechiness": rng.random(),
+            "tempo": rng.uniform(60, 200),
+            "time_signature": rng.choice([3, 4, 4, 4, 5]),
+            "valence": rng.random(),
+            "duration_ms": track["duration_ms"],
+        }
+
+
+class FakeSpotifyServer:
+    """Threaded HTTP server answering from a FakeCatalog.
+
+    latency: seconds slept before answering each request
+    page_size: caps the page size of paginated endpoints, requests past the
+        cap only see the rest of the results by following "next"
+    token_ttl_requests: a token answers 401 after this many requests
+    rate_limit_every: every Nth API request answers 429 with Retry-After
+    """
+
+    def __init__(
+        self,
+        catalog: FakeCatalog,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        page_size: int = MAX_LIMIT,
+        token_ttl_requests: Optional[int] = None,
+        rate_limit_every: Optional[int] = None,
+        retry_after: float = 0,
+    ):
+        self.catalog = catalog
+        self.latency = latency
+        self.page_size = page_size
+        self.token_ttl_requests = token_ttl_requests
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+
+        self.request_counts: Counter[str] = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._num_api_requests = 0
+        self._num_tokens = 0
+        self._token_uses: Counter[str] = Counter()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def token_endpoint(self) -> str:
+        return f"{self.url}/api/token"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.request_counts.values())
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+            self.bytes_sent = 0
+
+    def start(self) -> "FakeSpotifyServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeSpotifyServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+        return Handler
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if method == "POST" and url.path == "/api/token":
+            route = "token"
+            status, body, headers = 200, self._issue_token(), {}
+        elif method == "GET" and url.path.startswith("/v1/"):
+            route, status, body, headers = self._api_request(handler, url.path, query)
+        else:
+            route, status, body, headers = "unknown", 404, self._error(404), {}
+
+        payload = json.dumps(body).encode()
+        with self._lock:
+            self.request_counts[route] += 1
+            self.bytes_sent += len(payload)
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for header, value in headers.items():
+            handler.send_header(header, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _issue_token(self) -> dict:
+        with self._lock:
+            self._num_tokens += 1
+            token = f"fake-token-{self._num_tokens}"
+        return {"access_token": token, "token_type": "Bearer", "expires_in": 3600}
+
+    @staticmethod
+    def _error(status: int, message: str = "") -> dict:
+        return {"error": {"status": status, "message": message}}
+
+    def _api_request(
+        self, handler: BaseHTTPRequestHandler, path: str, query: dict
+    ) -> tuple[str, int, dict, dict]:
+        token = handler.headers.get("Authorization", "").removeprefix("Bearer ")
+        with self._lock:
+            self._num_api_requests += 1
+            num_api_requests = self._num_api_requests
+            self._token_uses[token] += 1
+            token_uses = self._token_uses[token]
+
+        if not token.startswith("fake-token-") or (
+            self.token_ttl_requests and token_uses > self.token_ttl_requests
+        ):
+            return "401", 401, self._error(401, "The access token expired"), {}
+        if self.rate_limit_every and num_api_requests % self.rate_limit_every == 0:
+            return (
+                "429",
+                429,
+                self._error(429, "API rate limit exceeded"),
+                {"Retry-After": str(self.retry_after)},
+            )
+
+        parts = path.removeprefix("/v1/").strip("/").split("/")
+        ids = [id for id in query.get("ids", "").split(",") if id]
+        match parts:
+            case ["search"]:
+                return "search", *self._search(query)
+            case ["artists"]:
+                return "artists", 200, self._several_artists(ids), {}
+            case ["artists", artist_id]:
+                return "artist", *self._artist(artist_id)
+            case ["artists", artist_id, "albums"]:
+                return "artist_albums", *self._artist_albums(artist_id, query)
+            case ["albums"]:
+                return "albums", 200, self._several_albums(ids), {}
+            case ["albums", album_id, "tracks"]:
+                return "album_tracks", *self._album_tracks(album_id, query)
+            case ["audio-features"]:
+                return "audio_features", 200, self._several_features(ids), {}
+            case ["audio-features", track_id]:
+                return "track_features", *self._track_features(track_id)
+        return "unknown", 404, self._error(404, "Not found"), {}
+
+    def _page(self, path: str, items: list, query: dict, extra_query: dict = {}):
+        limit = min(int(query.get("limit", 20)), MAX_LIMIT)
+        limit = min(limit, self.page_size)
+        offset = int(query.get("offset", 0))
+        next_page = None
+        if offset + limit < len(items):
+            next_query = {**extra_query, "limit": limit, "offset": offset + limit}
+            next_page = f"{self.base_url}/{path}?{urlencode(next_query)}"
+        return {
+            "items": items[offset : offset + limit],
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": next_page,
+        }
+
+    def _artist(self, artist_id: str) -> tuple[int, dict, dict]:
+        if artist := self.catalog.artists.get(artist_id):
+            return 200, artist, {}
+        return 404, self._error(404, "Resource not found"), {}
+
+    def _several_artists(self, artist_ids: list[str]) -> dict:
+        return {"artists": [self.catalog.artists.get(id) for id in artist_ids]}
+
+    def _search(self, query: dict) -> tuple[int, dict, dict]:
+        if query.get("type") != "artist" or not query.get("q"):
+            return 400, self._error(400, "Only artist searches are supported"), {}
+        name = query["q"].lower()
+        artists = [
+            artist
+            for artist in self.catalog.artists.values()
+            if name in artist["name"].lower()
+        ]
+        extra_query = {"q": query["q"], "type": "artist"}
+        return 200, {"artists": self._page("search", artists, query, extra_query)}, {}
+
+    def _album_without_tracks(self, album: dict) -> dict:
+        return {key: value for key, value in album.items() if key != "tracks"}
+
+    def _artist_albums(self, artist_id: str, query: dict) -> tuple[int, dict, dict]:
+        if artist_id not in self.catalog.artists:
+            return 404, self._error(404, "Resource not found"), {}
+        include_groups = query.get("include_groups", "album,single").split(",")
+        albums = [
+            self._album_without_tracks(album)
+            for album in self.catalog.artist_albums.get(artist_id, [])
+            if album["album_type"] in include_groups
+        ]
+        extra_query = {"include_groups": ",".join(include_groups)}
+        page = self._page(f"artists/{artist_id}/albums", albums, query, extra_query)
+        return 200, page, {}
+
+    def _several_albums(self, album_ids: list[str]) -> dict:
+        albums = []
+        for album_id in album_ids:
+            album = self.catalog.albums.get(album_id)
+            if album is not None:
+                tracks_page = self._page(
+                    f"albums/{album_id}/tracks", album["tracks"], {"limit": MAX_LIMIT}
+                )
+                album = {**album, "tracks": tracks_page}
+            albums.append(album)
+        return {"albums": albums}
+
+    def _album_tracks(self, album_id: str, query: dict) -> tuple[int, dict, dict]:
+        if album := self.catalog.albums.get(album_id):
+            return 200, self._page(f"albums/{album_id}/tracks", album["tracks"], query), {}
+        return 404, self._error(404, "Resource not found"), {}
+
+    def _several_features(self, track_ids: list[str]) -> dict:
+        return {
+            "audio_features": [self.catalog.audio_features.get(id) for id in track_ids]
+        }
+
+    def _track_features(self, track_id: str) -> tuple[int, dict, dict]:
+        if features := self.catalog.audio_features.get(track_id):
+            return 200, features, {}
+        return 404, self._error(404, "Resource not found"), {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--fixture", help="JSON catalog to serve")
+    parser.add_argument("--artists", type=int, default=1)
+    parser.add_argument("--albums-per-artist", type=int, default=10)
+    parser.add_argument("--tracks-per-album", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--page-size", type=int, default=MAX_LIMIT)
+    parser.add_argument("--token-ttl-requests", type=int)
+    parser.add_argument("--rate-limit-every", type=int)
+    parser.add_argument("--retry-after", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.fixture:
+        catalog = FakeCatalog.from_fixture(args.fixture)
+    else:
+        catalog = FakeCatalog.synthetic(
+            num_artists=args.artists,
+            albums_per_artist=args.albums_per_artist,
+            tracks_per_album=args.tracks_per_album,
+        )
+    server = FakeSpotifyServer(
+        catalog,
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000,
+        page_size=args.page_size,
+        token_ttl_requests=args.token_ttl_requests,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+    )
+    print(f"export SPOTIFY_BASE_URL={server.base_url}")
+    print(f"export SPOTIFY_TOKEN_ENDPOINT={server.token_endpoint}")
+    print(f"Serving {len(catalog.artists)} artists, {catalog.num_tracks} tracks")
+    for artist_id, albums in catalog.artist_albums.items():
+        print(f"  {artist_id}: {len(albums)} albums")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""SpotifyClient state shared between the worker processes of a bulk import.
+
+Both classes only hold multiprocessing primitives, so they can be handed to
+workers through a Pool initializer, and plugged in with
+SpotifyClient.rate_limiter / SpotifyClient.shared_token.
+"""
+
+import multiprocessing
+import time
+from typing import Callable
+
+TOKEN_BUFFER_SIZE = 1024
+
+
+class SharedRateLimiter:
+    """Token bucket allowing requests_per_second on average, with bursts of up
+    to burst requests, across every process holding it."""
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        burst: int = 1,
+        context=multiprocessing,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._tokens = context.Value("d", burst, lock=False)
+        # CLOCK_MONOTONIC is system wide, so this is comparable across processes
+        self._updated_at = context.Value("d", time.monotonic(), lock=False)
+        self._lock = context.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated_at.value
+                tokens = min(
+                    self.burst, self._tokens.value + elapsed * self.requests_per_second
+                )
+                self._updated_at.value = now
+                if tokens >= 1:
+                    self._tokens.value = tokens - 1
+                    return
+                self._tokens.value = tokens
+                wait = (1 - tokens) / self.requests_per_second
+            time.sleep(wait)
+
+
+class SharedToken:
+    """One access token for all workers. When a worker finds its token has
+    expired, only the first one to report it fetches a new token."""
+
+    def __init__(self, context=multiprocessing):
+        self._value = context.Array("c", TOKEN_BUFFER_SIZE, lock=False)
+        self._lock = context.Lock()
+
+    def get(self) -> str:
+        return self._value.value.decode()
+
+    def refresh(self, stale_token: str, fetch: Callable[[], str]) -> str:
+        with self._lock:
+            current = self.get()
+            if current and current != stale_token:
+                return current
+            token = fetch()
+            self._value.value = token.encode()
+            return token
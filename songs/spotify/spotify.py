@@ -1,27 +1,45 @@
 import logging
+from datetime import timedelta
 from operator import attrgetter
 from typing import Optional
 
-from songs.models import Album, Artist, Song, SongFeatures
-from songs.spotify.spotify_client import SpotifyClient
+from django.db.models import Q
+from django.utils import timezone
+
+from songs.cache import artist_cache, artist_features_cache, invalidate_artist
+from songs.dedupe import TrackDedupeIndex, TrackKey, spotify_track_key
+from songs.models import (
+    ARTIST_FRESHNESS,
+    Album,
+    Artist,
+    ArtistProfile,
+    Song,
+    SongFeatures,
+)
+from songs.profiling import profile_queries
+from songs.refresher import REFRESH_AHEAD, RequestBudget, search_counts
+from songs.spotify.spotify_client import SpotifyClient, get_client, use_client
 from songs.spotify.spotify_client_constants import SpotifyAlbumType
 from songs.spotify.spotify_serializer import (
+    SpotifyAlbum,
     SpotifyAlbumBase,
     SpotifyAlbumPartial,
 )
 
-client = SpotifyClient()
-
 
 def get_or_create_artist(artist_id: str) -> tuple[Artist, bool]:
+    if (db_artist := artist_cache.get(artist_id)) is not None:
+        return db_artist, True
     try:
-        return Artist.objects.get(id=artist_id), True
+        db_artist = Artist.objects.get(id=artist_id)
+        artist_cache.set(artist_id, db_artist)
+        return db_artist, True
     except Artist.DoesNotExist:
-        spotify_artist = client.get_artist(artist_id=artist_id)
+        spotify_artist = get_client().get_artist(artist_id=artist_id)
         db_artist = Artist.objects.import_spotify_artist(  # pyright: ignore
             spotify_artist
         )
-        db_artist.save()
+        artist_cache.set(artist_id, db_artist)
         return db_artist, False
 
 
@@ -29,7 +47,7 @@ def get_artists_albums(db_artist: Artist):
     if db_artist.recently_updated:
         return
     db_album_ids = Album.objects.filter(artists=db_artist.id).values_list("id")
-    spotify_albums = client.get_all_artist_albums(artist_id=db_artist.id)
+    spotify_albums = get_client().get_all_artist_albums(artist_id=db_artist.id)
 
     for spotify_album in spotify_albums:
         if spotify_album.id in db_album_ids:
@@ -76,7 +94,7 @@ def filter_on_explicit_values(
 def filter_duplicate_albums(
     spotify_albums: list[SpotifyAlbumBase],
 ) -> list[SpotifyAlbumPartial]:
-    spotify_album_partials = SpotifyClient().get_album_partials(
+    spotify_album_partials = get_client().get_album_partials(
         albums_list=spotify_albums
     )
     grouped_albums = group_albums(input_albums=spotify_album_partials)
@@ -126,55 +144,151 @@ def filter_duplicate_albums(
     return singleton_albums
 
 
-def import_artist_unique_albums(artist_id: str) -> list[Album]:
-    client = SpotifyClient()
-    all_spotify_albums = client.get_all_artist_albums(
-        artist_id=artist_id, include_groups=[SpotifyAlbumType.ALBUM]
+def get_artist_releases(
+    artist_id: str,
+) -> tuple[list[SpotifyAlbumBase], list[SpotifyAlbumBase]]:
+    """The artist's albums, and their singles and EPs, listed together."""
+    releases = get_client().get_all_artist_albums(
+        artist_id=artist_id,
+        include_groups=[SpotifyAlbumType.ALBUM, SpotifyAlbumType.SINGLE],
     )
-    album_partials_to_import = filter_duplicate_albums(all_spotify_albums)
+    singles = [
+        release for release in releases if release.album_type is SpotifyAlbumType.SINGLE
+    ]
+    albums = [
+        release
+        for release in releases
+        if release.album_type is not SpotifyAlbumType.SINGLE
+    ]
+    return albums, singles
+
+
+@profile_queries("import_unique_albums")
+def import_unique_albums(spotify_albums: list[SpotifyAlbumBase]) -> list[Album]:
+    client = get_client()
+    album_partials_to_import = filter_duplicate_albums(spotify_albums)
     albums_to_import = [
         client.get_complete_album_from_partial(album_partial=partial)
         for partial in album_partials_to_import
     ]
-    db_albums = [
-        Album.objects.import_spotify_album(album=spotify_album)  # type: ignore
-        for spotify_album in albums_to_import
-    ]
-    return db_albums
+    return Album.objects.import_spotify_albums(albums=albums_to_import)  # type: ignore
 
 
+@profile_queries("import_album_songs")
 def import_album_songs(db_albums: list[Album]):
     album_ids = [db_album.id for db_album in db_albums]
-    spotify_tracks_dict = SpotifyClient().get_multiple_albums_tracks(album_ids)
-    ret = []
-    for db_album, spotify_tracks_list in zip(db_albums, spotify_tracks_dict.values()):
-        for spotify_track in spotify_tracks_list:
-            song = Song.objects.import_spotify_track(  # type: ignore
-                track=spotify_track, album=db_album
-            )
-            ret.append(song)
-    return ret
+    spotify_tracks_dict = get_client().get_multiple_albums_tracks(album_ids)
+    return Song.objects.import_spotify_album_tracks(  # type: ignore
+        album_tracks=list(zip(db_albums, spotify_tracks_dict.values()))
+    )
+
+
+@profile_queries("import_new_singles")
+def import_new_singles(
+    artist_id: str, spotify_singles: list[SpotifyAlbumBase]
+) -> tuple[list[Album], list[Song]]:
+    """Singles and EPs, without the tracks we already have from the artist's
+    albums. Their tracks come with the release, and a single whose tracks
+    are all known is not imported at all, so they cost no track or feature
+    requests."""
+    if not spotify_singles:
+        return [], []
+    known_track_keys = [
+        TrackKey(id=id, dedupe_key=key, duration_ms=duration_ms, isrc=isrc)
+        for id, key, duration_ms, isrc in Song.objects.filter(
+            artists=artist_id
+        ).values_list("id", "dedupe_key", "duration_ms", "isrc")
+    ]
+    known_ids = {track_key.id for track_key in known_track_keys}
+    known_songs = TrackDedupeIndex(known_track_keys)
+
+    client = get_client()
+    new_singles = []
+    for partial in client.get_album_partials(albums_list=spotify_singles):
+        single = client.get_complete_album_from_partial(album_partial=partial)
+        new_tracks = []
+        for track in single.tracks:
+            track_key = spotify_track_key(track)
+            if track.id in known_ids or known_songs.find(track_key) is not None:
+                continue
+            # The same single is often on an EP too
+            known_ids.add(track.id)
+            known_songs.add(track_key)
+            new_tracks.append(track)
+        if new_tracks:
+            new_singles.append(SpotifyAlbum(album=single.base, tracks=new_tracks))
+
+    logging.info(f"Skipped {len(spotify_singles) - len(new_singles)} known singles")
+    db_singles = Album.objects.import_spotify_albums(albums=new_singles)  # type: ignore
+    db_songs = Song.objects.import_spotify_album_tracks(  # type: ignore
+        album_tracks=[
+            (db_single, single.tracks)
+            for db_single, single in zip(db_singles, new_singles)
+        ]
+    )
+    return db_singles, db_songs
+
 
+@profile_queries("dedupe_songs")
+def dedupe_songs(db_songs: list[Song]) -> list[Song]:
+    """The songs that are not another release of a recording we have, the
+    only ones worth fetching features for and recommending."""
+    Song.objects.assign_canonical(db_songs)  # type: ignore
+    return [song for song in db_songs if song.canonical_id is None]
 
+
+@profile_queries("import_song_features")
 def import_song_features(db_songs: list[Song]) -> list[SongFeatures]:
     song_ids = [song.id for song in db_songs]
-    song_features = SpotifyClient().get_multiple_track_features(track_ids=song_ids)
-    return [
-        SongFeatures.objects.import_song_features(song_feature)  # type: ignore
-        for song_feature in song_features
-    ]
+    db_features = SongFeatures.objects.in_bulk(song_ids)
+    missing_ids = list(
+        dict.fromkeys(song_id for song_id in song_ids if song_id not in db_features)
+    )
+    song_features = get_client().get_multiple_track_features(track_ids=missing_ids)
+
+    for song_id, song_feature in zip(missing_ids, song_features):
+        if song_feature is None:
+            logging.info(f"No features available for song {song_id}")
+    imported_features = SongFeatures.objects.import_many_song_features(  # type: ignore
+        [song_feature for song_feature in song_features if song_feature is not None]
+    )
+    ArtistProfile.objects.recount_for_song_features(imported_features)  # type: ignore
+    db_features.update({features.id: features for features in imported_features})
+    return [db_features[song_id] for song_id in song_ids if song_id in db_features]
+
+
+@profile_queries("hydrate_artist_stubs")
+def hydrate_artist_stubs(db_albums: list[Album]):
+    """Collaborators on the imported albums are only created as stubs. Fetch
+    their full objects together, 50 per request, rather than one by one."""
+    stub_ids = list(
+        Artist.objects.stubs()  # type: ignore
+        .filter(Q(album__in=db_albums) | Q(song__album__in=db_albums))
+        .values_list("id", flat=True)
+        .distinct()
+    )
+    if not stub_ids:
+        return
+    spotify_artists = get_client().get_multiple_artists(artist_ids=stub_ids)
+    Artist.objects.hydrate(  # type: ignore
+        [artist for artist in spotify_artists if artist is not None]
+    )
 
 
 # Steps for new artist
-# Get list of all albums from Spotify
-# Get list of all tracks for those albums from Spotify
-# First resolve albums - which need to go in
-# Then go through singles - resolve which need to go in
-# Then get song features for all tracks
+# Get list of all albums, singles and EPs from Spotify
+# First resolve albums - which need to go in - and import their tracks
+# Then go through singles - only the tracks the albums do not already have
+# Then get song features for all tracks, one per recording
 def import_artist_albums_songs(artist_id):
-    db_albums = import_artist_unique_albums(artist_id)
+    spotify_albums, spotify_singles = get_artist_releases(artist_id)
+    db_albums = import_unique_albums(spotify_albums)
     db_songs = import_album_songs(db_albums)
-    db_song_features = import_song_features(db_songs)
+    db_singles, db_single_songs = import_new_singles(artist_id, spotify_singles)
+    hydrate_artist_stubs([*db_albums, *db_singles])
+    db_song_features = import_song_features(dedupe_songs([*db_songs, *db_single_songs]))
+    Artist.objects.mark_updated(artist_id)  # type: ignore
+    invalidate_artist(artist_id)
 
     return db_song_features
 
@@ -184,15 +298,51 @@ def get_artist_track_features(artist_id: str) -> list[SongFeatures]:
 
     # If artist was existing and was recently updated, we can just grab their tracks
     if is_existing and db_artist.recently_updated:
-        albums = Album.objects.filter(artist_id=artist_id)
-        track_ids = Song.objects.filter(album=albums).values_list("id")
-        features = SongFeatures.objects.filter(id=track_ids)
-        return list(features)
+        return artist_features_cache.get_or_set(
+            artist_id,
+            lambda: list(SongFeatures.objects.get_song_features_by_artist(artist_id)),  # type: ignore
+        )
 
     else:
         return import_artist_albums_songs(artist_id)
 
 
+def refresh_stale_artists(
+    budget: RequestBudget, refresh_ahead: timedelta = REFRESH_AHEAD
+) -> list[str]:
+    """Re-import the most searched artists that will go stale within
+    refresh_ahead, until the budget runs out."""
+    Artist.objects.record_searches(search_counts.take())  # type: ignore
+    updated_before = timezone.now() - (ARTIST_FRESHNESS - refresh_ahead)
+    artist_ids = list(
+        Artist.objects.due_for_refresh(updated_before).values_list(  # type: ignore
+            "id", flat=True
+        )
+    )
+    # A client of its own, so that searches made during the pass neither
+    # count against the budget nor wait on it
+    budget.rate_limiter = budget.rate_limiter or SpotifyClient.rate_limiter
+    client = SpotifyClient()
+    client.token = get_client().token
+    client.rate_limiter = budget  # type: ignore
+    refreshed = []
+    with use_client(client):
+        for artist_id in artist_ids:
+            if budget.exhausted:
+                break
+            try:
+                import_artist_albums_songs(artist_id)
+            except Exception:
+                logging.exception(f"Failed to refresh artist {artist_id}")
+                continue
+            refreshed.append(artist_id)
+    logging.info(
+        f"Refreshed {len(refreshed)} of {len(artist_ids)} stale artists "
+        f"with {budget.used} requests"
+    )
+    return refreshed
+
+
 # def get_non_existing_artist_track_features(artist_id: str) -> list[SongFeatures]:
 #     albums = client.get_all_artist_albums(artist_id=artist_id)
 
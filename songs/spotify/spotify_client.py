@@ -1,20 +1,38 @@
+import logging
 import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
 from itertools import batched
-from typing import Optional
+from threading import Lock
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 
 import requests
 
+from songs.metrics import (
+    observe_spotify_request,
+    observe_spotify_retry,
+    observe_token_refresh,
+)
 from songs.spotify.spotify_client_constants import (
     BASE_URL,
     GET_TOKEN_ENDPOINT,
     GET_TOKEN_HEADER,
+    MAX_ALBUM_IDS,
+    MAX_ARTIST_IDS,
+    MAX_CONCURRENT_REQUESTS,
     MAX_LIMIT,
+    MAX_RETRIES,
+    MAX_TRACK_FEATURES_IDS,
     US_MARKET,
     BadTokenError,
+    RateLimitError,
     SpotifyAlbumType,
     print_request_and_response,
     raise_correct_error,
 )
+from songs.spotify.shared import SharedRateLimiter, SharedToken
 from songs.spotify.spotify_serializer import (
     SpotifyAlbum,
     SpotifyAlbumBase,
@@ -24,17 +42,75 @@ from songs.spotify.spotify_serializer import (
     SpotifyTrackFeatures,
 )
 
+T = TypeVar("T")
+
+
+def iter_prefetched_pages(
+    get_page: Callable[[Optional[str]], tuple[list[T], Optional[str]]],
+) -> Iterator[list[T]]:
+    """Yield pages lazily, fetching page N+1 in the background while the
+    caller is still working on page N. get_page(None) fetches the first page
+    and get_page(next_page) the one the previous page's "next" points to, as
+    Spotify may answer with fewer items than asked for."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        items, next_page = get_page(None)
+        while next_page:
+            next_items = executor.submit(get_page, next_page)
+            yield items
+            items, next_page = next_items.result()
+        yield items
+
+
+def dispatch_id_batches(
+    ids: Iterable[str],
+    batch_size: int,
+    get_batch: Callable[[list[str]], list[Optional[T]]],
+) -> dict[str, Optional[T]]:
+    """De-duplicate ids, pack them into batches of at most batch_size and fetch
+    the batches concurrently. get_batch must return one entry per id it is
+    given, in the same order, with None for ids Spotify has no data for."""
+    unique_ids = list(dict.fromkeys(ids))
+    id_batches = [list(id_batch) for id_batch in batched(unique_ids, batch_size)]
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        batch_results = executor.map(get_batch, id_batches)
+        return {
+            id: result
+            for id_batch, results in zip(id_batches, batch_results)
+            for id, result in zip(id_batch, results, strict=True)
+        }
+
 
 class SpotifyClient:
     token = ""
     debug = False
-
-    def __init__(self, debug=False):
+    base_url = BASE_URL
+    token_endpoint = GET_TOKEN_ENDPOINT
+    # Set by bulk imports so that worker processes share one budget and token,
+    # see songs.spotify.shared
+    rate_limiter: Optional[SharedRateLimiter] = None
+    shared_token: Optional[SharedToken] = None
+
+    def __init__(
+        self,
+        debug=False,
+        base_url: Optional[str] = None,
+        token_endpoint: Optional[str] = None,
+    ):
         self.debug = debug
-        self._refresh_token()
+        # Otherwise left to the class attributes, so that repointing
+        # SpotifyClient.base_url also moves clients that already exist
+        if base_url:
+            self.base_url = base_url
+        if token_endpoint:
+            self.token_endpoint = token_endpoint
 
     def _refresh_token(self):
-        self.token = self._get_token()
+        if self.shared_token is not None:
+            self.token = self.shared_token.refresh(
+                stale_token=self.token, fetch=self._get_token
+            )
+        else:
+            self.token = self._get_token()
 
     def _get_token(self) -> str:
         client_id = str(os.getenv("SPOTIFY_CLIENT_ID"))
@@ -47,8 +123,9 @@ class SpotifyClient:
         )
 
         response = requests.post(
-            url=GET_TOKEN_ENDPOINT, headers=GET_TOKEN_HEADER, data=data
+            url=self.token_endpoint, headers=GET_TOKEN_HEADER, data=data
         )
+        observe_token_refresh()
         if self.debug:
             print(response.json())
 
@@ -58,13 +135,22 @@ class SpotifyClient:
             raise RuntimeError("Unable to get token")
 
     def _get_header(self) -> dict[str, str]:
-        if self.token:
-            return {"Authorization": f"Bearer {self.token}"}
-        else:
-            raise RuntimeError("No token initialized")
+        # Nothing is sent to Spotify until the first request needs a token
+        if not self.token:
+            self._refresh_token()
+        return {"Authorization": f"Bearer {self.token}"}
 
     def _get_request(self, endpoint: str, params: dict) -> requests.Response:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        start = time.perf_counter()
         response = requests.get(url=endpoint, headers=self._get_header(), params=params)
+        observe_spotify_request(
+            url=endpoint,
+            status=response.status_code,
+            num_bytes=len(response.content),
+            start=start,
+        )
         if self.debug:
             print_request_and_response(response)
         return response
@@ -72,7 +158,11 @@ class SpotifyClient:
     def _parse_response(self, response: requests.Response) -> dict[str, str]:
         response_json = response.json()
         if error := response_json.get("error"):
-            return raise_correct_error(error.get("status"), error.get("message"))
+            return raise_correct_error(
+                error.get("status"),
+                error.get("message"),
+                retry_after=float(response.headers.get("Retry-After", 1)),
+            )
         return response_json
 
     def get_parse_and_error_handle_request(
@@ -82,20 +172,65 @@ class SpotifyClient:
         try:
             return self._parse_response(response)
         except BadTokenError:
-            self.token = self._get_token()
-            return self.get_parse_and_error_handle_request(
-                endpoint=endpoint,
-                params=params,
-                retries=retries + 1,
-            )
+            if retries >= MAX_RETRIES:
+                raise
+            observe_spotify_retry(url=endpoint, reason="bad_token")
+            self._refresh_token()
+        except RateLimitError as error:
+            if retries >= MAX_RETRIES:
+                raise
+            observe_spotify_retry(url=endpoint, reason="rate_limited")
+            time.sleep(error.retry_after)
+        return self.get_parse_and_error_handle_request(
+            endpoint=endpoint,
+            params=params,
+            retries=retries + 1,
+        )
 
     def get_artist(self, artist_id: str) -> SpotifyArtist:
-        artists_endpoint = f"{BASE_URL}/artists/{artist_id}"
+        artists_endpoint = f"{self.base_url}/artists/{artist_id}"
         response_json = self.get_parse_and_error_handle_request(
             endpoint=artists_endpoint
         )
         return SpotifyArtist.from_dict(response_json)
 
+    # https://developer.spotify.com/documentation/web-api/reference/get-multiple-artists
+    def get_up_to_fifty_artists(
+        self, artist_ids: list[str]
+    ) -> list[Optional[SpotifyArtist]]:
+        artists_endpoint = f"{self.base_url}/artists?ids={','.join(artist_ids)}"
+        response_json = self.get_parse_and_error_handle_request(
+            endpoint=artists_endpoint, retries=0, params={}
+        )
+        return [
+            SpotifyArtist.from_dict(artist_dict) if artist_dict is not None else None
+            for artist_dict in response_json["artists"]
+        ]
+
+    def get_multiple_artists(
+        self, artist_ids: list[str]
+    ) -> list[Optional[SpotifyArtist]]:
+        """Full artist objects in request order, None for unknown ids."""
+        artists_by_id = dispatch_id_batches(
+            ids=artist_ids,
+            batch_size=MAX_ARTIST_IDS,
+            get_batch=self.get_up_to_fifty_artists,
+        )
+        return [artists_by_id[artist_id] for artist_id in artist_ids]
+
+    # https://developer.spotify.com/documentation/web-api/reference/search
+    def search_artists(self, query: str, limit: int = 5) -> list[SpotifyArtist]:
+        search_endpoint = f"{self.base_url}/search"
+        response_json = self.get_parse_and_error_handle_request(
+            endpoint=search_endpoint,
+            retries=0,
+            params={"q": query, "type": "artist", "limit": limit},
+        )
+        return [
+            SpotifyArtist.from_dict(artist_dict)
+            for artist_dict in response_json["artists"]["items"]
+        ]
+
     # This endpoint does not return tracks
     # https://developer.spotify.com/documentation/web-api/reference/get-an-artists-albums
     # If we want these to have tracks we have to get them later
@@ -106,8 +241,11 @@ class SpotifyClient:
         page: int = 0,
         retries: int = 0,
         include_groups: list[SpotifyAlbumType] = [SpotifyAlbumType.ALBUM],
-    ) -> tuple[list[SpotifyAlbumBase], bool]:
-        albums_endpoint = f"{BASE_URL}/artists/{artist_id}/albums/"
+        next_page: Optional[str] = None,
+    ) -> tuple[list[SpotifyAlbumBase], Optional[str]]:
+        """A page of albums and the URL of the page after it, if any. The
+        "next" URL of an earlier page already carries the query."""
+        albums_endpoint = f"{self.base_url}/artists/{artist_id}/albums/"
         include_groups_string = ",".join(
             album_type.value for album_type in include_groups
         )
@@ -117,6 +255,8 @@ class SpotifyClient:
             "offset": page * MAX_LIMIT,
             "include_groups": include_groups_string,
         }
+        if next_page:
+            albums_endpoint, params = next_page, {}
 
         response_json = self.get_parse_and_error_handle_request(
             endpoint=albums_endpoint, retries=retries, params=params
@@ -124,9 +264,23 @@ class SpotifyClient:
 
         album_data = response_json["items"]
         albums = [SpotifyAlbumBase.from_dict(album_dict) for album_dict in album_data]
-        has_next = bool(response_json.get("next", None))
 
-        return albums, has_next
+        return albums, response_json.get("next", None)
+
+    def iter_artist_album_pages(
+        self,
+        artist_id: str,
+        page: int = 0,
+        include_groups: list[SpotifyAlbumType] = [SpotifyAlbumType.ALBUM],
+    ) -> Iterator[list[SpotifyAlbumBase]]:
+        return iter_prefetched_pages(
+            lambda next_page: self.get_artist_albums(
+                artist_id=artist_id,
+                page=page,
+                include_groups=include_groups,
+                next_page=next_page,
+            )
+        )
 
     def get_all_artist_albums(
         self,
@@ -134,25 +288,23 @@ class SpotifyClient:
         page: int = 0,
         include_groups: list[SpotifyAlbumType] = [SpotifyAlbumType.ALBUM],
     ) -> list[SpotifyAlbumBase]:
-        albums, next = self.get_artist_albums(
+        albums: list[SpotifyAlbumBase] = []
+        for albums_page in self.iter_artist_album_pages(
             artist_id=artist_id, page=page, include_groups=include_groups
-        )
-        if not next:
-            return albums
-        return albums + self.get_all_artist_albums(
-            artist_id=artist_id, page=page + 1, include_groups=include_groups
-        )
+        ):
+            albums.extend(albums_page)
+        return albums
 
     def __get_album_partials(
         self, albums_tuple: tuple[SpotifyAlbumBase, ...]
-    ) -> list[SpotifyAlbumPartial]:
+    ) -> list[Optional[SpotifyAlbumPartial]]:
         album_ids_string = ",".join([album.id for album in albums_tuple])
-        albums_endpoint = f"{BASE_URL}/albums?ids={album_ids_string}"
+        albums_endpoint = f"{self.base_url}/albums?ids={album_ids_string}"
         params = {"market": US_MARKET}
         response_json: dict = self.get_parse_and_error_handle_request(
             endpoint=albums_endpoint, params=params
         )
-        album_objects_list: list[dict] = response_json["albums"]
+        album_objects_list: list[Optional[dict]] = response_json["albums"]
         albums = [
             SpotifyAlbumPartial(
                 base=spotify_album,
@@ -163,6 +315,8 @@ class SpotifyClient:
                 next_page=album_object["tracks"]["next"] or None,
                 total_tracks=album_object["total_tracks"],
             )
+            if album_object is not None
+            else None
             for spotify_album, album_object in zip(albums_tuple, album_objects_list)
         ]
         return albums
@@ -170,23 +324,36 @@ class SpotifyClient:
     def get_album_partials(
         self, albums_list: list[SpotifyAlbumBase]
     ) -> list[SpotifyAlbumPartial]:
-        batched_albums = batched(albums_list, 20)
-        ret = []
-        for albums_batch in batched_albums:
-            ret += self.__get_album_partials(albums_tuple=albums_batch)
-        return ret
+        albums_by_id = {album.id: album for album in albums_list}
+        partials_by_id = dispatch_id_batches(
+            ids=albums_by_id,
+            batch_size=MAX_ALBUM_IDS,
+            get_batch=lambda album_ids: self.__get_album_partials(
+                albums_tuple=tuple(albums_by_id[album_id] for album_id in album_ids)
+            ),
+        )
+        missing_ids = [id for id, partial in partials_by_id.items() if partial is None]
+        if missing_ids:
+            logging.warning(f"Spotify returned no data for albums {missing_ids}")
+        return [partial for partial in partials_by_id.values() if partial is not None]
 
     # https://developer.spotify.com/documentation/web-api/reference/get-an-albums-tracks
     def get_album_tracks(
-        self, album_id: str, page: int = 0, retries: int = 0
+        self,
+        album_id: str,
+        page: int = 0,
+        retries: int = 0,
+        next_page: Optional[str] = None,
     ) -> tuple[list[SpotifyTrack], Optional[str]]:
-        album_tracks_endpoint = f"{BASE_URL}/albums/{album_id}/tracks"
+        album_tracks_endpoint = f"{self.base_url}/albums/{album_id}/tracks"
 
         params = {
             "market": US_MARKET,
             "limit": MAX_LIMIT,
             "offset": page * MAX_LIMIT,
         }
+        if next_page:
+            album_tracks_endpoint, params = next_page, {}
         response_json = self.get_parse_and_error_handle_request(
             endpoint=album_tracks_endpoint, params=params, retries=retries
         )
@@ -194,15 +361,23 @@ class SpotifyClient:
         tracks = [
             SpotifyTrack.from_dict(track_dict) for track_dict in response_json["items"]
         ]
-        has_next = response_json.get("next", None)
 
-        return tracks, has_next
+        return tracks, response_json.get("next", None)
+
+    def iter_album_track_pages(
+        self, album_id: str, page: int = 0
+    ) -> Iterator[list[SpotifyTrack]]:
+        return iter_prefetched_pages(
+            lambda next_page: self.get_album_tracks(
+                album_id=album_id, page=page, next_page=next_page
+            )
+        )
 
     def get_all_album_tracks(self, album_id: str, page: int = 0) -> list[SpotifyTrack]:
-        tracks, has_next = self.get_album_tracks(album_id=album_id, page=page)
-        if not has_next:
-            return tracks
-        return tracks + self.get_all_album_tracks(album_id=album_id, page=page + 1)
+        tracks: list[SpotifyTrack] = []
+        for tracks_page in self.iter_album_track_pages(album_id=album_id, page=page):
+            tracks.extend(tracks_page)
+        return tracks
 
     def get_multiple_albums_tracks(
         self, album_ids: list[str]
@@ -210,7 +385,7 @@ class SpotifyClient:
         return {album_id: self.get_all_album_tracks(album_id) for album_id in album_ids}
 
     def _get_track_features(self, track_id: str):
-        track_features_endpoint = f"{BASE_URL}/audio-features/{track_id}"
+        track_features_endpoint = f"{self.base_url}/audio-features/{track_id}"
 
         response_json = self.get_parse_and_error_handle_request(
             endpoint=track_features_endpoint, retries=0, params={}
@@ -220,29 +395,31 @@ class SpotifyClient:
 
     def get_up_to_one_hundred_tracks_features(
         self, track_ids: list[str]
-    ) -> list[SpotifyTrackFeatures]:
+    ) -> list[Optional[SpotifyTrackFeatures]]:
         track_ids_string = ",".join(track_ids)
-        tracks_features_endpoint = f"{BASE_URL}/audio-features/?ids={track_ids_string}"
+        tracks_features_endpoint = f"{self.base_url}/audio-features/?ids={track_ids_string}"
         response_json = self.get_parse_and_error_handle_request(
             endpoint=tracks_features_endpoint, retries=0, params={}
         )
+        # Spotify answers with null for ids it has no features for
         return [
             SpotifyTrackFeatures.from_dict(features_dict=track_feature_dict)
+            if track_feature_dict is not None
+            else None
             for track_feature_dict in response_json["audio_features"]
         ]
 
-    ## To test:
-    ## - Assert called right number of times with 1 track_id, 100 track_ids, 501 track_ids
-    ## - Assert on subsequent loops correct IDs are still being called
     def get_multiple_track_features(
         self, track_ids: list[str]
-    ) -> list[SpotifyTrackFeatures]:
-        num_pages = max(len(track_ids) // 100, 1)
-        ret = []
-        for page_number in range(num_pages):
-            tracks_ids_subset = track_ids[100 * page_number : 100 * (page_number + 1)]
-            ret += self.get_up_to_one_hundred_tracks_features(tracks_ids_subset)
-        return ret
+    ) -> list[Optional[SpotifyTrackFeatures]]:
+        """Features for every requested id, in request order. Duplicate ids are
+        only requested once, and ids without features come back as None."""
+        features_by_id = dispatch_id_batches(
+            ids=track_ids,
+            batch_size=MAX_TRACK_FEATURES_IDS,
+            get_batch=self.get_up_to_one_hundred_tracks_features,
+        )
+        return [features_by_id[track_id] for track_id in track_ids]
 
     def get_complete_album_from_partial(
         self, album_partial: SpotifyAlbumPartial
@@ -259,3 +436,34 @@ class SpotifyClient:
             album_partial.next_page = response_json.get("next", None)
 
         return SpotifyAlbum(album=album_partial.base, tracks=album_partial.tracks)
+
+
+_client: Optional[SpotifyClient] = None
+_client_lock = Lock()
+_client_override: ContextVar[Optional[SpotifyClient]] = ContextVar(
+    "spotify_client", default=None
+)
+
+
+def get_client() -> SpotifyClient:
+    """The client shared by everything in this process, so that they also
+    share its token, unless use_client() says otherwise. Creating it sends
+    nothing to Spotify."""
+    global _client
+    if (client := _client_override.get()) is not None:
+        return client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SpotifyClient()
+    return _client
+
+
+@contextmanager
+def use_client(client: SpotifyClient):
+    """get_client() returns client inside the block, in this thread only."""
+    token = _client_override.set(client)
+    try:
+        yield client
+    finally:
+        _client_override.reset(token)
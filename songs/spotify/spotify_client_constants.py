@@ -1,14 +1,26 @@
+import os
 from enum import Enum
+from typing import TYPE_CHECKING
 
-from requests import Response
+# requests is a large import, and the models only need the enums from here
+if TYPE_CHECKING:
+    from requests import Response
 
 MAX_LIMIT = 50
-BASE_URL = "https://api.spotify.com/v1"
+MAX_ALBUM_IDS = 20
+MAX_ARTIST_IDS = 50
+MAX_TRACK_FEATURES_IDS = 100
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 3
+# Both URLs can be pointed at a local stand-in, see fake_spotify_server.py
+BASE_URL = os.getenv("SPOTIFY_BASE_URL", "https://api.spotify.com/v1")
 US_MARKET = "US"
 
 BAD_OR_EXPIRED_TOKEN_CODE = 401
 
-GET_TOKEN_ENDPOINT = "https://accounts.spotify.com/api/token"
+GET_TOKEN_ENDPOINT = os.getenv(
+    "SPOTIFY_TOKEN_ENDPOINT", "https://accounts.spotify.com/api/token"
+)
 GET_TOKEN_HEADER = {"Content-Type": "application/x-www-form-urlencoded"}
 
 
@@ -36,22 +48,25 @@ class BadOAuthRequestError(SpotifyAPIError):
 
 
 class RateLimitError(SpotifyAPIError):
-    pass
+    def __init__(self, message, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
-def raise_correct_error(code, message):
-    match code:
+def raise_correct_error(code, message, retry_after: float = 1):
+    # Spotify sends the status as an int in error bodies
+    match str(code):
         case "401":
             raise BadTokenError(message)
         case "403":
             raise BadOAuthRequestError(message)
         case "429":
-            raise RateLimitError(message)
+            raise RateLimitError(message, retry_after=retry_after)
         case _:
             raise GenericError(message)
 
 
-def print_request_and_response(response: Response):
+def print_request_and_response(response: "Response"):
     print("REQUEST:")
     print("-------------------------")
     print(response.request.__dict__)
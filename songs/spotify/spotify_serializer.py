@@ -7,14 +7,21 @@ from songs.spotify.spotify_client_constants import SpotifyAlbumType
 class SpotifyArtist:
     id: str
     name: str
+    # Only in full artist objects, not in the ones listed on albums and tracks
+    popularity: Optional[int]
 
-    def __init__(self, id: str, name: str):
+    def __init__(self, id: str, name: str, popularity: Optional[int] = None):
         self.id = id
         self.name = name
+        self.popularity = popularity
 
     @classmethod
     def from_dict(cls, artist_dict):
-        return SpotifyArtist(id=artist_dict["id"], name=artist_dict["name"])
+        return SpotifyArtist(
+            id=artist_dict["id"],
+            name=artist_dict["name"],
+            popularity=artist_dict.get("popularity"),
+        )
 
 
 class SpotifyTrack:
@@ -24,6 +31,8 @@ class SpotifyTrack:
     duration_ms: int
     popularity: int
     is_explicit: bool
+    # Only in full track objects, not in the ones listed on albums
+    isrc: Optional[str]
 
     def __init__(
         self,
@@ -33,6 +42,7 @@ class SpotifyTrack:
         duration_ms: int,
         popularity: int,
         is_explicit: bool,
+        isrc: Optional[str] = None,
     ):
         self.id = id
         self.name = name
@@ -40,6 +50,7 @@ class SpotifyTrack:
         self.duration_ms = duration_ms
         self.popularity = popularity
         self.is_explicit = is_explicit
+        self.isrc = isrc
 
     @classmethod
     def from_dict(cls, track_dict):
@@ -53,6 +64,7 @@ class SpotifyTrack:
             duration_ms=track_dict["duration_ms"],
             is_explicit=track_dict.get("is_explicit", False),
             popularity=track_dict.get("popularity", -1),
+            isrc=track_dict.get("external_ids", {}).get("isrc"),
         )
 
 
@@ -168,7 +180,8 @@ class SpotifyAlbumBase:
                 SpotifyArtist.from_dict(artist_dict)
                 for artist_dict in album_dict["artists"]
             ],
-            album_type=album_dict["type"],
+            # "type" is always "album", the object type
+            album_type=SpotifyAlbumType(album_dict.get("album_type", "album").lower()),
         )
 
 
@@ -0,0 +1,59 @@
+from django.test import TestCase
+from mock import patch
+
+from songs.bulk import bulk_upsert
+from songs.models import Album, AlbumArtist, Artist, Song
+from songs.spotify.spotify_serializer import SpotifyArtist
+from songs.tests import spotify_track
+
+
+# COPY_MIN_ROWS patched down so that Postgres runs take the COPY path
+@patch(target="songs.bulk.COPY_MIN_ROWS", new=1)
+class BulkUpsertTestCase(TestCase):
+    def test_updates_existing_rows(self):
+        Album.objects.create(id="OLD", name="Old name")
+        bulk_upsert(
+            Album,
+            [Album(id="OLD", name="New name"), Album(id="NEW", name="New album")],
+            unique_fields=["id"],
+            update_fields=["name"],
+        )
+        self.assertEqual(
+            dict(Album.objects.values_list("id", "name")),
+            {"OLD": "New name", "NEW": "New album"},
+        )
+
+    def test_ignores_existing_rows_without_update_fields(self):
+        artist = Artist.objects.create(id="ARTIST", name="Artist")
+        album = Album.objects.create(id="ALBUM", name="Album")
+        AlbumArtist.objects.create(album=album, artist=artist)
+        bulk_upsert(
+            AlbumArtist,
+            [
+                AlbumArtist(album=album, artist=artist),
+                AlbumArtist(album=album, artist=artist),
+            ],
+        )
+        self.assertEqual(AlbumArtist.objects.count(), 1)
+
+    def test_twice_in_one_transaction(self):
+        # Every test runs in a transaction of its own
+        for name in ["First name", "Second name"]:
+            bulk_upsert(
+                Album,
+                [Album(id="ALBUM", name=name)],
+                unique_fields=["id"],
+                update_fields=["name"],
+            )
+        self.assertEqual(Album.objects.get(id="ALBUM").name, "Second name")
+
+    def test_long_names(self):
+        name = "Symphony No. 9 in D Minor, Op. 125 " * 6
+        self.assertGreater(len(name), 200)
+        artist = SpotifyArtist(id="ARTIST", name=name)
+        album = Album.objects.create(id="ALBUM", name=name)
+        track = spotify_track("TRACK", [artist])
+        track.name = name
+        Song.objects.import_spotify_tracks(tracks=[track], album=album)  # type: ignore
+        self.assertEqual(Song.objects.get(id="TRACK").track_name, name)
+        self.assertEqual(Artist.objects.get(id="ARTIST").name, name)
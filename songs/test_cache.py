@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from mock import patch
+
+from songs.cache import LRUCache
+
+
+class LRUCacheTestCase(TestCase):
+    def test_least_recently_used_entry_evicted(self):
+        cache = LRUCache(name="test", max_size=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(
+            cache.stats(),
+            {
+                "size": 2,
+                "max_size": 2,
+                "hits": 3,
+                "misses": 1,
+                "evictions": 1,
+                "expirations": 0,
+            },
+        )
+
+    @patch(target="songs.cache.time.monotonic")
+    def test_entries_expire(self, monotonic_mock):
+        cache = LRUCache(name="test", max_size=2, ttl_seconds=60)
+        monotonic_mock.return_value = 0
+        cache.set("a", 1)
+
+        monotonic_mock.return_value = 59
+        self.assertEqual(cache.get("a"), 1)
+        monotonic_mock.return_value = 61
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_get_or_set_and_invalidate(self):
+        cache = LRUCache(name="test", max_size=2, ttl_seconds=60)
+        calls = []
+        factory = lambda: calls.append(1) or len(calls)  # noqa: E731
+
+        self.assertEqual(cache.get_or_set("a", factory), 1)
+        self.assertEqual(cache.get_or_set("a", factory), 1)
+        cache.invalidate("a")
+        self.assertEqual(cache.get_or_set("a", factory), 2)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from songs.dedupe import (
+    TrackDedupeIndex,
+    TrackKey,
+    dedupe_key,
+    normalize_title,
+)
+
+
+def track_key(track_id: str, title: str, duration_ms: int, isrc=None) -> TrackKey:
+    return TrackKey(
+        id=track_id,
+        dedupe_key=dedupe_key(title, "ARTIST", duration_ms),
+        duration_ms=duration_ms,
+        isrc=isrc,
+    )
+
+
+class TrackDedupeTestCase(TestCase):
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("Sóng (feat. Guest) - 2011 Remaster"), "song")
+        self.assertEqual(normalize_title("Song - Single Version"), "song")
+        self.assertEqual(normalize_title("Song (Live)"), "song live")
+        self.assertEqual(normalize_title("東京 [Remastered]"), "東京")
+
+    def test_duplicates_across_duration_buckets(self):
+        index = TrackDedupeIndex([track_key("ORIGINAL", "Song", 179_999)])
+        self.assertEqual(index.find(track_key("COPY", "SONG", 180_001)), "ORIGINAL")
+        self.assertIsNone(index.find(track_key("EDIT", "Song", 150_000)))
+        self.assertIsNone(index.find(track_key("LIVE", "Song (Live)", 180_000)))
+
+    def test_isrc_matches_regardless_of_title(self):
+        index = TrackDedupeIndex([track_key("ORIGINAL", "Song", 180_000, isrc="X")])
+        self.assertEqual(
+            index.find(track_key("RENAMED", "Renamed", 100_000, isrc="X")), "ORIGINAL"
+        )
+        self.assertEqual(
+            index.find(track_key("COPY", "Song", 180_000, isrc="Y")), "ORIGINAL"
+        )
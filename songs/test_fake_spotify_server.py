@@ -0,0 +1,213 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from mock import patch
+
+from songs.cache import clear_caches
+from songs.models import Album, Artist, Song, SongFeatures
+from songs import repository
+from songs.refresher import RequestBudget, search_counts
+from songs.spotify.fake_spotify_server import FakeCatalog, FakeSpotifyServer
+from songs.spotify.spotify import (
+    get_artist_track_features,
+    import_artist_albums_songs,
+    refresh_stale_artists,
+)
+from songs.spotify.spotify_client import SpotifyClient, get_client
+from songs.spotify.spotify_client_constants import RateLimitError
+
+
+class FakeSpotifyServerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.catalog = FakeCatalog.synthetic(
+            num_artists=1, albums_per_artist=40, tracks_per_album=60
+        )
+        self.artist_id = next(iter(self.catalog.artist_albums))
+
+    def client_for(self, server: FakeSpotifyServer) -> SpotifyClient:
+        return SpotifyClient(
+            base_url=server.base_url, token_endpoint=server.token_endpoint
+        )
+
+    def test_paginated_import_requests(self):
+        with FakeSpotifyServer(self.catalog) as server:
+            client = self.client_for(server)
+            albums = client.get_all_artist_albums(self.artist_id)
+            self.assertEqual(len({album.id for album in albums}), 60)
+            self.assertEqual(server.request_counts["artist_albums"], 2)
+
+            partials = client.get_album_partials(albums)
+            self.assertEqual(server.request_counts["albums"], 3)
+            complete = [
+                client.get_complete_album_from_partial(partial) for partial in partials
+            ]
+            self.assertEqual(
+                sum(len(album.tracks) for album in complete),
+                sum(
+                    len(album["tracks"])
+                    for album in self.catalog.albums.values()
+                    if album["album_type"] == "album"
+                ),
+            )
+
+            track_ids = [track.id for album in complete for track in album.tracks]
+            features = client.get_multiple_track_features(track_ids)
+            self.assertEqual([feature.id for feature in features], track_ids)
+
+    def test_small_pages(self):
+        with FakeSpotifyServer(self.catalog, page_size=7) as server:
+            client = self.client_for(server)
+            albums = client.get_all_artist_albums(self.artist_id)
+            self.assertEqual(len({album.id for album in albums}), 60)
+            self.assertEqual(server.request_counts["artist_albums"], 9)
+            tracks = client.get_all_album_tracks(albums[0].id)
+            self.assertEqual(len({track.id for track in tracks}), 60)
+
+            [partial] = client.get_album_partials(
+                [client.get_artist_albums(self.artist_id)[0][0]]
+            )
+            self.assertEqual(len(partial.tracks), 7)
+            complete = client.get_complete_album_from_partial(partial)
+            self.assertEqual(len(complete.tracks), 60)
+
+    def test_expired_token_refreshed(self):
+        with FakeSpotifyServer(self.catalog, token_ttl_requests=2) as server:
+            client = self.client_for(server)
+            for _ in range(3):
+                client.get_artist(self.artist_id)
+            self.assertEqual(server.request_counts["token"], 2)
+            self.assertEqual(server.request_counts["401"], 1)
+
+    def test_several_artists_batched(self):
+        catalog = FakeCatalog.synthetic(
+            num_artists=120, albums_per_artist=1, tracks_per_album=1
+        )
+        artist_ids = [*catalog.artists, "UNKNOWN_ARTIST_ID_0000"]
+        with FakeSpotifyServer(catalog) as server:
+            artists = self.client_for(server).get_multiple_artists(artist_ids)
+            self.assertEqual(server.request_counts["artists"], 3)
+        self.assertEqual(
+            [artist.id if artist else None for artist in artists],
+            [*catalog.artists, None],
+        )
+        self.assertTrue(all(artist.popularity is not None for artist in artists[:-1]))
+
+    def test_rate_limited_requests_retried(self):
+        with FakeSpotifyServer(self.catalog, rate_limit_every=2) as server:
+            client = self.client_for(server)
+            for _ in range(2):
+                self.assertEqual(client.get_artist(self.artist_id).id, self.artist_id)
+            self.assertEqual(server.request_counts["429"], 1)
+
+        with FakeSpotifyServer(self.catalog, rate_limit_every=1) as server:
+            with self.assertRaises(RateLimitError):
+                self.client_for(server).get_artist(self.artist_id)
+
+    def test_fixture_round_trip(self):
+        fixture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(fixture_dir.cleanup)
+        path = os.path.join(fixture_dir.name, "catalog.json")
+        self.catalog.to_fixture(path)
+        catalog = FakeCatalog.from_fixture(path)
+        self.assertEqual(catalog.num_tracks, self.catalog.num_tracks)
+        self.assertEqual(catalog.artists, self.catalog.artists)
+
+
+class ImportSinglesTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        # Album 0 has a lead single and an EP, album 3 a lead single
+        self.catalog = FakeCatalog.synthetic(
+            num_artists=1, albums_per_artist=4, tracks_per_album=3
+        )
+        self.artist_id = next(iter(self.catalog.artist_albums))
+        self.server = FakeSpotifyServer(self.catalog).start()
+        self.addCleanup(self.server.stop)
+        client = SpotifyClient(
+            base_url=self.server.base_url, token_endpoint=self.server.token_endpoint
+        )
+        patcher = patch("songs.spotify.spotify.get_client", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_singles_already_on_albums_skipped(self):
+        import_artist_albums_songs(self.artist_id)
+
+        # The lead singles of albums 0 and 3 are both on their albums
+        self.assertEqual(
+            sorted(Album.objects.values_list("name", flat=True)),
+            ["Album 0", "Album 1 (Deluxe)", "Album 2", "Album 3 (Deluxe)", "EP 0"],
+        )
+        self.assertEqual(Song.objects.filter(album__name="EP 0").count(), 4)
+        self.assertEqual(
+            SongFeatures.objects.count(), Song.objects.canonical().count()  # type: ignore
+        )
+        # Both singles and the EP listed in one request, with their tracks
+        self.assertEqual(self.server.request_counts["albums"], 2)
+        self.assertEqual(
+            self.server.request_counts["album_tracks"], Album.objects.count() - 1
+        )
+
+
+class RefreshStaleArtistsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.catalog = FakeCatalog.synthetic(
+            num_artists=2, albums_per_artist=2, tracks_per_album=3
+        )
+        self.server = FakeSpotifyServer(self.catalog).start()
+        self.addCleanup(self.server.stop)
+        for attribute, value in [
+            ("base_url", self.server.base_url),
+            ("token_endpoint", self.server.token_endpoint),
+        ]:
+            patcher = patch.object(SpotifyClient, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.shared_client = SpotifyClient()
+        patcher = patch("songs.spotify.spotify_client._client", self.shared_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for search_count, artist_id in enumerate(self.catalog.artist_albums, 1):
+            Artist.objects.create(
+                id=artist_id, name=artist_id, search_count=search_count
+            )
+        Artist.objects.update(most_recently_updated=timezone.now() - timedelta(days=30))
+        # Searches recorded by other tests
+        search_counts.take()
+
+    def test_budget_counts_only_the_pass(self):
+        budget = RequestBudget(max_requests=1000)
+        refreshed = refresh_stale_artists(budget=budget)
+
+        self.assertEqual(len(refreshed), 2)
+        self.assertEqual(
+            budget.used,
+            self.server.total_requests - self.server.request_counts["token"],
+        )
+        # The shared client is left as it was
+        self.assertIs(get_client(), self.shared_client)
+        self.assertIsNone(self.shared_client.rate_limiter)
+        self.assertIsNone(SpotifyClient.rate_limiter)
+
+    def test_stops_when_budget_runs_out(self):
+        refreshed = refresh_stale_artists(budget=RequestBudget(max_requests=1))
+        # Most searched first, the budget is only checked between artists
+        self.assertEqual(refreshed, [list(self.catalog.artist_albums)[1]])
+
+    def test_searches_since_last_pass_counted_first(self):
+        first, second = self.catalog.artist_albums
+        for _ in range(2):
+            repository.import_artist(first)
+        # Imports other than searches, like the import_artists command, don't count
+        get_artist_track_features(second)
+        self.assertEqual(Artist.objects.get(id=second).search_count, 2)
+
+        Artist.objects.update(most_recently_updated=timezone.now() - timedelta(days=30))
+        refreshed = refresh_stale_artists(budget=RequestBudget(max_requests=1))
+        self.assertEqual(refreshed, [first])
+        self.assertEqual(Artist.objects.get(id=first).search_count, 3)
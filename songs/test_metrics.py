@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase
+from mock import patch
+
+from songs import metrics
+from songs.spotify.fake_spotify_server import FakeCatalog, FakeSpotifyServer
+from songs.spotify.spotify_client import SpotifyClient
+
+
+class MetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        for metric in metrics.ALL_METRICS:
+            metric.values.clear()
+
+    def test_endpoint_label(self):
+        self.assertEqual(
+            metrics.endpoint_label(
+                "https://api.spotify.com/v1/artists/7dGJo4pcD2V6oG8kP0tJRR/albums/"
+            ),
+            "/artists/{id}/albums",
+        )
+        self.assertEqual(
+            metrics.endpoint_label("https://api.spotify.com/v1/audio-features/?ids=a"),
+            "/audio-features",
+        )
+
+    @patch(target="songs.metrics.METRICS_ENABLED", new=True)
+    def test_client_requests_recorded(self):
+        catalog = FakeCatalog.synthetic(num_artists=1, albums_per_artist=1)
+        artist_id = next(iter(catalog.artist_albums))
+        with FakeSpotifyServer(catalog, rate_limit_every=2) as server:
+            client = SpotifyClient(
+                base_url=server.base_url, token_endpoint=server.token_endpoint
+            )
+            client.get_artist(artist_id)
+            client.get_artist(artist_id)
+
+        self.assertEqual(metrics.spotify_token_refreshes.values, {(): 1})
+        self.assertEqual(
+            metrics.spotify_requests.values,
+            {("/artists/{id}", "200"): 2, ("/artists/{id}", "429"): 1},
+        )
+        self.assertEqual(
+            metrics.spotify_retries.values, {("/artists/{id}", "rate_limited"): 1}
+        )
+        self.assertEqual(metrics.spotify_rate_limited.values, {("/artists/{id}",): 1})
+        [(counts, _)] = metrics.spotify_request_duration.values.values()
+        self.assertEqual(sum(counts), 3)
+
+        rendered = metrics.render_metrics()
+        self.assertIn(
+            'spotify_requests_total{endpoint="/artists/{id}",status="200"} 2', rendered
+        )
+        self.assertIn(
+            'spotify_request_duration_seconds_count{endpoint="/artists/{id}"} 3',
+            rendered,
+        )
+
+    def test_disabled_by_default(self):
+        metrics.observe_spotify_request(
+            url="https://api.spotify.com/v1/artists", status=200, num_bytes=1, start=0
+        )
+        self.assertEqual(metrics.spotify_requests.values, {})
+
+    def test_metrics_view(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE spotify_requests_total counter", response.content)
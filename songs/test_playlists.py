@@ -0,0 +1,82 @@
+import time
+from unittest import TestCase
+
+import numpy as np
+
+from songs.playlists import (
+    greedy_path,
+    path_length,
+    sequence,
+    transition_distances,
+    two_opt,
+)
+from songs.profiles import FEATURES
+
+
+def songs_with(**columns) -> np.ndarray:
+    songs = np.full((len(next(iter(columns.values()))), len(FEATURES)), 0.5)
+    for feature, values in columns.items():
+        songs[:, FEATURES.index(feature)] = values
+    return songs
+
+
+class PlaylistTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.songs = rng.uniform(0, 1, size=(300, len(FEATURES)))
+
+    def test_transition_distances(self):
+        songs = songs_with(
+            tempo=[0.5, 0.8, 0.5, 0.5], key=[0, 0, 11 / 12, 0], energy=[0.5] * 4
+        )
+        distances = transition_distances(songs)
+        np.testing.assert_allclose(distances, distances.T, atol=1e-6)
+        np.testing.assert_allclose(np.diag(distances), 0, atol=1e-3)
+        self.assertAlmostEqual(float(distances[0, 1]), 0.3, places=5)
+        # The last key is next to the first, and other features don't count
+        self.assertAlmostEqual(float(distances[0, 2]), 1 / 12, places=2)
+        self.assertAlmostEqual(float(distances[0, 3]), 0, places=3)
+
+    def test_sorted_by_tempo(self):
+        tempo = np.random.default_rng(1).permutation(50) / 50
+        songs = songs_with(tempo=tempo)
+        start = int(tempo.argmin())
+        order = sequence(songs, start=start)
+        np.testing.assert_array_equal(tempo[order], np.sort(tempo))
+
+    def test_two_opt_improves_greedy(self):
+        distances = transition_distances(self.songs)
+        greedy = greedy_path(distances, start=5)
+        improved = two_opt(greedy, distances, deadline=time.perf_counter() + 60)
+
+        self.assertEqual(improved[0], 5)
+        self.assertEqual(sorted(improved), list(range(len(self.songs))))
+        self.assertLess(
+            path_length(improved, distances), path_length(greedy, distances)
+        )
+        # No single reversal shortens the path any further
+        for start in range(1, len(improved) - 1):
+            for end in range(start + 1, len(improved)):
+                reversed_path = improved.copy()
+                reversed_path[start : end + 1] = improved[start : end + 1][::-1]
+                self.assertGreaterEqual(
+                    path_length(reversed_path, distances),
+                    path_length(improved, distances) - 1e-4,
+                )
+
+    def test_stops_at_deadline(self):
+        distances = transition_distances(self.songs)
+        greedy = greedy_path(distances)
+        np.testing.assert_array_equal(two_opt(greedy, distances, deadline=0), greedy)
+
+    def test_greedy_stops_at_deadline(self):
+        distances = transition_distances(self.songs)
+        path = greedy_path(distances, start=5, deadline=0)
+        self.assertEqual(path[0], 5)
+        self.assertEqual(sorted(path), list(range(len(self.songs))))
+        # The rest as they are from the first song
+        np.testing.assert_array_equal(np.diff(distances[5, path[1:]]) >= 0, True)
+
+    def test_empty_and_single(self):
+        self.assertEqual(sequence(self.songs[:0]), [])
+        self.assertEqual(sequence(self.songs[:1]), [0])
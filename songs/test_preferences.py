@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+import numpy as np
+
+from songs.preferences import PreferenceModel, centered
+from songs.profiles import FEATURE_RANGES, FEATURES
+
+
+class PreferenceModelTestCase(TestCase):
+    def setUp(self):
+        low, high = np.array(list(FEATURE_RANGES.values())).T
+        rng = np.random.default_rng(0)
+        self.songs = centered(rng.uniform(low, high, size=(200, len(FEATURES))))
+        self.energy = FEATURES.index("energy")
+
+    def test_centered(self):
+        self.assertEqual(self.songs.dtype, np.float32)
+        np.testing.assert_allclose(self.songs.mean(axis=0), 0, atol=1e-6)
+        self.assertEqual(centered(np.empty((0, len(FEATURES)))).shape[0], 0)
+
+    def test_first_pick_without_votes(self):
+        shown = np.zeros(len(self.songs), dtype=bool)
+        self.assertEqual(PreferenceModel().next_song(self.songs, shown=shown), 0)
+        shown[0] = True
+        self.assertEqual(PreferenceModel().next_song(self.songs, shown=shown), 1)
+
+    def test_votes_learn_preference(self):
+        # A listener who likes every song more energetic than the average one
+        model = PreferenceModel()
+        shown = np.zeros(len(self.songs), dtype=bool)
+        for _ in range(20):
+            row = model.next_song(self.songs, shown)
+            shown[row] = True
+            model.vote(self.songs[row], liked=self.songs[row, self.energy] > 0)
+
+        self.assertGreater(model.weights[self.energy], 0)
+        self.assertEqual(model.weights[self.energy], np.abs(model.weights).max())
+        next_row = model.next_song(self.songs, shown)
+        self.assertGreater(self.songs[next_row, self.energy], 0)
+
+    def test_skips_shown_songs(self):
+        model = PreferenceModel()
+        model.vote(self.songs[0], liked=True)
+        shown = np.zeros(len(self.songs), dtype=bool)
+        best = model.next_song(self.songs, shown)
+        shown[best] = True
+        self.assertNotEqual(model.next_song(self.songs, shown), best)
+        self.assertIsNone(model.next_song(self.songs, np.ones(len(self.songs), bool)))
+        self.assertIsNone(model.next_song(self.songs[:0], np.zeros(0, bool)))
+
+    def test_bytes_round_trip(self):
+        model = PreferenceModel()
+        model.vote(self.songs[3], liked=False)
+        data = model.to_bytes()
+        self.assertEqual(len(data), 4 * len(FEATURES))
+        np.testing.assert_array_equal(
+            PreferenceModel.from_bytes(data).weights, model.weights
+        )
+
+    def test_best_songs(self):
+        model = PreferenceModel()
+        np.testing.assert_array_equal(model.best_songs(self.songs, limit=3), [0, 1, 2])
+        model.vote(self.songs[7], liked=True)
+        best = model.best_songs(self.songs, limit=len(self.songs))
+        scores = self.songs[best] @ model.weights
+        self.assertTrue((np.diff(scores) <= 0).all())
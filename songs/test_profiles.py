@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+import numpy as np
+
+from songs.profiles import (
+    FEATURE_RANGES,
+    FEATURES,
+    HISTOGRAM_BINS,
+    FeatureAggregate,
+    nearest,
+)
+
+
+class FeatureAggregateTestCase(TestCase):
+    def setUp(self):
+        low, high = np.array(list(FEATURE_RANGES.values())).T
+        self.bin_width = (high - low) / HISTOGRAM_BINS
+        rng = np.random.default_rng(0)
+        self.features = rng.uniform(low, high, size=(500, len(FEATURES)))
+
+    def test_incremental_matches_all_at_once(self):
+        incremental = FeatureAggregate()
+        for batch in np.array_split(self.features, 7):
+            incremental.add(batch)
+        all_at_once = FeatureAggregate()
+        all_at_once.add(self.features)
+
+        self.assertEqual(incremental.num_songs, 500)
+        np.testing.assert_allclose(incremental.mean, all_at_once.mean)
+        np.testing.assert_array_equal(incremental.histogram, all_at_once.histogram)
+        np.testing.assert_allclose(incremental.mean, self.features.mean(axis=0))
+        np.testing.assert_allclose(incremental.std, self.features.std(axis=0))
+
+    def test_percentiles_within_a_bin(self):
+        aggregate = FeatureAggregate()
+        aggregate.add(self.features)
+        for band, percentile in zip(aggregate.percentiles(), (10, 50, 90)):
+            np.testing.assert_array_less(
+                abs(band - np.percentile(self.features, percentile, axis=0)),
+                self.bin_width,
+            )
+
+    def test_bytes_round_trip(self):
+        aggregate = FeatureAggregate()
+        aggregate.add(self.features)
+        restored = FeatureAggregate.from_bytes(500, *aggregate.to_bytes())
+        np.testing.assert_array_equal(restored.vector(), aggregate.vector())
+        self.assertLess(sum(map(len, aggregate.to_bytes())), 2048)
+
+    def test_nearest(self):
+        vectors = np.array([[0.0, 0.0], [3.0, 4.0], [1.0, 0.0], [0.0, 2.0]])
+        self.assertEqual(
+            nearest(vectors[0], vectors, limit=3), [(0, 0.0), (2, 1.0), (3, 2.0)]
+        )
+        self.assertEqual(nearest(vectors[0], vectors[:0], limit=3), [])
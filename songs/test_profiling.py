@@ -0,0 +1,85 @@
+from datetime import date
+
+from django.test import TestCase
+
+from songs.cache import clear_caches
+from songs.models import Album, Artist, Song
+from songs.profiling import profile_queries
+from songs.spotify.spotify_client_constants import SpotifyAlbumType
+from songs.spotify.spotify_serializer import (
+    SpotifyAlbum,
+    SpotifyAlbumBase,
+    SpotifyArtist,
+    SpotifyTrack,
+)
+
+
+def spotify_album(album_id: str, num_tracks: int) -> SpotifyAlbum:
+    artist = SpotifyArtist(id="ARTIST", name="Artist")
+    guest = SpotifyArtist(id=f"GUEST_{album_id}", name="Guest")
+    return SpotifyAlbum(
+        album=SpotifyAlbumBase(
+            id=album_id,
+            name=album_id,
+            artists=[artist],
+            release_date=date(2024, 1, 1),
+            album_type=SpotifyAlbumType.ALBUM,
+        ),
+        tracks=[
+            SpotifyTrack(
+                id=f"{album_id}_{track_number}",
+                name=f"Track {track_number}",
+                artists=[artist, guest] if track_number % 2 else [artist],
+                duration_ms=1000,
+                popularity=10,
+                is_explicit=False,
+            )
+            for track_number in range(num_tracks)
+        ],
+    )
+
+
+class ProfileQueriesTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def import_album(self, album: SpotifyAlbum) -> int:
+        clear_caches()
+        with profile_queries(f"import {album.base.id}") as profile:
+            db_album = Album.objects.import_spotify_album(album)  # type: ignore
+            Song.objects.import_spotify_tracks(tracks=album.tracks, album=db_album)  # type: ignore
+        self.assertEqual(profile.repeated, {})
+        return profile.count
+
+    def test_album_import_costs_constant_queries(self):
+        small = self.import_album(spotify_album("SMALL", num_tracks=2))
+        large = self.import_album(spotify_album("LARGE", num_tracks=60))
+        self.assertEqual(small, large)
+        self.assertEqual(Song.objects.count(), 62)
+
+    def test_repeated_queries_reported(self):
+        with self.assertLogs("songs.profiling", level="INFO") as logs:
+            with profile_queries("lookups") as profile:
+                for artist_id in ["A", "B", "C", "A"]:
+                    Artist.objects.filter(id=artist_id).exists()
+
+        self.assertEqual(profile.count, 4)
+        [(sql, count)] = profile.repeated.items()
+        self.assertEqual(count, 4)
+        [((_, params), count)] = profile.duplicates.items()
+        self.assertIn("A", params)
+        self.assertEqual(count, 2)
+        self.assertIn("lookups: 4 queries", logs.output[0])
+        self.assertIn("possible N+1", logs.output[1])
+
+    def test_decorator_profiles_each_call(self):
+        @profile_queries("count_artists")
+        def count_artists():
+            return Artist.objects.count()
+
+        with self.assertLogs("songs.profiling", level="INFO") as logs:
+            count_artists()
+            count_artists()
+        self.assertEqual(len(logs.output), 2)
+        for line in logs.output:
+            self.assertIn("count_artists: 1 queries", line)
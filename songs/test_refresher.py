@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from mock import MagicMock
+
+from songs.refresher import RequestBudget, SearchCounts, refresh_periodically
+
+
+class RequestBudgetTestCase(TestCase):
+    def test_counts_and_forwards_requests(self):
+        rate_limiter = MagicMock()
+        budget = RequestBudget(max_requests=2, rate_limiter=rate_limiter)
+        budget.acquire()
+        self.assertEqual(budget.remaining, 1)
+        self.assertFalse(budget.exhausted)
+
+        # Requests past the budget still go through, the caller stops early
+        budget.acquire()
+        budget.acquire()
+        self.assertEqual(budget.remaining, 0)
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(rate_limiter.acquire.call_count, 3)
+
+    def test_counts_requests_from_many_threads(self):
+        budget = RequestBudget(max_requests=10)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(8):
+                executor.submit(lambda: [budget.acquire() for _ in range(10_000)])
+        self.assertEqual(budget.used, 80_000)
+
+
+class SearchCountsTestCase(TestCase):
+    def test_take_starts_over(self):
+        search_counts = SearchCounts()
+        for artist_id in ["POPULAR", "POPULAR", "NICHE"]:
+            search_counts.record(artist_id)
+        self.assertEqual(search_counts.take(), {"POPULAR": 2, "NICHE": 1})
+        self.assertEqual(search_counts.take(), {})
+
+
+class RefreshPeriodicallyTestCase(IsolatedAsyncioTestCase):
+    async def test_failed_pass_does_not_stop_refresher(self):
+        passes = []
+
+        async def refresh_pass():
+            passes.append(len(passes))
+            if len(passes) == 1:
+                raise RuntimeError("Spotify is down")
+            return ["ARTIST"]
+
+        task = asyncio.create_task(
+            refresh_periodically(refresh_pass, interval_seconds=0.01)
+        )
+        while len(passes) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        self.assertEqual(passes, [0, 1, 2])
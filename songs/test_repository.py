@@ -0,0 +1,169 @@
+from django.test import TestCase
+from mock import patch
+
+from songs import repository
+from songs.cache import clear_caches
+from songs.dedupe import dedupe_key
+from songs.models import Album, Artist, Song, SongFeatures
+from songs.profiles import FEATURES
+from songs.tests import spotify_track
+from songs.spotify.spotify_serializer import SpotifyArtist
+
+
+class ArtistSongsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.artist = Artist.objects.create(id="ARTIST", name="Artist")
+        self.album = Album.objects.create(id="ALBUM", name="Album")
+        for song_id, popularity in [("QUIET", 10), ("HIT", 90)]:
+            song = Song.objects.create(
+                id=song_id,
+                track_name=song_id.title(),
+                duration_ms=1000,
+                popularity=popularity,
+                album=self.album,
+            )
+            song.artists.set([self.artist])
+
+    def test_most_popular_first_and_cached(self):
+        songs = repository.get_artist_songs("ARTIST")
+        self.assertEqual(
+            songs,
+            [
+                {
+                    "title": "Hit",
+                    "spotify_id": "HIT",
+                    "album": "Album",
+                    "popularity": 90,
+                },
+                {
+                    "title": "Quiet",
+                    "spotify_id": "QUIET",
+                    "album": "Album",
+                    "popularity": 10,
+                },
+            ],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(repository.get_artist_songs("ARTIST"), songs)
+
+    def test_import_invalidates_cached_songs(self):
+        repository.get_artist_songs("ARTIST")
+        Song.objects.import_spotify_tracks(  # type: ignore
+            tracks=[spotify_track("NEW", [SpotifyArtist(id="ARTIST", name="Artist")])],
+            album=self.album,
+        )
+        self.assertEqual(
+            [song["spotify_id"] for song in repository.get_artist_songs("ARTIST")],
+            ["HIT", "NEW", "QUIET"],
+        )
+
+    def test_song_matrix_of_songs_with_features(self):
+        for song_id, energy in [("HIT", 0.9), ("QUIET", 0.1)]:
+            SongFeatures.objects.create(
+                id=song_id,
+                song_id=song_id,
+                **{feature: 0.5 for feature in FEATURES} | {"energy": energy},
+            )
+        Song.objects.create(
+            id="NO_FEATURES",
+            track_name="No Features",
+            duration_ms=1000,
+            popularity=100,
+            album=self.album,
+        ).artists.set([self.artist])
+
+        songs, matrix = repository.get_artist_song_matrix("ARTIST")
+        self.assertEqual([song["spotify_id"] for song in songs], ["HIT", "QUIET"])
+        self.assertEqual(matrix.shape, (2, len(FEATURES)))
+        energy = FEATURES.index("energy")
+        self.assertAlmostEqual(float(matrix[0, energy]), 0.4, places=5)
+        self.assertAlmostEqual(float(matrix[1, energy]), -0.4, places=5)
+        with self.assertNumQueries(0):
+            repository.get_artist_song_matrix("ARTIST")
+
+
+class AssignCanonicalTestCase(TestCase):
+    def setUp(self):
+        self.album = Album.objects.create(id="ALBUM", name="Album")
+
+    def song(self, song_id: str, title: str, duration_ms: int) -> Song:
+        return Song.objects.create(
+            id=song_id,
+            track_name=title,
+            duration_ms=duration_ms,
+            popularity=0,
+            album=self.album,
+            dedupe_key=dedupe_key(title, "ARTIST", duration_ms),
+        )
+
+    @patch("songs.models.DEDUPE_BATCH_SIZE", 1)
+    def test_duplicates_found_across_batches(self):
+        self.song("OLD", "Old", 100_000)
+        db_songs = [
+            self.song("NEW", "New", 200_000),
+            self.song("OLD_REMASTER", "Old - Remastered", 101_000),
+            self.song("NEW_LIVE", "New", 200_500),
+            self.song("OTHER", "Other", 200_000),
+        ]
+        Song.objects.assign_canonical(db_songs)  # type: ignore
+        self.assertEqual(
+            dict(Song.objects.values_list("id", "canonical_id")),
+            {
+                "OLD": None,
+                "NEW": None,
+                "OLD_REMASTER": "OLD",
+                "NEW_LIVE": "NEW",
+                "OTHER": None,
+            },
+        )
+
+
+class SearchArtistsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        repository.reset_search_index()
+        Artist.objects.create(id="ARTIST", name="Artist", popularity=50)
+        self.addCleanup(repository.reset_search_index)
+
+    @patch("songs.repository.get_client")
+    def test_local_matches_by_name_and_id(self, get_client):
+        self.assertEqual(
+            [artist.id for artist in repository.search_artists("artis")], ["ARTIST"]
+        )
+        self.assertEqual(
+            [artist.name for artist in repository.search_artists("ARTIST")], ["Artist"]
+        )
+        get_client.assert_not_called()
+
+    @patch("songs.repository.get_client")
+    def test_spotify_search_on_local_miss_is_cached(self, get_client):
+        get_client().search_artists.return_value = [
+            SpotifyArtist(id="REMOTE", name="Remote Band", popularity=40)
+        ]
+        get_client.reset_mock()
+        matches = repository.search_artists("Remote Band")
+        self.assertEqual([artist.id for artist in matches], ["REMOTE"])
+        get_client().search_artists.assert_called_once_with(
+            query="Remote Band", limit=5
+        )
+
+        # Nothing written, but found locally from now on
+        self.assertFalse(Artist.objects.filter(id="REMOTE").exists())
+        self.assertEqual(repository.search_artists("remote"), matches)
+
+        get_client().search_artists.return_value = []
+        self.assertEqual(repository.search_artists("nobody"), [])
+        self.assertEqual(repository.search_artists("Nobody!"), [])
+        self.assertEqual(get_client().search_artists.call_count, 2)
+
+    @patch("songs.repository.get_client")
+    def test_spotify_search_in_other_scripts(self, get_client):
+        for name in ["Кино", "米津玄師"]:
+            with self.subTest(name=name):
+                get_client().search_artists.return_value = [
+                    SpotifyArtist(id=name, name=name, popularity=40)
+                ]
+                matches = repository.search_artists(name)
+                self.assertEqual([artist.id for artist in matches], [name])
+                get_client().search_artists.assert_called_with(query=name, limit=5)
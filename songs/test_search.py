@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from songs.search import ArtistMatch, ArtistSearchIndex, normalize_name
+
+
+class ArtistSearchIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = ArtistSearchIndex(
+            [
+                ArtistMatch(id="BEYONCE", name="Beyoncé", popularity=90),
+                ArtistMatch(
+                    id="BEY_TRIBUTE", name="Beyonce Tribute Band", popularity=5
+                ),
+                ArtistMatch(id="BEACH_HOUSE", name="Beach House", popularity=70),
+                ArtistMatch(id="THE_BEACH_BOYS", name="The Beach Boys", popularity=80),
+                ArtistMatch(id="RADIOHEAD", name="Radiohead", popularity=85),
+            ]
+        )
+
+    def ids(self, query: str, limit: int = 10) -> list[str]:
+        return [artist.id for artist in self.index.search(query, limit=limit)]
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Beyoncé & The Band!"), "beyonce the band")
+        self.assertEqual(normalize_name("Кино"), "кино")
+        self.assertEqual(normalize_name("米津玄師"), "米津玄師")
+
+    def test_exact_match_before_prefix_matches(self):
+        self.assertEqual(self.ids("beyonce"), ["BEYONCE", "BEY_TRIBUTE"])
+
+    def test_prefix_matches_any_word_by_popularity(self):
+        self.assertEqual(self.ids("beach"), ["THE_BEACH_BOYS", "BEACH_HOUSE"])
+        self.assertEqual(self.ids("boys"), ["THE_BEACH_BOYS"])
+
+    def test_misspelling_matches_by_trigrams(self):
+        self.assertEqual(self.ids("raidohead"), ["RADIOHEAD"])
+        self.assertEqual(self.ids("zzzz"), [])
+        self.assertEqual(self.ids("!!"), [])
+
+    def test_names_in_other_scripts(self):
+        self.index.add(ArtistMatch(id="KINO", name="Кино", popularity=60))
+        self.index.add(ArtistMatch(id="YONEZU", name="米津玄師", popularity=70))
+        self.assertEqual(self.ids("кино"), ["KINO"])
+        self.assertEqual(self.ids("米津"), ["YONEZU"])
+
+    def test_search_waits_for_add(self):
+        # An add on an import thread holds the lock while it changes the index
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with self.index._lock:
+                searching = executor.submit(self.ids, "radiohead")
+                self.assertRaises(TimeoutError, searching.result, timeout=0.05)
+            self.assertEqual(searching.result(), ["RADIOHEAD"])
+
+    def test_limit(self):
+        self.assertEqual(self.ids("b", limit=1), ["BEYONCE"])
+
+    def test_add_and_rename(self):
+        self.index.add(ArtistMatch(id="NEW", name="Beabadoobee", popularity=60))
+        self.assertEqual(self.ids("beab"), ["NEW"])
+
+        self.index.add(ArtistMatch(id="NEW", name="Radiohead Covers", popularity=1))
+        self.assertEqual(self.ids("beab"), [])
+        self.assertEqual(self.ids("radiohead"), ["RADIOHEAD", "NEW"])
+        self.assertEqual(len(self.index), 6)
@@ -0,0 +1,43 @@
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+from songs.management.commands.import_artists import read_artist_ids
+from songs.spotify.shared import SharedRateLimiter, SharedToken
+
+
+class SharedRateLimiterTestCase(TestCase):
+    def test_requests_spread_out(self):
+        rate_limiter = SharedRateLimiter(requests_per_second=100, burst=2)
+        start = time.monotonic()
+        for _ in range(12):
+            rate_limiter.acquire()
+        # 2 from the initial burst, then 10 at 100 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class SharedTokenTestCase(TestCase):
+    def test_only_first_stale_refresh_fetches(self):
+        shared_token = SharedToken()
+        tokens = iter(["token-1", "token-2"])
+        fetch = lambda: next(tokens)  # noqa: E731
+
+        self.assertEqual(shared_token.refresh(stale_token="", fetch=fetch), "token-1")
+        self.assertEqual(shared_token.refresh(stale_token="", fetch=fetch), "token-1")
+        self.assertEqual(
+            shared_token.refresh(stale_token="token-1", fetch=fetch), "token-2"
+        )
+        # A second worker that also saw token-1 expire picks up token-2
+        self.assertEqual(
+            shared_token.refresh(stale_token="token-1", fetch=fetch), "token-2"
+        )
+        self.assertEqual(shared_token.get(), "token-2")
+
+
+class ReadArtistIdsTestCase(TestCase):
+    def test_comments_blanks_and_duplicates_skipped(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as artist_file:
+            artist_file.write("A\n\n# header\nB  # trailing\nA\n")
+            artist_file.flush()
+            self.assertEqual(read_artist_ids(Path(artist_file.name)), ["A", "B"])
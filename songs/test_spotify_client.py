@@ -1,7 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from django.test import TestCase
 from mock import patch
 
-from songs.spotify.spotify_client import SpotifyClient
+from songs.spotify.fake_spotify_server import FakeCatalog, FakeSpotifyServer
+from songs.spotify.spotify_client import (
+    SpotifyClient,
+    get_client,
+    iter_prefetched_pages,
+    use_client,
+)
 
 
 class SpotifyClientTestCase(TestCase):
@@ -22,26 +30,148 @@ class SpotifyClientTestCase(TestCase):
         with self.subTest(
             msg="Test get all albums called once when should be called multiple times"
         ):
-            get_artist_albums_mock.side_effect = [([], None), ([], True)]
+            get_artist_albums_mock.reset_mock()
+            get_artist_albums_mock.side_effect = [([], "NEXT_PAGE"), ([], None)]
             client.get_all_artist_albums(artist_id="ARTIST_ID")
             assert get_artist_albums_mock.call_count == 2
 
-    # TODO: Change test to be mock patched
     def test_get_album_partials(self):
-        client = SpotifyClient()
-        albums = client.get_all_artist_albums("7dGJo4pcD2V6oG8kP0tJRR")
-        partial_albums = client.get_album_partials(albums)
-        self.assertEqual(len(partial_albums), 18)
+        catalog = FakeCatalog.synthetic(albums_per_artist=12, tracks_per_album=10)
+        artist_id = next(iter(catalog.artist_albums))
+        with FakeSpotifyServer(catalog) as server:
+            client = SpotifyClient(
+                base_url=server.base_url, token_endpoint=server.token_endpoint
+            )
+            albums = client.get_all_artist_albums(artist_id)
+            partial_albums = client.get_album_partials(albums)
+        self.assertEqual(
+            len(partial_albums),
+            sum(album["album_type"] == "album" for album in catalog.albums.values()),
+        )
         for partial_album in partial_albums:
             self.assertEqual(partial_album.next_page, None)
 
-    # TODO: Change test to be mock patched
     def test_get_complete_album_from_partial(self):
+        catalog = FakeCatalog.synthetic(albums_per_artist=2, tracks_per_album=125)
+        artist_id = next(iter(catalog.artist_albums))
+        with FakeSpotifyServer(catalog) as server:
+            client = SpotifyClient(
+                base_url=server.base_url, token_endpoint=server.token_endpoint
+            )
+            albums = client.get_all_artist_albums(artist_id)
+            partial_albums = client.get_album_partials(albums)
+            incomplete_album = partial_albums[1]
+            self.assertIsNotNone(incomplete_album.next_page)
+            complete_album = client.get_complete_album_from_partial(incomplete_album)
+
+        self.assertEqual(
+            len(complete_album.tracks),
+            len(catalog.albums[incomplete_album.base.id]["tracks"]),
+        )
+        self.assertEqual(len(partial_albums), 3)
+
+
+class PrefetchedPagesTestCase(TestCase):
+    def test_pages_yielded_in_order(self):
+        pages = {None: ([1, 2], "PAGE_1"), "PAGE_1": ([3], "PAGE_2")}
+        pages["PAGE_2"] = ([4, 5], None)
+        requested = []
+
+        def get_page(next_page):
+            requested.append(next_page)
+            return pages[next_page]
+
+        self.assertEqual(list(iter_prefetched_pages(get_page)), [[1, 2], [3], [4, 5]])
+        self.assertEqual(requested, [None, "PAGE_1", "PAGE_2"])
+
+    def test_next_page_prefetched_before_current_is_consumed(self):
+        requested = []
+
+        def get_page(next_page):
+            requested.append(next_page)
+            return [next_page], "PAGE_1" if next_page is None else None
+
+        pages = iter_prefetched_pages(get_page)
+        self.assertEqual(next(pages), [None])
+        pages.close()
+        self.assertEqual(requested, [None, "PAGE_1"])
+
+    def test_single_page(self):
+        get_page = lambda next_page: (["only"], None)  # noqa: E731
+        self.assertEqual(list(iter_prefetched_pages(get_page)), [["only"]])
+
+
+@patch(
+    target="songs.spotify.spotify_client.SpotifyClient._get_token",
+    autospec=True,
+    return_value="TOKEN",
+)
+class TrackFeaturesBatchingTestCase(TestCase):
+    @patch(
+        target="songs.spotify.spotify_client.SpotifyClient.get_up_to_one_hundred_tracks_features",
+        autospec=True,
+    )
+    def test_batches_cover_every_track(self, get_features_mock, _):
+        get_features_mock.side_effect = lambda self, track_ids: list(track_ids)
+        client = SpotifyClient()
+
+        for num_tracks, num_calls in [(1, 1), (100, 1), (150, 2), (501, 6)]:
+            with self.subTest(msg=f"{num_tracks} track ids"):
+                get_features_mock.reset_mock()
+                track_ids = [f"TRACK_{i}" for i in range(num_tracks)]
+                features = client.get_multiple_track_features(track_ids=track_ids)
+                self.assertEqual(get_features_mock.call_count, num_calls)
+                self.assertEqual(features, track_ids)
+                requested = [
+                    track_id
+                    for call in get_features_mock.call_args_list
+                    for track_id in call.args[1]
+                ]
+                self.assertEqual(sorted(requested), sorted(track_ids))
+
+    @patch(
+        target="songs.spotify.spotify_client.SpotifyClient.get_up_to_one_hundred_tracks_features",
+        autospec=True,
+    )
+    def test_duplicates_and_nulls(self, get_features_mock, _):
+        get_features_mock.side_effect = lambda self, track_ids: [
+            None if track_id == "MISSING" else track_id.lower()
+            for track_id in track_ids
+        ]
         client = SpotifyClient()
-        albums = client.get_all_artist_albums("2IN2VBkdXOBfoXJGrAUV1O")
-        partial_albums = client.get_album_partials(albums)
-        incomplete_album = partial_albums[1]
-        complete_album = client.get_complete_album_from_partial(incomplete_album)
 
-        self.assertEqual(len(complete_album.tracks), 125)
-        self.assertEqual(len(partial_albums), 8)
+        features = client.get_multiple_track_features(
+            track_ids=["B", "A", "MISSING", "B"]
+        )
+        self.assertEqual(features, ["b", "a", None, "b"])
+        get_features_mock.assert_called_once_with(client, ["B", "A", "MISSING"])
+
+
+class LazyClientTestCase(TestCase):
+    @patch(target="songs.spotify.spotify_client.requests", autospec=True)
+    def test_token_fetched_on_first_request(self, requests_mock):
+        requests_mock.post.return_value.json.return_value = {"access_token": "TOKEN"}
+        requests_mock.get.return_value.status_code = 200
+        requests_mock.get.return_value.json.return_value = {"id": "ARTIST"}
+
+        client = SpotifyClient()
+        requests_mock.post.assert_not_called()
+
+        client.get_parse_and_error_handle_request(endpoint="artists/ARTIST")
+        client.get_parse_and_error_handle_request(endpoint="artists/ARTIST")
+        requests_mock.post.assert_called_once()
+        self.assertEqual(
+            requests_mock.get.call_args.kwargs["headers"],
+            {"Authorization": "Bearer TOKEN"},
+        )
+
+    def test_get_client_shared(self):
+        self.assertIs(get_client(), get_client())
+
+    def test_use_client_in_this_thread_only(self):
+        shared, own = get_client(), SpotifyClient()
+        with use_client(own):
+            self.assertIs(get_client(), own)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                self.assertIs(executor.submit(get_client).result(), shared)
+        self.assertIs(get_client(), shared)
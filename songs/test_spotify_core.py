@@ -1,4 +1,8 @@
 from django.test import TestCase
+from mock import patch
+
+from songs.cache import clear_caches
+from songs.spotify.fake_spotify_server import FakeCatalog, FakeSpotifyServer
 
 from songs.spotify.spotify import (
     filter_duplicate_albums,
@@ -9,6 +13,19 @@ from songs.spotify.spotify_client import SpotifyClient
 
 
 class SpotifyCoreTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        catalog = FakeCatalog.synthetic(albums_per_artist=6, tracks_per_album=8)
+        self.artist_id = next(iter(catalog.artist_albums))
+        server = FakeSpotifyServer(catalog).start()
+        self.addCleanup(server.stop)
+        self.client = SpotifyClient(
+            base_url=server.base_url, token_endpoint=server.token_endpoint
+        )
+        patcher = patch("songs.spotify.spotify.get_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_parse_album_name(self):
         tests = {
             "Album name": "album name",
@@ -18,16 +35,15 @@ class SpotifyCoreTestCase(TestCase):
             self.assertEqual(parse_album_name(input), output)
 
     def test_filter_duplicate_albums(self):
-        client = SpotifyClient()
-
-        with self.subTest(msg="Filter Eminem albums"):
-            eminem_albums = client.get_all_artist_albums("7dGJo4pcD2V6oG8kP0tJRR")
-            filtered = filter_duplicate_albums(eminem_albums)
+        with self.subTest(msg="Filter deluxe editions"):
+            albums = self.client.get_all_artist_albums(self.artist_id)
+            filtered = filter_duplicate_albums(albums)
             self.assertEqual(
-                len(eminem_albums),
+                len(albums),
                 len(filtered) + 3,
-                msg="2024/05/04 - 3 albums should get filtered",
+                msg="Albums 1, 3 and 5 have deluxe editions",
             )
 
     def test_import_artists_albums(self):
-        _ = import_artist_albums_songs(artist_id="7dGJo4pcD2V6oG8kP0tJRR")
+        features = import_artist_albums_songs(artist_id=self.artist_id)
+        self.assertTrue(features)
@@ -0,0 +1,69 @@
+import json
+import logging
+from unittest import TestCase
+
+from mock import patch
+
+from songs import tracing
+from songs.tracing import span
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.spans = []
+
+    def emit(self, record):
+        self.spans.append(json.loads(record.getMessage()))
+
+
+@patch(target="songs.tracing.TRACING_ENABLED", new=True)
+class TracingTestCase(TestCase):
+    def record_spans(self, run) -> list[dict]:
+        handler = RecordingHandler()
+        tracing.start_tracing(handler=handler)
+        try:
+            run()
+        finally:
+            tracing.stop_tracing()
+        return handler.spans
+
+    def test_nested_spans(self):
+        def run():
+            with span("search", search_id="SEARCH") as search_span:
+                with span("status_check"):
+                    pass
+                search_span.set(num_songs=3)
+
+        status_check, search = self.record_spans(run)
+        self.assertEqual(search["name"], "search")
+        self.assertEqual(search["num_songs"], 3)
+        self.assertEqual(search["search_id"], "SEARCH")
+        self.assertIsNone(search["parent_id"])
+        self.assertEqual(status_check["parent_id"], search["span_id"])
+        self.assertEqual(status_check["trace_id"], search["trace_id"])
+        self.assertGreaterEqual(search["duration_ms"], status_check["duration_ms"])
+
+    def test_errors_recorded(self):
+        def run():
+            with self.assertRaises(ValueError):
+                with span("tree_build"):
+                    raise ValueError("no songs")
+
+        [tree_build] = self.record_spans(run)
+        self.assertEqual(tree_build["status"], "error")
+        self.assertEqual(tree_build["error"], "ValueError('no songs')")
+
+    @patch(target="songs.tracing.TRACE_SAMPLE_RATE", new=0)
+    def test_unsampled_traces_not_recorded(self):
+        def run():
+            with span("search"):
+                with span("status_check"):
+                    pass
+
+        self.assertEqual(self.record_spans(run), [])
+
+    def test_disabled(self):
+        with patch(target="songs.tracing.TRACING_ENABLED", new=False):
+            with span("search") as search_span:
+                self.assertIsNone(search_span)
@@ -1,3 +1,301 @@
+from datetime import date, timedelta
+
+import numpy as np
 from django.test import TestCase
+from django.utils import timezone
+
+from songs.cache import clear_caches
+from songs.models import Album, Artist, ArtistProfile, Song, SongFeatures
+from songs.spotify.spotify_client_constants import SpotifyAlbumType
+from songs.spotify.spotify_serializer import (
+    SpotifyAlbum,
+    SpotifyAlbumBase,
+    SpotifyArtist,
+    SpotifyTrack,
+)
+
+
+def create_song_with_features(
+    song_id: str, album: Album, artist: Artist, energy: float = 0.5
+) -> Song:
+    song = Song.objects.create(
+        id=song_id, track_name=song_id, duration_ms=1000, popularity=50, album=album
+    )
+    song.artists.set([artist])
+    SongFeatures.objects.create(
+        id=song_id,
+        song=song,
+        acousticness=0.5,
+        danceability=0.5,
+        energy=energy,
+        instrumentalness=0.5,
+        key=1,
+        liveness=0.5,
+        loudness=-5,
+        mode=1,
+        speechiness=0.5,
+        tempo=120,
+        time_signature=4,
+        valence=0.5,
+    )
+    return song
+
+
+class SongFeaturesManagerTestCase(TestCase):
+    def test_get_song_features_by_artist_single_query(self):
+        artist = Artist.objects.create(id="ARTIST", name="Artist")
+        other_artist = Artist.objects.create(id="OTHER", name="Other")
+        album = Album.objects.create(id="ALBUM", name="Album")
+        for song_id in ["SONG_1", "SONG_2"]:
+            create_song_with_features(song_id=song_id, album=album, artist=artist)
+        create_song_with_features(song_id="SONG_3", album=album, artist=other_artist)
+
+        with self.assertNumQueries(1):
+            features = list(
+                SongFeatures.objects.get_song_features_by_artist(artist.id)  # type: ignore
+            )
+            track_names = sorted(feature.song.track_name for feature in features)
+        self.assertEqual(track_names, ["SONG_1", "SONG_2"])
+
+
+def spotify_track(track_id: str, artists: list[SpotifyArtist]) -> SpotifyTrack:
+    return SpotifyTrack(
+        id=track_id,
+        name=f"Track {track_id}",
+        artists=artists,
+        duration_ms=1000,
+        popularity=10,
+        is_explicit=False,
+    )
+
+
+class ImportManagersTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.artist = SpotifyArtist(id="ARTIST", name="Artist")
+        self.guest = SpotifyArtist(id="GUEST", name="Guest")
+        self.album = SpotifyAlbum(
+            album=SpotifyAlbumBase(
+                id="ALBUM",
+                name="Album",
+                artists=[self.artist],
+                release_date=date(2024, 1, 1),
+                album_type=SpotifyAlbumType.ALBUM,
+            ),
+            tracks=[],
+        )
+
+    def test_get_or_import_existing_artist(self):
+        Artist.objects.create(id="ARTIST", name="Existing name")
+        db_artist = Artist.objects.get_or_import(self.artist)  # type: ignore
+        self.assertEqual(db_artist.name, "Existing name")
+        self.assertEqual(Artist.objects.count(), 1)
+
+    def test_hydrate_stubs(self):
+        db_album = Album.objects.import_spotify_album(self.album)  # type: ignore
+        Song.objects.import_spotify_tracks(  # type: ignore
+            tracks=[spotify_track("TRACK", [self.artist, self.guest])], album=db_album
+        )
+        self.assertEqual(
+            sorted(Artist.objects.stubs().values_list("id", flat=True)),  # type: ignore
+            ["ARTIST", "GUEST"],
+        )
+
+        Artist.objects.hydrate(  # type: ignore
+            [SpotifyArtist(id="GUEST", name="Guest (full)", popularity=70)]
+        )
+        self.assertEqual(
+            list(Artist.objects.stubs().values_list("id", flat=True)),  # type: ignore
+            ["ARTIST"],
+        )
+        guest = Artist.objects.get(id="GUEST")
+        self.assertEqual((guest.name, guest.popularity), ("Guest (full)", 70))
+
+    def test_assign_canonical(self):
+        def release(track_id, name, duration_ms, isrc=None):
+            return SpotifyTrack(
+                id=track_id,
+                name=name,
+                artists=[self.artist],
+                duration_ms=duration_ms,
+                popularity=10,
+                is_explicit=False,
+                isrc=isrc,
+            )
+
+        db_album = Album.objects.import_spotify_album(self.album)  # type: ignore
+        Song.objects.assign_canonical(  # type: ignore
+            Song.objects.import_spotify_tracks(  # type: ignore
+                tracks=[
+                    release("ORIGINAL", "Song", 180_000),
+                    release("REMASTER", "Song - 2011 Remaster", 181_500),
+                    release("LIVE", "Song (Live)", 180_000),
+                    release("OTHER_TAKE", "Song", 200_000, isrc="USABC0000001"),
+                ],
+                album=db_album,
+            )
+        )
+        db_songs = Song.objects.assign_canonical(  # type: ignore
+            Song.objects.import_spotify_tracks(  # type: ignore
+                tracks=[
+                    release("SINGLE", "Song (feat. Guest)", 179_900),
+                    release("RADIO_EDIT", "Other name", 150_000, isrc="USABC0000001"),
+                ],
+                album=db_album,
+            )
+        )
+
+        self.assertEqual(
+            [song.canonical_id for song in db_songs], ["ORIGINAL", "OTHER_TAKE"]
+        )
+        self.assertEqual(
+            dict(Song.objects.values_list("id", "canonical")),
+            {
+                "ORIGINAL": None,
+                "REMASTER": "ORIGINAL",
+                "LIVE": None,
+                "OTHER_TAKE": None,
+                "SINGLE": "ORIGINAL",
+                "RADIO_EDIT": "OTHER_TAKE",
+            },
+        )
+        self.assertEqual(
+            sorted(Song.objects.canonical().values_list("id", flat=True)),  # type: ignore
+            ["LIVE", "ORIGINAL", "OTHER_TAKE"],
+        )
+
+    def test_repeated_imports_upsert(self):
+        for _ in range(2):
+            clear_caches()
+            db_album = Album.objects.import_spotify_album(self.album)  # type: ignore
+            Song.objects.import_spotify_tracks(  # type: ignore
+                tracks=[
+                    spotify_track("TRACK_1", [self.artist]),
+                    spotify_track("TRACK_2", [self.artist, self.guest]),
+                    spotify_track("TRACK_2", [self.artist, self.guest]),
+                ],
+                album=db_album,
+            )
+
+        self.assertEqual(Album.objects.count(), 1)
+        self.assertEqual(Song.objects.count(), 2)
+        self.assertEqual(
+            sorted(Artist.objects.values_list("id", flat=True)), ["ARTIST", "GUEST"]
+        )
+        self.assertEqual(list(db_album.artists.values_list("id", flat=True)), ["ARTIST"])
+        self.assertEqual(
+            sorted(Song.objects.get(id="TRACK_2").artists.values_list("id", flat=True)),
+            ["ARTIST", "GUEST"],
+        )
+
+
+class ArtistRefreshTestCase(TestCase):
+    def create_artist(self, artist_id: str, search_count: int, age: timedelta):
+        artist = Artist.objects.create(
+            id=artist_id, name=artist_id, search_count=search_count
+        )
+        Artist.objects.filter(id=artist_id).update(
+            most_recently_updated=timezone.now() - age
+        )
+        return artist
+
+    def test_due_for_refresh_most_searched_first(self):
+        self.create_artist("POPULAR", search_count=10, age=timedelta(hours=40))
+        self.create_artist("NICHE", search_count=1, age=timedelta(hours=40))
+        self.create_artist("FRESH", search_count=50, age=timedelta(hours=1))
+        self.create_artist("UNSEARCHED", search_count=0, age=timedelta(days=30))
+
+        due = Artist.objects.due_for_refresh(  # type: ignore
+            timezone.now() - timedelta(hours=36)
+        )
+        self.assertEqual(list(due.values_list("id", flat=True)), ["POPULAR", "NICHE"])
+
+    def test_record_search_and_mark_updated(self):
+        self.create_artist("ARTIST", search_count=0, age=timedelta(days=3))
+        Artist.objects.record_searches({"ARTIST": 2, "UNKNOWN": 1})  # type: ignore
+        Artist.objects.mark_updated("ARTIST")  # type: ignore
+
+        artist = Artist.objects.get(id="ARTIST")
+        self.assertEqual(artist.search_count, 2)
+        self.assertFalse(artist.is_updating)
+        self.assertGreater(
+            artist.most_recently_updated, timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_stale_between_and_recently_updated(self):
+        self.create_artist("DAY_OLD", search_count=0, age=timedelta(days=1))
+        self.create_artist("WEEK_OLD", search_count=0, age=timedelta(days=7))
+        self.create_artist("MONTH_OLD", search_count=0, age=timedelta(days=30))
+
+        now = timezone.now()
+        stale = Artist.objects.stale_between(  # type: ignore
+            updated_after=now - timedelta(days=14), updated_before=now - timedelta(days=2)
+        )
+        self.assertEqual(list(stale.values_list("id", flat=True)), ["WEEK_OLD"])
+        self.assertTrue(Artist.objects.get(id="DAY_OLD").recently_updated)
+        self.assertFalse(Artist.objects.get(id="WEEK_OLD").recently_updated)
+
+
+class ArtistProfileTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        album = Album.objects.create(id="ALBUM", name="Album")
+        self.songs_by_artist = {}
+        for artist_id, energy in [("LOUD", 0.9), ("LOUDER", 0.95), ("QUIET", 0.1)]:
+            artist = Artist.objects.create(id=artist_id, name=artist_id.title())
+            self.songs_by_artist[artist_id] = [
+                create_song_with_features(
+                    f"{artist_id}_{number}", album, artist, energy=energy + number / 100
+                )
+                for number in range(4)
+            ]
+
+    def recount_all_profiles(self):
+        for songs in self.songs_by_artist.values():
+            ArtistProfile.objects.recount_for_song_features(  # type: ignore
+                list(SongFeatures.objects.filter(song__in=songs[:2]))
+            )
+            ArtistProfile.objects.recount_for_song_features(  # type: ignore
+                list(SongFeatures.objects.filter(song__in=songs[2:]))
+            )
+
+    def test_recount_matches_rebuild(self):
+        self.recount_all_profiles()
+        recounted = {
+            profile.artist_id: profile.aggregate.vector()
+            for profile in ArtistProfile.objects.all()
+        }
+        ArtistProfile.objects.rebuild()  # type: ignore
+        for profile in ArtistProfile.objects.all():
+            self.assertEqual(profile.num_songs, 4)
+            np.testing.assert_allclose(
+                profile.aggregate.vector(), recounted[profile.artist_id]
+            )
+
+    def test_same_features_imported_twice_counted_once(self):
+        songs = self.songs_by_artist["LOUD"]
+        db_features = list(SongFeatures.objects.filter(song__in=songs))
+        ArtistProfile.objects.recount_for_song_features(db_features)  # type: ignore
+        ArtistProfile.objects.recount_for_song_features(db_features[:2])  # type: ignore
+        self.assertEqual(ArtistProfile.objects.get(artist_id="LOUD").num_songs, 4)
+
+    def test_only_canonical_songs_counted(self):
+        songs = self.songs_by_artist["LOUD"]
+        Song.objects.filter(id=songs[3].id).update(canonical=songs[0])
+        self.recount_all_profiles()
+        recounted = ArtistProfile.objects.get(artist_id="LOUD").aggregate.vector()
+        ArtistProfile.objects.rebuild()  # type: ignore
+        profile = ArtistProfile.objects.get(artist_id="LOUD")
+        self.assertEqual(profile.num_songs, 3)
+        np.testing.assert_allclose(profile.aggregate.vector(), recounted)
+
+    def test_similar_to(self):
+        self.recount_all_profiles()
+        similar = ArtistProfile.objects.similar_to("LOUD", limit=5)  # type: ignore
+        self.assertEqual([artist_id for artist_id, _ in similar], ["LOUDER", "QUIET"])
+        self.assertLess(similar[0][1], similar[1][1])
+        self.assertEqual(ArtistProfile.objects.similar_to("UNKNOWN"), [])  # type: ignore
 
-# Create your tests here.
+        # Served from one cached matrix
+        with self.assertNumQueries(0):
+            ArtistProfile.objects.similar_to("QUIET", limit=1)  # type: ignore
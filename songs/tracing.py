@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator, Optional
+
+# Configured from the environment, e.g. TRACING_ENABLED=1 TRACE_SAMPLE_RATE=0.1
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    attributes: dict = field(default_factory=dict)
+    start: float = field(default_factory=time.perf_counter)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_listener: Optional[QueueListener] = None
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Time the block as a span of the current trace, or start a new trace.
+    Whether a trace is recorded is decided once at its root span. Finished
+    spans are logged as JSON lines to songs.tracing.
+
+    Spans must not be held open across a yield of an async generator, the
+    context they are bound to can change between resumptions."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex[:16],
+        span_id=uuid.uuid4().hex[:8],
+        parent_id=parent.span_id if parent else None,
+        sampled=parent.sampled if parent else random.random() < TRACE_SAMPLE_RATE,
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    status = "ok"
+    try:
+        yield current
+    except BaseException as error:
+        status = "error"
+        current.set(error=repr(error))
+        raise
+    finally:
+        _current_span.reset(token)
+        if current.sampled:
+            record = {
+                "trace_id": current.trace_id,
+                "span_id": current.span_id,
+                "parent_id": current.parent_id,
+                "name": current.name,
+                "duration_ms": round((time.perf_counter() - current.start) * 1000, 3),
+                "status": status,
+                **current.attributes,
+            }
+            logger.info(json.dumps(record, default=str))
+
+
+def start_tracing(handler: Optional[logging.Handler] = None):
+    """Route span records through a queue, so the thread finishing a span (the
+    event loop, usually) never blocks on writing them out."""
+    global _listener
+    if not TRACING_ENABLED or _listener is not None:
+        return
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(records))
+    _listener = QueueListener(records, handler or logging.StreamHandler(sys.stderr))
+    _listener.start()
+
+
+def stop_tracing():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
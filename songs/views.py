@@ -1,6 +1,8 @@
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
+
+from songs.metrics import render_metrics
 
 
 @require_POST
@@ -15,3 +17,8 @@ def submit(request):
 
 def detail(request, song_id):
     return HttpResponse("You're looking at song %s." % song_id)
+
+
+@require_GET
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
@@ -48,7 +48,7 @@ const SpotifyRecommender = () => {
             setCurrentState("searching");
             break;
           case "completed":
-            // Processing complete, tree is ready
+            // Processing complete, first song is ready
             setCurrentState("recommendation");
             setCurrentSong({
               title: data.song.title,
@@ -70,6 +70,11 @@ const SpotifyRecommender = () => {
       };
 
       eventSource.onerror = (error) => {
+        // The browser reconnects by itself, resuming after the last event
+        if (eventSource.readyState === EventSource.CONNECTING) {
+          console.warn("SSE reconnecting:", error);
+          return;
+        }
         console.error("SSE error:", error);
         eventSource.close();
         setCurrentState("search");
@@ -103,8 +108,10 @@ const SpotifyRecommender = () => {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
+          search_id: searchId,
           artist_id: artistId,
           artist_name: artistName,
+          liked: isLike,
           vote_history: newVoteHistory,
         }),
       });
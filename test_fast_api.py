@@ -0,0 +1,319 @@
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import numpy as np
+from fakeredis import FakeAsyncRedis
+from fastapi.testclient import TestClient
+from mock import AsyncMock, patch
+
+import fast_api_test
+from songs.profiles import FEATURES
+
+
+class RecordVoteTestCase(TestCase):
+    def setUp(self):
+        self.api_client = TestClient(fast_api_test.app)
+
+    def test_vote_without_liked_rejected(self):
+        for body in [
+            {"search_id": "SEARCH"},
+            {"search_id": "SEARCH", "vote_history": []},
+            {"search_id": "SEARCH", "liked": "yes"},
+            {"liked": True},
+        ]:
+            with self.subTest(body=body):
+                response = self.api_client.post("/api/vote", json=body)
+                self.assertEqual(response.status_code, 422)
+
+    def test_liked_or_last_of_vote_history(self):
+        patcher = patch.object(fast_api_test.session_manager, "redis", FakeAsyncRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for body in [
+            {"search_id": "MISSING", "liked": False},
+            {"search_id": "MISSING", "vote_history": [True, False]},
+        ]:
+            with self.subTest(body=body):
+                response = self.api_client.post("/api/vote", json=body)
+                self.assertEqual(response.status_code, 404)
+
+    def test_each_song_shown_once(self):
+        redis = FakeAsyncRedis()
+        session_manager = fast_api_test.SessionManager(redis)
+        songs = [
+            {
+                "spotify_id": f"SONG_{row}",
+                "title": f"Song {row}",
+                "album": "Album",
+                "popularity": 0,
+            }
+            for row in range(10)
+        ]
+        matrix = np.random.default_rng(0).uniform(size=(10, len(FEATURES)))
+        for patcher in [
+            patch.object(fast_api_test, "session_manager", session_manager),
+            patch.object(
+                fast_api_test.repository,
+                "aget_artist_song_matrix",
+                AsyncMock(return_value=(songs, matrix)),
+            ),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        asyncio.run(
+            session_manager.create_session(
+                search_id="SEARCH",
+                spotify_id="ARTIST",
+                artist_name="Artist",
+                first_song_id="SONG_3",
+            )
+        )
+
+        shown = ["SONG_3"]
+        for _ in range(9):
+            response = self.api_client.post(
+                "/api/vote", json={"search_id": "SEARCH", "liked": True}
+            ).json()
+            shown.append(response["song"]["song_id"])
+            # A bit per song, two bytes for ten songs whatever the votes
+            self.assertEqual(
+                len(asyncio.run(redis.hget("session:SEARCH", "shown"))), 2
+            )
+        self.assertCountEqual(shown, [song["spotify_id"] for song in songs])
+        response = self.api_client.post(
+            "/api/vote", json={"search_id": "SEARCH", "liked": False}
+        )
+        self.assertEqual(response.json(), {"status": "complete"})
+
+
+class CreatePlaylistTestCase(TestCase):
+    def setUp(self):
+        self.api_client = TestClient(fast_api_test.app)
+        self.session_manager = fast_api_test.SessionManager(FakeAsyncRedis())
+        patcher = patch.object(fast_api_test, "session_manager", self.session_manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_body_rejected(self):
+        for body in [
+            {},
+            {"search_id": 1},
+            {"search_id": "SEARCH", "length": "ten"},
+            {"search_id": "SEARCH", "length": 2.5},
+            {"search_id": "SEARCH", "length": True},
+        ]:
+            with self.subTest(body=body):
+                response = self.api_client.post("/api/playlist", json=body)
+                self.assertEqual(response.status_code, 422)
+
+    def test_length_clamped(self):
+        songs = [
+            {
+                "spotify_id": f"SONG_{row}",
+                "title": f"Song {row}",
+                "album": "Album",
+                "popularity": 0,
+            }
+            for row in range(10)
+        ]
+        matrix = np.random.default_rng(0).uniform(size=(10, len(FEATURES)))
+        asyncio.run(
+            self.session_manager.create_session(
+                search_id="SEARCH",
+                spotify_id="ARTIST",
+                artist_name="Artist",
+                first_song_id="SONG_3",
+            )
+        )
+        patcher = patch.object(
+            fast_api_test.repository,
+            "aget_artist_song_matrix",
+            AsyncMock(return_value=(songs, matrix)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for length, expected in [(-1, 1), (0, 1), (4, 4), (10**9, 10)]:
+            with self.subTest(length=length):
+                response = self.api_client.post(
+                    "/api/playlist", json={"search_id": "SEARCH", "length": length}
+                )
+                playlist = response.json()["songs"]
+                self.assertEqual(len(playlist), expected)
+                self.assertEqual(playlist[0]["song_id"], "SONG_3")
+
+
+class SearchRegistryTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis = FakeAsyncRedis()
+        self.search_registry = fast_api_test.SearchRegistry(self.redis)
+
+    async def test_register_and_get(self):
+        await self.search_registry.register(
+            search_id="SEARCH", spotify_id="ARTIST", artist_name="Artist"
+        )
+        self.assertEqual(
+            await self.search_registry.get("SEARCH"),
+            {"spotify_id": "ARTIST", "artist_name": "Artist"},
+        )
+        self.assertIsNone(await self.search_registry.get("UNKNOWN"))
+
+    async def test_expires(self):
+        await self.search_registry.register(
+            search_id="SEARCH", spotify_id="ARTIST", artist_name="Artist"
+        )
+        self.assertEqual(await self.redis.ttl("search:SEARCH"), 600)
+
+        await self.redis.pexpire("search:SEARCH", 1)
+        await asyncio.sleep(0.01)
+        self.assertIsNone(await self.search_registry.get("SEARCH"))
+
+
+class ImportBroadcastTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis = FakeAsyncRedis()
+        self.import_broadcast = fast_api_test.ImportBroadcast(self.redis)
+        self.import_broadcast.heartbeat_seconds = 0.01
+
+    async def events(self, last_event_id: str = "0-0", limit: int = 10) -> list:
+        events = []
+        async for event_id, event in self.import_broadcast.subscribe(
+            "ARTIST", last_event_id=last_event_id
+        ):
+            events.append((event_id, event))
+            if len(events) == limit:
+                break
+        return events
+
+    async def test_claimed_once_until_released_by_owner(self):
+        self.assertTrue(await self.import_broadcast.claim("ARTIST", owner="FIRST"))
+        self.assertFalse(await self.import_broadcast.claim("ARTIST", owner="SECOND"))
+
+        await self.import_broadcast.release("ARTIST", owner="SECOND")
+        self.assertFalse(await self.import_broadcast.claim("ARTIST", owner="SECOND"))
+        await self.import_broadcast.release("ARTIST", owner="FIRST")
+        self.assertTrue(await self.import_broadcast.claim("ARTIST", owner="SECOND"))
+
+    async def test_claim_drops_previous_events(self):
+        await self.import_broadcast.publish("ARTIST", {"status": "completed"})
+        self.assertTrue(await self.import_broadcast.claim("ARTIST", owner="OWNER"))
+        self.assertFalse(await self.redis.exists("import:ARTIST:events"))
+
+    async def test_owner_renews_claim(self):
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        await self.import_broadcast.publish("ARTIST", {"status": "searching"})
+        for key in ["import:ARTIST:owner", "import:ARTIST:events"]:
+            await self.redis.expire(key, 10)
+
+        self.assertFalse(await self.import_broadcast.renew("ARTIST", owner="OTHER"))
+        self.assertEqual(await self.redis.ttl("import:ARTIST:owner"), 10)
+        self.assertTrue(await self.import_broadcast.renew("ARTIST", owner="OWNER"))
+        for key in ["import:ARTIST:owner", "import:ARTIST:events"]:
+            self.assertEqual(await self.redis.ttl(key), 600)
+
+    async def test_hold_renews_until_claim_lost(self):
+        self.import_broadcast.renew_seconds = 0.01
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        await self.redis.expire("import:ARTIST:owner", 10)
+        holder = asyncio.create_task(self.import_broadcast.hold("ARTIST", "OWNER"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(await self.redis.ttl("import:ARTIST:owner"), 600)
+
+        await self.redis.set("import:ARTIST:owner", "OTHER")
+        with self.assertLogs("fast_api_test", level="WARNING"):
+            await asyncio.wait_for(holder, timeout=1)
+
+    async def test_batch_coalesced_into_newest(self):
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        for progress in [0, 25, 50]:
+            await self.import_broadcast.publish(
+                "ARTIST", {"status": "searching", "progress": progress}
+            )
+        [(_, event), heartbeat] = await self.events(limit=2)
+        self.assertEqual(event, {"status": "searching", "progress": 50})
+        self.assertEqual(heartbeat, (None, {}))
+
+    async def test_ends_at_terminal_event(self):
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        for event in [
+            {"status": "searching", "progress": 0},
+            {"status": "error", "message": "Failed"},
+            {"status": "searching", "progress": 0},
+        ]:
+            await self.import_broadcast.publish("ARTIST", event)
+        self.assertEqual(
+            [event for _, event in await self.events()],
+            [{"status": "error", "message": "Failed"}],
+        )
+
+    async def test_resumes_after_last_event_id(self):
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        await self.import_broadcast.publish("ARTIST", {"status": "searching"})
+        [(event_id, _)] = await self.events(limit=1)
+        await self.import_broadcast.publish("ARTIST", {"status": "completed"})
+        await self.import_broadcast.release("ARTIST", owner="OWNER")
+
+        self.assertEqual(
+            [event for _, event in await self.events(last_event_id=event_id)],
+            [{"status": "completed"}],
+        )
+
+    async def test_nothing_more_after_the_end(self):
+        await self.import_broadcast.publish("ARTIST", {"status": "completed"})
+        [(event_id, _)] = await self.events()
+        self.assertEqual(await self.events(last_event_id=event_id), [])
+
+    async def test_import_stopped_when_owner_gone(self):
+        await self.import_broadcast.claim("ARTIST", owner="OWNER")
+        await self.import_broadcast.publish("ARTIST", {"status": "searching"})
+        await self.redis.delete("import:ARTIST:owner")
+        self.assertEqual(
+            [event for _, event in await self.events()],
+            [
+                {"status": "searching"},
+                {"status": "error", "message": "Import stopped"},
+            ],
+        )
+
+
+class SearchUpdatesTestCase(TestCase):
+    def setUp(self):
+        redis = FakeAsyncRedis()
+        self.import_broadcast = fast_api_test.ImportBroadcast(redis)
+        for name, value in [
+            ("search_registry", fast_api_test.SearchRegistry(redis)),
+            ("session_manager", fast_api_test.SessionManager(redis)),
+            ("import_broadcast", self.import_broadcast),
+        ]:
+            patcher = patch.object(fast_api_test, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.api_client = TestClient(fast_api_test.app)
+        self.call(
+            fast_api_test.search_registry.register(
+                search_id="SEARCH", spotify_id="ARTIST", artist_name="Artist"
+            )
+        )
+
+    def call(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_resume_does_not_import_again(self):
+        completed = {"status": "completed", "song": {"song_id": "SONG"}}
+        for event in [{"status": "searching"}, completed]:
+            self.call(self.import_broadcast.publish("ARTIST", event))
+        [(first_id, _), _] = self.call(
+            self.import_broadcast.redis.xrange("import:ARTIST:events")
+        )
+
+        with patch.object(fast_api_test, "run_import") as run_import:
+            response = self.api_client.get(
+                "/api/search-updates/SEARCH",
+                headers={"Last-Event-ID": first_id.decode()},
+            )
+        run_import.assert_not_called()
+        self.assertIn(f"data: {json.dumps(completed)}", response.text)
+        self.assertNotIn("searching", response.text)
+        session = self.call(fast_api_test.session_manager.get_session("SEARCH"))
+        self.assertEqual(session["current"], "SONG")